@@ -0,0 +1,339 @@
+import io
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from thumbnails import ThumbnailDiskCache
+from metrics import METRICS
+
+ATTACHMENT_DIR = "sofa_attachments"
+MAX_SIDE = 1600
+QUALITY = 80
+MIN_QUALITY = 50
+# Un nodo de Realtime Database admite 10 MB; en base64 el adjunto crece un tercio
+MAX_BLOB_BYTES = 1024 * 1024
+THUMB_BOX = (160, 120)
+BLOB_CACHE_BYTES = 200 * 1024 * 1024
+THUMB_CACHE_BYTES = 50 * 1024 * 1024
+PHOTO_CACHE_SIZE = 64
+MAX_ATTACHMENTS = 4
+WORKERS = 2
+UPLOAD_RETRY = 30
+# Un adjunto que aún no está en el servidor (su autor no lo ha subido todavía)
+# se vuelve a pedir con espera creciente
+MISSING_RETRY = 5
+MISSING_RETRY_MAX = 300
+IMAGE_FILETYPES = [("Imágenes", "*.png *.jpg *.jpeg *.bmp *.gif *.webp *.tif *.tiff"), ("Todos los archivos", "*.*")]
+
+
+def thumbnail_size(width: int, height: int, box: tuple = THUMB_BOX) -> tuple:
+    """
+    Tamaño de la miniatura de una imagen width x height
+
+    La vista reserva este hueco antes de tener la miniatura, así que la
+    altura de la fila no cambia cuando llega.
+    """
+    scale = min(box[0] / max(width, 1), box[1] / max(height, 1), 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def attachment_refs(comment: dict) -> list:
+    """Referencias {hash, width, height} válidas de un comentario"""
+    attachments = comment.get('attachments')
+    if isinstance(attachments, dict):
+        # Realtime Database devuelve las listas con huecos como objetos
+        attachments = list(attachments.values())
+    if not isinstance(attachments, list):
+        return []
+    return [a for a in attachments if isinstance(a, dict) and isinstance(a.get('hash'), str)
+            and isinstance(a.get('width'), int) and isinstance(a.get('height'), int)]
+
+
+def blob_type(data: bytes) -> str:
+    return "image/webp" if data[:4] == b"RIFF" and data[8:12] == b"WEBP" else "image/jpeg"
+
+
+def compress_image(path: str):
+    """
+    Reduce y recomprime una imagen antes de subirla
+
+    Lado mayor como mucho MAX_SIDE, orientación EXIF aplicada y WebP (JPEG
+    si Pillow no tiene WebP). Si aun así pasa de MAX_BLOB_BYTES se baja la
+    calidad y después la resolución.
+
+    Returns:
+        (bytes comprimidos, ancho, alto)
+    """
+    from PIL import Image, ImageOps, features
+    with Image.open(path) as source:
+        image = ImageOps.exif_transpose(source)
+        image.load()
+    alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    webp = features.check("webp")
+    if alpha and not webp:
+        image = _flatten(image.convert("RGBA"))
+    else:
+        image = image.convert("RGBA" if alpha else "RGB")
+    image.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+    quality = QUALITY
+    while True:
+        out = io.BytesIO()
+        if webp:
+            image.save(out, format="WEBP", quality=quality, method=4)
+        else:
+            image.save(out, format="JPEG", quality=quality, optimize=True, progressive=True)
+        data = out.getvalue()
+        if len(data) <= MAX_BLOB_BYTES or max(image.size) <= THUMB_BOX[0]:
+            return data, image.width, image.height
+        if quality > MIN_QUALITY:
+            quality -= 10
+        else:
+            image = image.resize((max(1, image.width * 3 // 4), max(1, image.height * 3 // 4)), Image.LANCZOS)
+
+
+def _flatten(image):
+    # JPEG no tiene transparencia: se compone sobre blanco
+    from PIL import Image
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+class AttachmentService:
+    def __init__(self, on_ready: callable, cache_dir: str = ATTACHMENT_DIR, workers: int = WORKERS,
+                 photo_cache_size: int = PHOTO_CACHE_SIZE):
+        """
+        Imágenes adjuntas a comentarios: compresión, subida y miniaturas
+
+        Cada imagen se identifica por el SHA-256 de sus bytes ya comprimidos;
+        el comentario solo guarda {hash, width, height}. Las imágenes nuevas
+        esperan en cache_dir/pending (fuera del LRU, sobreviven a un reinicio)
+        hasta que un hilo las sube a /sofa_blobs. Las descargadas van a una
+        caché en disco con límite de tamaño y sus miniaturas a otra; los
+        PhotoImage de las miniaturas se crean solo en el hilo de Tk
+        (add_photo) y se guardan en un LRU en memoria.
+
+        Args:
+            on_ready: Recibe (hash, ruta del PNG de la miniatura) desde el hilo de fondo
+            cache_dir: Carpeta de los adjuntos
+            workers: Hilos para comprimir, descargar y generar miniaturas
+            photo_cache_size: Máximo de miniaturas en memoria
+        """
+        self.on_ready = on_ready
+        self.remote = None
+        self.photo_cache_size = photo_cache_size
+        self.blobs = ThumbnailDiskCache(os.path.join(cache_dir, "blobs"), BLOB_CACHE_BYTES, suffix=".blob")
+        self.thumbs = ThumbnailDiskCache(os.path.join(cache_dir, "thumbs"), THUMB_CACHE_BYTES)
+        self.pending_dir = os.path.join(cache_dir, "pending")
+        os.makedirs(self.pending_dir, exist_ok=True)
+        self._photos = OrderedDict()
+        self._requested = set()
+        # hash -> segundos de espera del último reintento
+        self._missing = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._wake = threading.Event()
+        self._stopped = False
+        self._uploader = threading.Thread(target=self._upload_loop, daemon=True)
+        self._uploader.start()
+
+    def attach_remote(self, remote) -> None:
+        """Conecta el backend: sube lo pendiente y reintenta ya lo que no se encontró"""
+        self.remote = remote
+        with self._lock:
+            missing = list(self._missing)
+        for digest in missing:
+            self._submit(self._load_thumbnail, digest)
+        self._wake.set()
+
+    def shutdown(self) -> None:
+        self._stopped = True
+        self._wake.set()
+        self._pool.shutdown(wait=False)
+
+    def pending_uploads(self) -> list:
+        return [name[:-5] for name in os.listdir(self.pending_dir) if name.endswith(".blob")]
+
+    # --- Adjuntar ---
+
+    def prepare(self, paths: list, callback: callable) -> None:
+        """
+        Comprime imágenes en segundo plano y las deja en cola para subir
+
+        Args:
+            paths: Rutas de las imágenes elegidas
+            callback: Recibe (lista de referencias, lista de errores) desde el hilo de fondo
+        """
+        self._pool.submit(self._prepare, list(paths), callback)
+
+    def _prepare(self, paths, callback):
+        refs = []
+        errors = []
+        for path in paths:
+            try:
+                with METRICS.span("attachments.compress"):
+                    data, width, height = compress_image(path)
+                digest = hashlib.sha256(data).hexdigest()
+                if self.blobs.get(digest) is None:
+                    self._write_pending(digest, data)
+                refs.append({"hash": digest, "width": width, "height": height})
+                METRICS.increment("attachments.bytes", len(data))
+            except Exception as e:
+                errors.append(f"{os.path.basename(path)}: {e}")
+        self._wake.set()
+        callback(refs, errors)
+
+    def _pending_path(self, digest):
+        return os.path.join(self.pending_dir, digest + ".blob")
+
+    def _write_pending(self, digest, data):
+        fd, tmp = tempfile.mkstemp(dir=self.pending_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._pending_path(digest))
+
+    def _upload_loop(self):
+        retry = None
+        while not self._stopped:
+            self._wake.wait(retry)
+            self._wake.clear()
+            retry = None
+            remote = self.remote
+            if remote is None or self._stopped:
+                continue
+            for digest in self.pending_uploads():
+                path = self._pending_path(digest)
+                try:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    if not remote.has_blob(digest):
+                        remote.put_blob(digest, data, blob_type(data))
+                        METRICS.increment("attachments.uploaded")
+                    # Ya en el servidor: pasa a la caché normal, que sí puede desalojarla
+                    self.blobs.adopt(digest, path)
+                except Exception as e:
+                    METRICS.error("attachments", f"Error subiendo adjunto {digest[:12]}: {e}")
+                    retry = UPLOAD_RETRY
+                    break
+
+    # --- Mostrar (miniaturas) ---
+
+    def photo(self, digest: str):
+        """PhotoImage de la miniatura si está en memoria, o None (hilo de Tk)"""
+        photo = self._photos.get(digest)
+        if photo is not None:
+            self._photos.move_to_end(digest)
+        return photo
+
+    def request(self, digest: str) -> None:
+        """Pide la miniatura de un adjunto; on_ready se llamará al tenerla"""
+        with self._lock:
+            if digest in self._requested:
+                return
+            self._requested.add(digest)
+        self._submit(self._load_thumbnail, digest)
+
+    def add_photo(self, digest: str, png_path: str):
+        """Crea el PhotoImage de una miniatura lista (hilo de Tk)"""
+        from PIL import Image, ImageTk
+        with Image.open(png_path) as image:
+            photo = ImageTk.PhotoImage(image)
+        self._photos[digest] = photo
+        self._photos.move_to_end(digest)
+        while len(self._photos) > self.photo_cache_size:
+            evicted, _ = self._photos.popitem(last=False)
+            with self._lock:
+                # Si vuelve a hacer falta se carga del PNG en disco
+                self._requested.discard(evicted)
+        return photo
+
+    def _load_thumbnail(self, digest):
+        try:
+            key = f"{digest}_{THUMB_BOX[0]}x{THUMB_BOX[1]}"
+            png_path = self.thumbs.get(key)
+            if png_path is None:
+                data = self._read_blob(digest)
+                if data is None:
+                    self._retry_later(digest)
+                    return
+                from PIL import Image
+                with METRICS.span("attachments.thumbnail"):
+                    with Image.open(io.BytesIO(data)) as image:
+                        thumb = image.convert("RGBA").resize(thumbnail_size(*image.size), Image.LANCZOS)
+                png_path = self.thumbs.put(key, thumb)
+            with self._lock:
+                self._missing.pop(digest, None)
+            self.on_ready(digest, png_path)
+        except Exception as e:
+            METRICS.error("attachments", f"Error cargando adjunto {digest[:12]}: {e}")
+            self._retry_later(digest)
+
+    def _retry_later(self, digest):
+        # Sigue en _requested: las filas no lo vuelven a pedir mientras espera
+        with self._lock:
+            delay = min(max(self._missing.get(digest, 0) * 2, MISSING_RETRY), MISSING_RETRY_MAX)
+            self._missing[digest] = delay
+        timer = threading.Timer(delay, self._retry, args=(digest,))
+        timer.daemon = True
+        timer.start()
+
+    def _retry(self, digest):
+        with self._lock:
+            if digest not in self._missing:
+                return
+        self._submit(self._load_thumbnail, digest)
+
+    def _submit(self, function, *args):
+        if self._stopped:
+            return
+        try:
+            self._pool.submit(function, *args)
+        except RuntimeError:
+            # Pool ya cerrado al salir
+            pass
+
+    # --- Imagen completa ---
+
+    def fetch(self, digest: str, callback: callable) -> None:
+        """Trae la imagen completa a disco; callback recibe (hash, ruta o None) desde el hilo de fondo"""
+        def run():
+            try:
+                found = self._read_blob(digest) is not None
+            except Exception as e:
+                METRICS.error("attachments", f"Error descargando adjunto {digest[:12]}: {e}")
+                found = False
+            callback(digest, self.local_path(digest) if found else None)
+
+        self._pool.submit(run)
+
+    def local_path(self, digest: str):
+        """Ruta de la imagen completa si está en disco, o None"""
+        path = self.blobs.get(digest)
+        if path is None and os.path.exists(self._pending_path(digest)):
+            path = self._pending_path(digest)
+        return path
+
+    def _read_blob(self, digest):
+        for _ in range(2):
+            path = self.local_path(digest)
+            if path is None:
+                break
+            try:
+                with open(path, "rb") as f:
+                    return f.read()
+            except OSError:
+                # Desalojada o recién movida de pending a la caché: se busca otra vez
+                continue
+        return self._download(digest)
+
+    def _download(self, digest):
+        remote = self.remote
+        if remote is None:
+            return None
+        data = remote.get_blob(digest)
+        if data is not None:
+            METRICS.increment("attachments.downloaded")
+            self.blobs.put_bytes(digest, data)
+        return data
@@ -0,0 +1,292 @@
+import os
+import sys
+import csv
+import json
+import hashlib
+import time
+import fnmatch
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from example_indexer import ExampleIndexer
+
+DEFAULT_STEPS = 100
+DEFAULT_TIMEOUT = 600
+REGRESSION_THRESHOLD = 0.15
+POLL_INTERVAL = 0.05
+CSV_FIELDS = ("scene", "status", "returncode", "steps", "wall_time", "steps_per_s", "peak_rss", "error")
+
+
+def build_command(executable: str, scene: str, steps: int) -> list:
+    """
+    Comando de runSofa sin interfaz gráfica para N pasos
+
+    Un ejecutable .py (por ejemplo fake_runsofa.py) se lanza con el
+    intérprete actual.
+    """
+    command = [executable, "-g", "batch", "-n", str(steps), scene]
+    if executable.lower().endswith(".py"):
+        command.insert(0, sys.executable)
+    return command
+
+
+def _wait(popen, timeout: float):
+    """
+    Espera al proceso midiendo su pico de memoria
+
+    Returns:
+        (código de salida o None si se agotó el tiempo, pico de RSS en bytes o None)
+    """
+    deadline = time.perf_counter() + timeout
+    peak = None
+    stats = None
+    try:
+        import psutil
+        stats = psutil.Process(popen.pid)
+    except Exception:
+        pass
+
+    while True:
+        if hasattr(os, "wait4"):
+            # En POSIX wait4 devuelve el uso de recursos del hijo, incluido ru_maxrss
+            pid, status, usage = os.wait4(popen.pid, os.WNOHANG)
+            if pid:
+                popen.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+                rss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+                return popen.returncode, max(peak or 0, rss)
+        elif popen.poll() is not None:
+            return popen.returncode, peak
+
+        if stats is not None:
+            try:
+                memory = stats.memory_info()
+                # En Windows peak_wset ya es el pico; en otros sistemas se muestrea rss
+                peak = max(peak or 0, getattr(memory, "peak_wset", memory.rss))
+            except Exception:
+                stats = None
+        if time.perf_counter() > deadline:
+            popen.kill()
+            popen.wait()
+            return None, peak
+        time.sleep(POLL_INTERVAL)
+
+
+def run_scene(executable: str, scene: str, steps: int = DEFAULT_STEPS, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """
+    Ejecuta una escena en modo batch y mide su rendimiento
+
+    El tiempo incluye la carga de la escena, igual que lo percibe el usuario.
+
+    Args:
+        executable: Ruta de runSofa (o de un sustituto para pruebas)
+        scene: Ruta de la escena
+        steps: Número de pasos de simulación
+        timeout: Segundos antes de matar el proceso
+
+    Returns:
+        Dict con scene, status, returncode, steps, wall_time, steps_per_s,
+        peak_rss y error
+    """
+    result = {"scene": scene, "status": "ok", "returncode": None, "steps": steps,
+              "wall_time": None, "steps_per_s": None, "peak_rss": None, "error": ""}
+    # La salida se vuelca a un archivo: con una tubería sin leer runSofa podría bloquearse
+    with tempfile.TemporaryFile() as log:
+        start = time.perf_counter()
+        try:
+            popen = subprocess.Popen(
+                build_command(executable, scene, steps),
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                stdin=subprocess.DEVNULL
+            )
+        except OSError as e:
+            result.update(status="error", error=str(e))
+            return result
+        returncode, peak_rss = _wait(popen, timeout)
+        wall_time = time.perf_counter() - start
+
+        result.update(returncode=returncode, wall_time=round(wall_time, 4), peak_rss=peak_rss)
+        if returncode is None:
+            result.update(status="timeout", error=f"Sin terminar tras {timeout} s")
+        elif returncode != 0:
+            log.seek(max(0, log.seek(0, os.SEEK_END) - 2000))
+            tail = log.read().decode("utf-8", errors="replace").strip().splitlines()
+            result.update(status="error", error=tail[-1] if tail else f"Código {returncode}")
+        else:
+            result["steps_per_s"] = round(steps / wall_time, 2) if wall_time > 0 else None
+    return result
+
+
+def run_batch(executable: str, scenes: list, steps: int = DEFAULT_STEPS, timeout: float = DEFAULT_TIMEOUT,
+              workers: int = None, on_result: callable = None) -> list:
+    """
+    Ejecuta varias escenas en paralelo
+
+    Cada escena es un proceso runSofa independiente; el pool solo limita
+    cuántos hay a la vez (por defecto, uno por núcleo).
+
+    Args:
+        executable: Ruta de runSofa
+        scenes: Rutas de las escenas
+        steps: Pasos por escena
+        timeout: Segundos máximos por escena
+        workers: Procesos simultáneos (por defecto os.cpu_count())
+        on_result: Función llamada con cada resultado según termina (opcional)
+
+    Returns:
+        Resultados en el mismo orden que scenes
+    """
+    workers = workers or os.cpu_count() or 1
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_scene, executable, scene, steps, timeout): scene for scene in scenes}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if on_result:
+                on_result(result)
+    return [results[scene] for scene in scenes]
+
+
+def batch_index_file(examples_dir: str) -> str:
+    """
+    Índice de ejemplos propio del modo batch para examples_dir
+
+    Uno por carpeta: con --examples apuntando a otro árbol no se pisa el
+    índice de la interfaz ni el de otra carpeta.
+    """
+    digest = hashlib.sha1(os.path.normcase(os.path.abspath(examples_dir)).encode("utf-8")).hexdigest()[:12]
+    return f"sofa_examples_index_batch_{digest}.json"
+
+
+def select_scenes(examples_dir: str, patterns: list = None, limit: int = None) -> list:
+    """
+    Escenas del árbol de ejemplos que coinciden con algún patrón glob
+
+    Usa el mismo índice incremental que la lista de ejemplos de la interfaz,
+    pero guardado en su propio archivo (batch_index_file).
+
+    Returns:
+        Rutas absolutas ordenadas
+    """
+    paths = sorted(ExampleIndexer(examples_dir, index_file=batch_index_file(examples_dir)).scan())
+    if patterns:
+        normalized = [pattern.replace("\\", "/") for pattern in patterns]
+        paths = [p for p in paths if any(fnmatch.fnmatch(p.replace("\\", "/"), pattern) for pattern in normalized)]
+    if limit:
+        paths = paths[:limit]
+    return [os.path.join(examples_dir, path) for path in paths]
+
+
+def write_json(results: list, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"time": time.time(), "results": results}, f, indent=2)
+
+
+def write_csv(results: list, path: str) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def load_results(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def compare(results: list, baseline: list, threshold: float = REGRESSION_THRESHOLD) -> list:
+    """
+    Compara resultados con una línea base
+
+    Args:
+        results: Resultados actuales
+        baseline: Resultados de referencia
+        threshold: Empeoramiento relativo a partir del cual se marca regresión
+
+    Returns:
+        Lista de (escena, descripción) con las regresiones encontradas
+    """
+    reference = {r["scene"]: r for r in baseline}
+    regressions = []
+    for result in results:
+        base = reference.get(result["scene"])
+        if base is None:
+            continue
+        scene = result["scene"]
+        if result["status"] != "ok":
+            if base["status"] == "ok":
+                regressions.append((scene, f"falla ahora ({result['status']}: {result['error']})"))
+            continue
+        if base["status"] != "ok":
+            continue
+        for field, label, worse_if_higher in (("wall_time", "tiempo", True),
+                                              ("steps_per_s", "pasos/s", False),
+                                              ("peak_rss", "memoria pico", True)):
+            old, new = base.get(field), result.get(field)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change > threshold) if worse_if_higher else (change < -threshold):
+                regressions.append((scene, f"{label} {old:g} -> {new:g} ({change:+.0%})"))
+    return regressions
+
+
+def batch_main(argv: list, executable: str, examples_dir: str) -> int:
+    """
+    Punto de entrada del modo batch: python interfaz_sofa.py batch [opciones]
+
+    Returns:
+        Código de salida: 0 si todo va bien, 1 si hay fallos o regresiones
+    """
+    parser = argparse.ArgumentParser(prog="interfaz_sofa.py batch",
+                                     description="Ejecuta escenas SOFA sin interfaz y mide su rendimiento")
+    parser.add_argument("scenes", nargs="*", help="Escenas concretas (por defecto, el árbol de ejemplos)")
+    parser.add_argument("--filter", action="append", help="Patrón glob sobre la ruta relativa (repetible)")
+    parser.add_argument("--limit", type=int, help="Máximo de escenas del árbol de ejemplos")
+    parser.add_argument("--steps", type=int, default=DEFAULT_STEPS, help="Pasos de simulación por escena")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Segundos máximos por escena")
+    parser.add_argument("--workers", type=int, help="Procesos simultáneos (por defecto, núcleos)")
+    parser.add_argument("--sofa", default=executable, help="Ejecutable runSofa (o fake_runsofa.py)")
+    parser.add_argument("--examples", default=examples_dir, help="Carpeta de ejemplos")
+    parser.add_argument("--json", default="sofa_batch_results.json", help="Resultados en JSON")
+    parser.add_argument("--csv", help="Resultados en CSV")
+    parser.add_argument("--baseline", help="JSON de referencia con el que comparar")
+    parser.add_argument("--save-baseline", action="store_true", help="Guarda los resultados como nueva referencia")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Empeoramiento relativo tolerado")
+    args = parser.parse_args(argv)
+
+    scenes = args.scenes or select_scenes(args.examples, args.filter, args.limit)
+    if not scenes:
+        print("No hay escenas que ejecutar")
+        return 1
+    print(f"Ejecutando {len(scenes)} escenas ({args.steps} pasos, {args.workers or os.cpu_count()} en paralelo)")
+
+    def report(result):
+        if result["status"] == "ok":
+            rss = f"{result['peak_rss'] / (1024 * 1024):.0f} MB" if result["peak_rss"] else "-"
+            print(f"  ok      {result['wall_time']:8.2f} s {result['steps_per_s']:9.1f} pasos/s {rss:>8}  {result['scene']}")
+        else:
+            print(f"  {result['status']:<7} {result['scene']}: {result['error']}")
+
+    results = run_batch(args.sofa, scenes, args.steps, args.timeout, args.workers, on_result=report)
+    write_json(results, args.json)
+    if args.csv:
+        write_csv(results, args.csv)
+
+    failed = [r for r in results if r["status"] != "ok"]
+    print(f"{len(results) - len(failed)} correctas, {len(failed)} con error. Resultados en {args.json}")
+
+    regressions = []
+    if args.baseline and os.path.exists(args.baseline) and not args.save_baseline:
+        regressions = compare(results, load_results(args.baseline), args.threshold)
+        for scene, description in regressions:
+            print(f"  REGRESIÓN {scene}: {description}")
+        print(f"{len(regressions)} regresiones respecto a {args.baseline}")
+    if args.save_baseline:
+        baseline = args.baseline or "sofa_batch_baseline.json"
+        write_json(results, baseline)
+        print(f"Referencia guardada en {baseline}")
+
+    return 1 if failed or regressions else 0
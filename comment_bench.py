@@ -0,0 +1,382 @@
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import statistics
+from key_codec import encode_key
+from comment_store import CommentStore, collect_thread
+from comment_cache import CommentCache, CachedCommentManager
+from comment_pager import PAGE_SIZE
+from memory_backend import MemoryDatabase, MemoryBackend
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000)
+DEFAULT_REPEAT = 5
+LATENCY_SAMPLES = 20
+EVENT_TIMEOUT = 30.0
+BENCH_EXAMPLE = "bench/hilo.scn"
+BENCH_USER = "bench"
+
+
+def generate_comments(count: int, seed: int = 0, root_ratio: float = 0.1, chain: float = 0.6) -> dict:
+    """
+    Hilo sintético de comentarios con la forma que tienen en el servidor
+
+    Cada comentario es principal con probabilidad root_ratio; si no,
+    responde al anterior con probabilidad chain (cadenas de respuestas
+    profundas) o a uno cualquiera ya existente (árboles anchos).
+
+    Returns:
+        Dict {id: comentario}; los IDs conservan el orden de creación
+    """
+    rng = random.Random(seed)
+    comments = {}
+    ids = []
+    timestamp = 1700000000000
+    for i in range(count):
+        cid = f"-bench{i:08d}"
+        timestamp += rng.randint(1, 60000)
+        comment = {
+            "user": f"usuario{rng.randint(1, 5)}",
+            "text": f"Comentario {i} " + "texto " * rng.randint(1, 40),
+            "timestamp": timestamp,
+            "original_path": BENCH_EXAMPLE
+        }
+        if not ids or rng.random() < root_ratio:
+            comment["thread_timestamp"] = timestamp
+        else:
+            comment["parent_id"] = ids[-1] if rng.random() < chain else rng.choice(ids)
+        comments[cid] = comment
+        ids.append(cid)
+    return comments
+
+
+def thread_shape(comments: dict) -> dict:
+    """Principales, profundidad máxima, hilo más grande y hoja más profunda"""
+    depth = {}
+    sizes = {}
+    roots = {}
+    for cid, comment in comments.items():
+        # Los padres se generan antes que sus respuestas
+        parent = comment.get("parent_id")
+        depth[cid] = depth[parent] + 1 if parent else 0
+        roots[cid] = roots[parent] if parent else cid
+        sizes[roots[cid]] = sizes.get(roots[cid], 0) + 1
+    deepest = max(depth, key=depth.get)
+    return {
+        "roots": sum(1 for comment in comments.values() if not comment.get("parent_id")),
+        "max_depth": depth[deepest],
+        "largest_root": max(sizes, key=sizes.get),
+        "deepest": deepest
+    }
+
+
+def timed(fn, repeat: int = DEFAULT_REPEAT) -> float:
+    """Mediana en milisegundos de repeat ejecuciones de fn()"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def percentiles(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "p50": statistics.median(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1]
+    }
+
+
+def create_tk_root():
+    """Ventana oculta para medir el render, o None si no hay pantalla"""
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return None
+    root.withdraw()
+    return root
+
+
+def _make_harness_class():
+    # Import diferido: interfaz_sofa carga Tk y todos los servicios de la aplicación
+    from tkinter import ttk
+    import tkinter as tk
+    from interfaz_sofa import SOFAInterface
+    from comment_pager import CommentPager
+    from comment_view import CommentListView
+    from ui_dispatch import UIDispatcher
+
+    class CommentsHarness:
+        """Panel de comentarios de SOFAInterface sin el resto de la ventana"""
+        update_comments_display = SOFAInterface.update_comments_display
+        refresh_comments_view = SOFAInterface.refresh_comments_view
+        refresh_reply_counts = SOFAInterface.refresh_reply_counts
+        add_comments_page = SOFAInterface.add_comments_page
+        load_more_comments = SOFAInterface.load_more_comments
+        toggle_replies = SOFAInterface.toggle_replies
+        expand_replies = SOFAInterface.expand_replies
+        open_example_comments = SOFAInterface.open_example_comments
+        merge_comment_events = staticmethod(SOFAInterface.merge_comment_events)
+        on_comments_event = SOFAInterface.on_comments_event
+        on_comments_page_event = SOFAInterface.on_comments_page_event
+        on_comments_replies_event = SOFAInterface.on_comments_replies_event
+        apply_comments_page = SOFAInterface.apply_comments_page
+        apply_comments_replies = SOFAInterface.apply_comments_replies
+
+        def __init__(self, root, comment_manager, on_update: callable = None):
+            self.root = root
+            self.comment_manager = comment_manager
+            self.current_user = BENCH_USER
+            self.current_comments = {}
+            self.comments_example = None
+            self.comment_pager = CommentPager()
+            self.on_update = on_update
+            self.dispatcher = UIDispatcher(root)
+            self.dispatcher.register('comments', self.apply_comments_update, merge=self.merge_comment_events)
+            self.dispatcher.register('comments_page', lambda p: self.apply_comments_page(*p))
+            self.dispatcher.register('comments_replies', lambda p: self.apply_comments_replies(*p))
+            self.dispatcher.start()
+            canvas = tk.Canvas(root, width=500, height=700, borderwidth=0, highlightthickness=0)
+            scrollbar = ttk.Scrollbar(root, orient="vertical", command=canvas.yview)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            noop = lambda cid: None
+            self.comments_view = CommentListView(
+                canvas, scrollbar, self.current_user,
+                {'edit': noop, 'delete': noop, 'reply': noop, 'toggle_replies': self.toggle_replies},
+                reply_state=lambda cid: self.comment_pager.reply_state(cid),
+                on_near_end=self.load_more_comments
+            )
+
+        def apply_comments_update(self, payload):
+            example_name, comments, changed_ids = payload
+            if example_name == self.comments_example:
+                self.update_comments_display(comments, changed_ids)
+                self.root.update_idletasks()
+                if self.on_update:
+                    self.on_update(changed_ids)
+
+    return CommentsHarness
+
+
+class CommentBenchmark:
+    def __init__(self, count: int, repeat: int = DEFAULT_REPEAT, latency_ms: float = 0.0, seed: int = 0,
+                 chain: float = 0.6, root=None):
+        """
+        Mide un hilo de count comentarios sobre MemoryBackend
+
+        Args:
+            count: Número de comentarios del hilo
+            repeat: Repeticiones de cada medida (se da la mediana)
+            latency_ms: Ida y vuelta simulada del servidor por operación
+            seed: Semilla del generador
+            chain: Probabilidad de responder al comentario anterior
+            root: Ventana de Tk para el render, o None para omitirlo
+        """
+        self.count = count
+        self.repeat = repeat
+        self.root = root
+        self.comments = generate_comments(count, seed, chain=chain)
+        self.shape = thread_shape(self.comments)
+        self.database = MemoryDatabase(latency=latency_ms / 1000)
+        self.backend = MemoryBackend(self.database)
+        self.safe_path = encode_key(BENCH_EXAMPLE)
+        self.backend.ref.child(self.safe_path).set(self.comments)
+        self._tmpdir = tempfile.TemporaryDirectory(prefix="sofa_bench")
+        self.cache = CommentCache(os.path.join(self._tmpdir.name, "cache.db"))
+        self.manager = CachedCommentManager(self.backend, self.cache)
+
+    def close(self):
+        self.manager.close()
+        self.cache.conn.close()
+        self._tmpdir.cleanup()
+
+    def run(self) -> dict:
+        result = {"comments": self.count, **{k: self.shape[k] for k in ("roots", "max_depth")}}
+        result.update(self.bench_fetch())
+        result.update(self.bench_tree())
+        result.update(self.bench_open())
+        if self.root is not None:
+            result.update(self.bench_render())
+        else:
+            result.update(self.bench_event_latency())
+        return result
+
+    def bench_fetch(self) -> dict:
+        deepest_parent = self.comments[self.shape["deepest"]].get("parent_id")
+        return {
+            "fetch_all_ms": timed(lambda: self.backend.get_comments(BENCH_EXAMPLE), self.repeat),
+            "fetch_page_ms": timed(lambda: self.backend.get_comments_page(BENCH_EXAMPLE, PAGE_SIZE), self.repeat),
+            "fetch_replies_ms": timed(lambda: self.backend.get_replies(BENCH_EXAMPLE, deepest_parent), self.repeat)
+        }
+
+    def bench_tree(self) -> dict:
+        largest = self.shape["largest_root"]
+        return {
+            "store_build_ms": timed(lambda: CommentStore(self.comments), self.repeat),
+            "thread_dfs_ms": timed(lambda: collect_thread(self.comments, largest), self.repeat)
+        }
+
+    def bench_open(self) -> dict:
+        """Del listen() al primer callback: put inicial, CommentStore y guardado en caché"""
+        ready = threading.Event()
+        start = time.perf_counter()
+        self.manager.listen_updates(BENCH_EXAMPLE, lambda *args: ready.set())
+        if not ready.wait(EVENT_TIMEOUT):
+            return {"open_ms": None}
+        return {"open_ms": (time.perf_counter() - start) * 1000}
+
+    def _remote_comment(self, i):
+        # Otro usuario escribe directamente en el servidor
+        self.backend.save_comment(BENCH_EXAMPLE, "remoto", f"Evento {i}")
+
+    def bench_event_latency(self) -> dict:
+        """Escritura remota -> listener -> callback de la caché (sin Tk)"""
+        arrived = threading.Event()
+        self.manager.listen_updates(BENCH_EXAMPLE, lambda *args: arrived.set())
+        samples = []
+        for i in range(LATENCY_SAMPLES):
+            arrived.clear()
+            start = time.perf_counter()
+            self._remote_comment(i)
+            if not arrived.wait(EVENT_TIMEOUT):
+                break
+            samples.append((time.perf_counter() - start) * 1000)
+        if not samples:
+            return {}
+        return {f"event_{name}_ms": value for name, value in percentiles(samples).items()}
+
+    def bench_render(self) -> dict:
+        """Primera página, despliegue de la cadena más profunda y evento -> pantalla con Tk"""
+        arrived = threading.Event()
+        harness = _make_harness_class()(self.root, self.manager, on_update=lambda ids: arrived.set())
+        self.root.update()
+        result = {}
+
+        start = time.perf_counter()
+        harness.open_example_comments(BENCH_EXAMPLE)
+        self.root.update_idletasks()
+        result["render_page_ms"] = (time.perf_counter() - start) * 1000
+        # Sale la respuesta del servidor y se despachan los eventos pendientes
+        self._pump(lambda: harness.dispatcher.pending() == 0, 2.0)
+
+        chain = []
+        cid = self.shape["deepest"]
+        while cid is not None:
+            chain.append(cid)
+            cid = self.comments[cid].get("parent_id")
+        chain.reverse()
+        expand_samples = []
+        for cid in chain[:-1][:30]:
+            if cid not in harness.comment_pager.comments:
+                break
+            start = time.perf_counter()
+            harness.expand_replies(cid)
+            self.root.update_idletasks()
+            expand_samples.append((time.perf_counter() - start) * 1000)
+        if expand_samples:
+            result["render_expand_ms"] = statistics.median(expand_samples)
+
+        samples = []
+        for i in range(LATENCY_SAMPLES):
+            arrived.clear()
+            start = time.perf_counter()
+            self._remote_comment(i)
+            if not self._pump(arrived.is_set, EVENT_TIMEOUT):
+                break
+            samples.append((time.perf_counter() - start) * 1000)
+        if samples:
+            result.update({f"screen_{name}_ms": value for name, value in percentiles(samples).items()})
+
+        harness.dispatcher.stop()
+        for child in self.root.winfo_children():
+            child.destroy()
+        return result
+
+    def _pump(self, done: callable, timeout: float) -> bool:
+        deadline = time.perf_counter() + timeout
+        while not done():
+            if time.perf_counter() > deadline:
+                return False
+            self.root.update()
+            time.sleep(0.001)
+        return True
+
+
+COLUMNS = (
+    ("comments", "coment."), ("max_depth", "prof."),
+    ("fetch_all_ms", "fetch todo"), ("fetch_page_ms", "fetch pág."), ("fetch_replies_ms", "respuestas"),
+    ("store_build_ms", "store"), ("thread_dfs_ms", "hilo DFS"), ("open_ms", "apertura"),
+    ("render_page_ms", "render pág."), ("render_expand_ms", "desplegar"),
+    ("event_p50_ms", "evento p50"), ("event_p95_ms", "evento p95"),
+    ("screen_p50_ms", "pantalla p50"), ("screen_p95_ms", "pantalla p95"),
+)
+
+
+def format_table(results: list) -> str:
+    columns = [(key, title) for key, title in COLUMNS if any(key in result for result in results)]
+    widths = [max(len(title), 9) for _, title in columns]
+    lines = ["  ".join(title.rjust(width) for (_, title), width in zip(columns, widths))]
+    for result in results:
+        cells = []
+        for (key, _), width in zip(columns, widths):
+            value = result.get(key)
+            if value is None:
+                text = "-"
+            elif isinstance(value, float):
+                text = f"{value:.2f}"
+            else:
+                text = str(value)
+            cells.append(text.rjust(width))
+        lines.append("  ".join(cells))
+    return "\n".join(lines)
+
+
+def bench_main(argv: list) -> int:
+    """
+    Punto de entrada del benchmark: python interfaz_sofa.py bench [opciones]
+
+    Returns:
+        Código de salida
+    """
+    parser = argparse.ArgumentParser(prog="interfaz_sofa.py bench",
+                                     description="Mide la carga de comentarios sobre el backend en memoria")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Número de comentarios de cada hilo")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Repeticiones de cada medida")
+    parser.add_argument("--latency", type=float, default=0.0, help="Ida y vuelta simulada del servidor en ms")
+    parser.add_argument("--chain", type=float, default=0.6,
+                        help="Probabilidad de responder al comentario anterior (hilos más profundos)")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla del generador")
+    parser.add_argument("--no-render", action="store_true", help="No mide el render aunque haya pantalla")
+    parser.add_argument("--json", help="Guarda los resultados en este JSON")
+    args = parser.parse_args(argv)
+
+    root = None if args.no_render else create_tk_root()
+    if root is None and not args.no_render:
+        print("Sin pantalla: se omite el render y la latencia se mide hasta el callback")
+
+    results = []
+    for count in args.sizes:
+        print(f"Hilo de {count} comentarios...", flush=True)
+        bench = CommentBenchmark(count, args.repeat, args.latency, args.seed, args.chain, root)
+        try:
+            results.append(bench.run())
+        finally:
+            bench.close()
+    print()
+    print(format_table(results))
+    print("Tiempos en ms (mediana salvo percentiles)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if root is not None:
+        root.destroy()
+    return 0
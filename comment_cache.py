@@ -0,0 +1,753 @@
+import json
+import time
+import random
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from key_codec import KEY_SCHEME, encode_key, decode_key, migrated_key
+from comment_store import collect_thread
+from metrics import METRICS
+
+CACHE_FILE = "sofa_comments_cache.db"
+RETRY_BASE = 2
+RETRY_MAX = 300
+# Intentos de una escritura antes de darla por fallida (quedan en la outbox para reintentar a mano)
+MAX_ATTEMPTS = 10
+# Códigos de firebase_admin.exceptions que no se arreglan reintentando
+PERMANENT_CODES = {'PERMISSION_DENIED', 'INVALID_ARGUMENT', 'FAILED_PRECONDITION', 'OUT_OF_RANGE'}
+BATCH_WINDOW = 0.05
+BATCH_MAX = 500
+# Orden de los comentarios con timestamp de servidor aún sin resolver: los más recientes
+PENDING_TS = 9e15
+
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+
+def generate_push_id() -> str:
+    """
+    Genera un ID ordenable por fecha con el mismo formato que push() de Firebase
+
+    Permite crear comentarios sin conexión: el ID se decide en el cliente y
+    la escritura remota se hace después con set().
+    """
+    now = int(time.time() * 1000)
+    time_chars = []
+    for _ in range(8):
+        time_chars.append(PUSH_CHARS[now % 64])
+        now //= 64
+    random_chars = [random.choice(PUSH_CHARS) for _ in range(12)]
+    return "".join(reversed(time_chars)) + "".join(random_chars)
+
+
+def apply_pending(comments: dict, ops: list) -> dict:
+    """
+    Superpone las escrituras pendientes sobre los comentarios del servidor
+
+    Los comentarios afectados se marcan con '_pending' para que la vista
+    pueda mostrarlos como pendientes de sincronizar.
+
+    Args:
+        comments: Comentarios {id: datos}; se modifica y se devuelve
+        ops: Lista de (op, id, payload) en orden de llegada
+    """
+    for op, cid, payload in ops:
+        if op == 'set':
+            comments[cid] = {**payload, '_pending': True}
+        elif op == 'update' and cid in comments:
+            comments[cid] = {**comments[cid], **payload, '_pending': True}
+        elif op == 'delete':
+            comments.pop(cid, None)
+    return comments
+
+
+def fold_ops(ops: list) -> dict:
+    """
+    Combina escrituras en orden en un único update() multi-ruta
+
+    Las operaciones sobre un mismo comentario se pliegan en una sola
+    escritura, porque un update multi-ruta no admite rutas que se solapen.
+
+    Args:
+        ops: Lista de (op, key del ejemplo, id, payload) en orden de llegada
+
+    Returns:
+        Dict {ruta relativa a /sofa_comments: valor}
+    """
+    folded = {}
+    for op, safe_path, cid, payload in ops:
+        key = (safe_path, cid)
+        kind, value = folded.get(key, (None, None))
+        if op == 'set':
+            folded[key] = ('set', payload)
+        elif op == 'delete':
+            folded[key] = ('set', None)
+        elif kind == 'set':
+            # Editar un comentario ya borrado no lo recrea a medias
+            if value is not None:
+                folded[key] = ('set', {**value, **payload})
+        else:
+            folded[key] = ('update', {**(value or {}), **payload})
+
+    updates = {}
+    for (safe_path, cid), (kind, value) in folded.items():
+        if kind == 'set':
+            updates[f"{safe_path}/{cid}"] = value
+        else:
+            for field, field_value in value.items():
+                updates[f"{safe_path}/{cid}/{field}"] = field_value
+    return updates
+
+
+def is_permanent(error: Exception) -> bool:
+    """Si el error de una escritura es definitivo: reglas, permisos o datos no válidos"""
+    if isinstance(error, (ValueError, TypeError)):
+        return True
+    return getattr(error, 'code', None) in PERMANENT_CODES
+
+
+def _sort_ts(comment: dict) -> float:
+    timestamp = comment.get('timestamp')
+    return timestamp if isinstance(timestamp, (int, float)) else PENDING_TS
+
+
+class CommentCache:
+    def __init__(self, db_file: str = CACHE_FILE):
+        """
+        Caché SQLite de /sofa_comments y cola persistente de escrituras
+
+        Los comentarios se guardan por key normalizada del ejemplo tal como
+        están en el servidor; las escrituras locales aún no confirmadas viven
+        en la tabla outbox hasta que se replican.
+
+        Args:
+            db_file: Ruta del archivo SQLite
+        """
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS comments (
+                example TEXT NOT NULL,
+                cid TEXT NOT NULL,
+                data TEXT NOT NULL,
+                parent_id TEXT,
+                ts REAL,
+                PRIMARY KEY (example, cid)
+            );
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                op TEXT NOT NULL,
+                example TEXT NOT NULL,
+                cid TEXT NOT NULL,
+                payload TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                failed INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS outbox_example ON outbox (example);
+            CREATE TABLE IF NOT EXISTS comment_counts (
+                example TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                fetched REAL NOT NULL
+            );
+        """)
+        self._migrate()
+        self._migrate_keys()
+        self.conn.execute("CREATE INDEX IF NOT EXISTS comments_thread ON comments (example, parent_id, ts)")
+        self.conn.commit()
+
+    def _migrate(self):
+        # Outbox anterior a las escrituras fallidas
+        if 'failed' not in {row[1] for row in self.conn.execute("PRAGMA table_info(outbox)")}:
+            self.conn.execute("ALTER TABLE outbox ADD COLUMN failed INTEGER NOT NULL DEFAULT 0")
+        # Cachés anteriores a la paginación no tenían parent_id/ts como columnas
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(comments)")}
+        if 'ts' in columns:
+            return
+        self.conn.execute("ALTER TABLE comments ADD COLUMN parent_id TEXT")
+        self.conn.execute("ALTER TABLE comments ADD COLUMN ts REAL")
+        rows = self.conn.execute("SELECT example, cid, data FROM comments").fetchall()
+        updates = []
+        for example, cid, data in rows:
+            comment = json.loads(data)
+            updates.append((comment.get('parent_id'), _sort_ts(comment), example, cid))
+        self.conn.executemany("UPDATE comments SET parent_id = ?, ts = ? WHERE example = ? AND cid = ?", updates)
+
+    def _migrate_keys(self):
+        # Cachés con keys del esquema anterior (reemplazos _dot_, _slash_...)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= KEY_SCHEME:
+            return
+        keys = {row[0] for table in ("comments", "outbox", "comment_counts")
+                for row in self.conn.execute(f"SELECT DISTINCT example FROM {table}")}
+        for key in keys:
+            row = self.conn.execute("SELECT data FROM comments WHERE example = ? LIMIT 1", (key,)).fetchone()
+            target = migrated_key(key, json.loads(row[0]).get('original_path') if row else None)
+            if target is None:
+                continue
+            for table in ("comments", "outbox", "comment_counts"):
+                self.conn.execute(f"UPDATE OR REPLACE {table} SET example = ? WHERE example = ?", (target, key))
+        self.conn.execute(f"PRAGMA user_version = {KEY_SCHEME}")
+
+    def get_comments(self, safe_path: str) -> dict:
+        """Comentarios del servidor guardados para un ejemplo"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT cid, data FROM comments WHERE example = ?", (safe_path,)).fetchall()
+        return {cid: json.loads(data) for cid, data in rows}
+
+    def get_many(self, safe_path: str, ids) -> dict:
+        """Comentarios guardados de un ejemplo con los IDs indicados"""
+        ids = list(ids)
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT cid, data FROM comments WHERE example = ? AND cid IN ({placeholders})",
+                    [safe_path, *chunk]).fetchall()
+                found.update((cid, json.loads(data)) for cid, data in rows)
+        return found
+
+    def get_page(self, safe_path: str, limit: int, before: float = None) -> dict:
+        """
+        Comentarios principales más recientes de un ejemplo
+
+        Args:
+            safe_path: Key normalizada del ejemplo
+            limit: Número máximo de comentarios
+            before: Solo comentarios con timestamp anterior a este (opcional)
+
+        Returns:
+            Dict {id: datos} del más reciente al más antiguo
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT cid, data FROM comments WHERE example = ? AND parent_id IS NULL AND ts < ? "
+                "ORDER BY ts DESC LIMIT ?",
+                (safe_path, before if before is not None else float('inf'), limit)).fetchall()
+        return {cid: json.loads(data) for cid, data in rows}
+
+    def get_replies(self, safe_path: str, parent_id: str) -> dict:
+        """Respuestas directas a un comentario"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT cid, data FROM comments WHERE example = ? AND parent_id = ?",
+                (safe_path, parent_id)).fetchall()
+        return {cid: json.loads(data) for cid, data in rows}
+
+    def reply_counts(self, safe_path: str, parent_ids) -> dict:
+        """Número de respuestas directas de cada comentario indicado"""
+        parent_ids = list(parent_ids)
+        counts = {}
+        with self._lock:
+            for start in range(0, len(parent_ids), 500):
+                chunk = parent_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                counts.update(self.conn.execute(
+                    f"SELECT parent_id, COUNT(*) FROM comments WHERE example = ? AND parent_id IN ({placeholders}) "
+                    "GROUP BY parent_id",
+                    [safe_path, *chunk]).fetchall())
+        return counts
+
+    def get_counts(self) -> dict:
+        """Número de comentarios guardado por ejemplo: {key: (número, fecha de lectura)}"""
+        with self._lock:
+            rows = self.conn.execute("SELECT example, count, fetched FROM comment_counts").fetchall()
+        return {example: (count, fetched) for example, count, fetched in rows}
+
+    def store_counts(self, counts: dict) -> None:
+        """Guarda números de comentarios {key: (número, fecha de lectura)}"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO comment_counts (example, count, fetched) VALUES (?, ?, ?)",
+                [(example, count, fetched) for example, (count, fetched) in counts.items()])
+
+    def store_comments(self, safe_path: str, comments: dict, changed_ids) -> None:
+        """
+        Guarda los comentarios indicados tal como están en comments
+
+        Args:
+            safe_path: Key normalizada del ejemplo
+            comments: Estado actual del ejemplo en el servidor
+            changed_ids: IDs a escribir; los ausentes en comments se borran
+        """
+        upserts = [(safe_path, cid, json.dumps(comments[cid]), comments[cid].get('parent_id'), _sort_ts(comments[cid]))
+                   for cid in changed_ids if cid in comments]
+        deletes = [(safe_path, cid) for cid in changed_ids if cid not in comments]
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO comments (example, cid, data, parent_id, ts) VALUES (?, ?, ?, ?, ?)",
+                upserts)
+            self.conn.executemany("DELETE FROM comments WHERE example = ? AND cid = ?", deletes)
+
+    def enqueue(self, safe_path: str, ops: list) -> None:
+        """
+        Añade escrituras a la cola persistente en una sola transacción
+
+        Args:
+            safe_path: Key normalizada del ejemplo
+            ops: Lista de (op, id, payload) con op 'set', 'update' o 'delete'
+        """
+        rows = [(op, safe_path, cid, json.dumps(payload) if payload is not None else None)
+                for op, cid, payload in ops]
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO outbox (op, example, cid, payload) VALUES (?, ?, ?, ?)", rows)
+
+    def pending_ops(self, safe_path: str) -> list:
+        """Escrituras pendientes de un ejemplo como lista de (op, id, payload)"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT op, cid, payload FROM outbox WHERE example = ? AND failed = 0 ORDER BY id",
+                (safe_path,)).fetchall()
+        return [(op, cid, json.loads(payload) if payload else None) for op, cid, payload in rows]
+
+    def outbox(self, limit: int = -1) -> list:
+        """Las escrituras pendientes más antiguas en orden de llegada"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, op, example, cid, payload, attempts, next_attempt FROM outbox WHERE failed = 0 "
+                "ORDER BY id LIMIT ?",
+                (limit,)).fetchall()
+        return [(op_id, op, example, cid, json.loads(payload) if payload else None, attempts, next_attempt)
+                for op_id, op, example, cid, payload, attempts, next_attempt in rows]
+
+    def pending_count(self) -> int:
+        """Número de escrituras a la espera de replicarse"""
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM outbox WHERE failed = 0").fetchone()[0]
+
+    def complete(self, ops: list) -> None:
+        """
+        Saca escrituras replicadas de la cola y aplica su resultado a la caché
+
+        Args:
+            ops: Lista de (id de la outbox, op, key del ejemplo, id, payload)
+        """
+        with self._lock, self.conn:
+            for op_id, op, safe_path, cid, payload in ops:
+                self.conn.execute("DELETE FROM outbox WHERE id = ?", (op_id,))
+                if op == 'delete':
+                    self.conn.execute("DELETE FROM comments WHERE example = ? AND cid = ?", (safe_path, cid))
+                    continue
+                row = self.conn.execute(
+                    "SELECT data FROM comments WHERE example = ? AND cid = ?", (safe_path, cid)).fetchone()
+                if op == 'set':
+                    data = payload
+                elif row:
+                    data = {**json.loads(row[0]), **payload}
+                else:
+                    continue
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO comments (example, cid, data, parent_id, ts) VALUES (?, ?, ?, ?, ?)",
+                    (safe_path, cid, json.dumps(data), data.get('parent_id'), _sort_ts(data)))
+
+    def reschedule(self, op_ids: list, next_attempt: float, error: str) -> None:
+        """Marca un intento fallido de las escrituras indicadas y programa el siguiente"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, next_attempt = ?, last_error = ? WHERE id = ?",
+                [(next_attempt, error, op_id) for op_id in op_ids])
+
+    def fail(self, op_id: int, error: str) -> list:
+        """
+        Aparta una escritura rechazada y las posteriores sobre el mismo comentario
+
+        Las siguientes dependen de ella (editar una nota que no llegó a
+        crearse la recrearía a medias), así que fallan con ella.
+
+        Returns:
+            (key del ejemplo, id) de los comentarios afectados
+        """
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT example, cid FROM outbox WHERE id = ?", (op_id,)).fetchone()
+            if row is None:
+                return []
+            self.conn.execute(
+                "UPDATE outbox SET failed = 1, attempts = attempts + 1, last_error = ? "
+                "WHERE example = ? AND cid = ? AND id >= ?", (error, row[0], row[1], op_id))
+        return [row]
+
+    def failed(self) -> list:
+        """Escrituras rechazadas como lista de (op, key del ejemplo, id, último error)"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT op, example, cid, last_error FROM outbox WHERE failed = 1 ORDER BY id").fetchall()
+
+    def failed_count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM outbox WHERE failed = 1").fetchone()[0]
+
+    def retry_failed(self) -> list:
+        """Devuelve las escrituras rechazadas a la cola; devuelve (key, id) afectados"""
+        with self._lock, self.conn:
+            rows = self.conn.execute("SELECT DISTINCT example, cid FROM outbox WHERE failed = 1").fetchall()
+            self.conn.execute("UPDATE outbox SET failed = 0, attempts = 0, next_attempt = 0 WHERE failed = 1")
+        return rows
+
+    def discard_failed(self) -> list:
+        """Borra las escrituras rechazadas; devuelve (key, id) afectados"""
+        with self._lock, self.conn:
+            rows = self.conn.execute("SELECT DISTINCT example, cid FROM outbox WHERE failed = 1").fetchall()
+            self.conn.execute("DELETE FROM outbox WHERE failed = 1")
+        return rows
+
+
+class CachedCommentManager:
+    def __init__(self, remote, cache: CommentCache, on_pending_change: callable = None,
+                 on_count: callable = None, on_remote_change: callable = None,
+                 on_listener_status: callable = None):
+        """
+        Acceso a comentarios con caché local primero y escritura diferida
+
+        Las lecturas salen siempre de la caché. Las escrituras se aplican a la
+        caché y se encolan en la outbox; un hilo de fondo las replica en orden
+        contra Firebase con reintentos y backoff exponencial. Las escrituras
+        que llegan juntas se envían en un único update() multi-ruta.
+
+        Args:
+            remote: FirebaseManager o None si no hay conexión
+            cache: Caché local de comentarios
+            on_pending_change: Recibe el número de escrituras pendientes cada
+                vez que cambia; se invoca desde cualquier hilo (opcional)
+            on_count: Recibe el ejemplo escuchado y su número exacto de
+                comentarios tras cada evento remoto (opcional)
+            on_remote_change: Recibe (key normalizada, comentarios cambiados,
+                IDs cambiados; los ausentes se han borrado) de cada evento
+                remoto, desde el hilo del listener (opcional)
+            on_listener_status: Recibe None al abrirse cada stream en tiempo real
+                o la excepción si no se pudo abrir, desde un hilo de fondo (opcional)
+        """
+        self.remote = remote
+        self.cache = cache
+        self.on_pending_change = on_pending_change
+        self.on_count = on_count
+        self.on_remote_change = on_remote_change
+        self.on_listener_status = on_listener_status
+        self.notification_callback = None
+        self._listen_example = None
+        self._listen_callback = None
+        self._isolate_until = None
+        self._fetcher = ThreadPoolExecutor(max_workers=2)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def attach_remote(self, remote) -> None:
+        """Conecta FirebaseManager cuando está disponible y replica lo pendiente"""
+        self.remote = remote
+        if self.notification_callback:
+            remote.set_notification_callback(self.notification_callback)
+        # El stream de /sofa_activity hace falta aunque no haya ejemplo abierto
+        remote.open_stream(self.on_listener_status)
+        if self._listen_example:
+            self.listen_updates(self._listen_example, self._listen_callback)
+        self._wake.set()
+
+    def close(self) -> None:
+        """Detiene el hilo de replicación y el listener"""
+        self._stop.set()
+        self._wake.set()
+        self.stop_listening()
+        if self.remote:
+            self.remote.close()
+        self._fetcher.shutdown(wait=False)
+
+    def set_notification_callback(self, callback):
+        self.notification_callback = callback
+        if self.remote:
+            self.remote.set_notification_callback(callback)
+
+    def get_comments(self, example_name: str) -> dict:
+        """
+        Comentarios del ejemplo según la caché más las escrituras pendientes
+
+        No accede a la red.
+        """
+        safe_path = encode_key(example_name)
+        return apply_pending(self.cache.get_comments(safe_path), self.cache.pending_ops(safe_path))
+
+    def get_comments_page(self, example_name: str, limit: int, before: float = None,
+                          on_server_page: callable = None) -> dict:
+        """
+        Página de comentarios principales, del más reciente al más antiguo
+
+        Devuelve al instante la página según la caché y, si hay conexión, pide
+        la misma página al servidor en segundo plano.
+
+        Args:
+            example_name: Nombre/ruta del ejemplo SOFA
+            limit: Tamaño de la página
+            before: Timestamp del comentario más antiguo ya cargado (opcional)
+            on_server_page: Recibe el ejemplo y la página del servidor; se invoca
+                desde un hilo de fondo (opcional)
+        """
+        safe_path = encode_key(example_name)
+        page = self.cache.get_page(safe_path, limit, before)
+        # Las notas nuevas aún sin replicar solo aparecen en la primera página
+        ops = [(op, cid, payload) for op, cid, payload in self.cache.pending_ops(safe_path)
+               if cid in page or (before is None and op == 'set' and payload.get('parent_id') is None)]
+        if self.remote and on_server_page:
+            self._fetcher.submit(self._fetch, example_name, on_server_page,
+                                 self.remote.get_comments_page, example_name, limit, before)
+        return apply_pending(page, ops)
+
+    def get_replies(self, example_name: str, parent_id: str, on_server_replies: callable = None) -> dict:
+        """
+        Respuestas directas a un comentario, desde la caché y luego desde el servidor
+
+        Args:
+            example_name: Nombre/ruta del ejemplo SOFA
+            parent_id: ID del comentario cuyas respuestas se quieren
+            on_server_replies: Recibe el ejemplo y las respuestas del servidor;
+                se invoca desde un hilo de fondo (opcional)
+        """
+        safe_path = encode_key(example_name)
+        replies = self.cache.get_replies(safe_path, parent_id)
+        ops = [(op, cid, payload) for op, cid, payload in self.cache.pending_ops(safe_path)
+               if cid in replies or (op == 'set' and payload.get('parent_id') == parent_id)]
+        if self.remote and on_server_replies:
+            self._fetcher.submit(self._fetch, example_name, on_server_replies,
+                                 self.remote.get_replies, example_name, parent_id)
+        return apply_pending(replies, ops)
+
+    def reply_counts(self, example_name: str, parent_ids) -> dict:
+        """Número de respuestas directas de cada comentario según la caché"""
+        safe_path = encode_key(example_name)
+        parent_ids = set(parent_ids)
+        counts = self.cache.reply_counts(safe_path, parent_ids)
+        for op, cid, payload in self.cache.pending_ops(safe_path):
+            if op == 'set' and payload.get('parent_id') in parent_ids:
+                counts[payload['parent_id']] = counts.get(payload['parent_id'], 0) + 1
+        return counts
+
+    def _fetch(self, example_name: str, callback: callable, query: callable, *args):
+        safe_path = encode_key(example_name)
+        try:
+            result = query(*args)
+        except Exception as e:
+            METRICS.error("comments.fetch", f"Error consultando comentarios: {e}")
+            return
+        self.cache.store_comments(safe_path, result, result.keys())
+        ops = [op for op in self.cache.pending_ops(safe_path) if op[1] in result]
+        callback(example_name, apply_pending(dict(result), ops))
+
+    def save_comment(self, example_name: str, user: str, text: str, parent_id: str = None,
+                     attachments: list = None) -> str:
+        cid = generate_push_id()
+        comment_data = {
+            "user": user,
+            "text": text,
+            "timestamp": {'.sv': 'timestamp'},
+            "original_path": example_name,
+            "parent_id": parent_id
+        }
+        if parent_id is None:
+            # Permite paginar en el servidor solo los comentarios principales
+            comment_data["thread_timestamp"] = {'.sv': 'timestamp'}
+        if attachments:
+            # Solo referencias {hash, width, height}; las imágenes las sube AttachmentService
+            comment_data["attachments"] = attachments
+        self._write(example_name, 'set', cid, comment_data)
+        return cid
+
+    def update_comment(self, example_name: str, comment_id: str, new_text: str) -> None:
+        self._write(example_name, 'update', comment_id, {
+            "text": new_text,
+            "edited_timestamp": {'.sv': 'timestamp'}
+        })
+
+    def delete_comment(self, example_name: str, comment_id: str) -> None:
+        self._write(example_name, 'delete', comment_id)
+
+    def delete_thread(self, example_name: str, comment_id: str) -> int:
+        """
+        Borra un comentario y todas sus respuestas en una sola escritura remota
+
+        Returns:
+            Número de comentarios borrados
+        """
+        ids = collect_thread(self.get_comments(example_name), comment_id)
+        self._write_many(example_name, [('delete', cid, None) for cid in ids])
+        return len(ids)
+
+    def delete_replies(self, example_name: str, parent_id: str) -> int:
+        """
+        Borra todas las respuestas (directas e indirectas) de un comentario
+
+        Returns:
+            Número de comentarios borrados
+        """
+        ids = collect_thread(self.get_comments(example_name), parent_id)[1:]
+        self._write_many(example_name, [('delete', cid, None) for cid in ids])
+        return len(ids)
+
+    def _write(self, example_name: str, op: str, cid: str, payload: dict = None):
+        self._write_many(example_name, [(op, cid, payload)])
+
+    def _write_many(self, example_name: str, ops: list):
+        if not ops:
+            return
+        self.cache.enqueue(encode_key(example_name), ops)
+        self._notify_pending()
+        self._wake.set()
+        # Actualización optimista de la vista sin esperar al eco del servidor
+        self._refresh_listener(example_name, {cid for _, cid, _ in ops})
+
+    def _refresh_listener(self, example_name: str, changed_ids: set):
+        if example_name == self._listen_example and self._listen_callback:
+            safe_path = encode_key(example_name)
+            comments = self.cache.get_many(safe_path, changed_ids)
+            ops = [op for op in self.cache.pending_ops(safe_path) if op[1] in changed_ids]
+            self._listen_callback(example_name, apply_pending(comments, ops), changed_ids)
+
+    def listen_updates(self, example_name: str, callback: callable):
+        """
+        Escucha los cambios del ejemplo; cada evento remoto se guarda en la caché
+
+        Args:
+            example_name: Nombre/ruta del ejemplo SOFA a monitorear
+            callback: Recibe el ejemplo, el estado actual de los comentarios
+                cambiados (los borrados no aparecen) y los IDs cambiados
+        """
+        self._listen_example = example_name
+        self._listen_callback = callback
+        if self.remote:
+            safe_path = encode_key(example_name)
+            # La vista pinta la primera página desde la caché; el hilo completo solo lo
+            # lee el hilo del stream para que su 'put' inicial entregue la diferencia
+            self.remote.listen_updates(example_name, self._on_remote_update,
+                                       initial=lambda: self.cache.get_comments(safe_path),
+                                       on_status=self.on_listener_status)
+
+    def _on_remote_update(self, example_name, changes, store):
+        safe_path = encode_key(example_name)
+        changed_ids = set(changes)
+        changed = {cid: comment for cid, comment in changes.items() if comment is not None}
+        self.cache.store_comments(safe_path, changed, changed_ids)
+        self._backfill_thread_timestamps(safe_path, changed, changed_ids)
+        if self.on_count:
+            # El listener tiene el ejemplo completo: el número es exacto y no cuesta lecturas
+            self.on_count(example_name, len(store))
+        if self.on_remote_change:
+            self.on_remote_change(safe_path, changed, changed_ids)
+        ops = [op for op in self.cache.pending_ops(safe_path) if op[1] in changed_ids]
+        if example_name == self._listen_example and self._listen_callback:
+            self._listen_callback(example_name, apply_pending(changed, ops), changed_ids)
+
+    def _backfill_thread_timestamps(self, safe_path: str, comments: dict, changed_ids):
+        # Los comentarios anteriores a la paginación no tienen thread_timestamp
+        updates = {}
+        for cid in changed_ids:
+            comment = comments.get(cid)
+            if (comment and comment.get('parent_id') is None and 'thread_timestamp' not in comment
+                    and isinstance(comment.get('timestamp'), (int, float))):
+                updates[f"{safe_path}/{cid}/thread_timestamp"] = comment['timestamp']
+        if updates and self.remote:
+            self._fetcher.submit(self._apply_backfill, updates)
+
+    def _apply_backfill(self, updates: dict):
+        try:
+            self.remote.update(updates)
+        except Exception as e:
+            METRICS.error("comments.backfill", f"Error completando thread_timestamp: {e}")
+
+    def stop_listening(self) -> None:
+        self._listen_example = None
+        self._listen_callback = None
+        if self.remote:
+            self.remote.stop_listening()
+
+    def open_streams(self) -> int:
+        return self.remote.open_streams() if self.remote else 0
+
+    def pending_count(self) -> int:
+        return self.cache.pending_count()
+
+    def _notify_pending(self):
+        if self.on_pending_change:
+            self.on_pending_change(self.cache.pending_count())
+
+    def _run(self):
+        while not self._stop.is_set():
+            timeout = self._replay()
+            self._wake.wait(timeout)
+            self._wake.clear()
+            # Breve espera para agrupar las escrituras que llegan seguidas
+            self._stop.wait(BATCH_WINDOW)
+
+    def _replay(self):
+        # Devuelve los segundos hasta el próximo reintento, o None si no hay nada que hacer
+        while self.remote is not None and not self._stop.is_set():
+            # Tras un lote rechazado se reenvían sus escrituras de una en una hasta dar con la culpable
+            rows = self.cache.outbox(1 if self._isolate_until else BATCH_MAX)
+            if not rows:
+                self._isolate_until = None
+                return None
+            if self._isolate_until and rows[0][0] > self._isolate_until:
+                self._isolate_until = None
+                continue
+            now = time.time()
+            attempts, next_attempt = rows[0][5], rows[0][6]
+            if next_attempt > now:
+                return next_attempt - now
+
+            ops = [(op_id, op, safe_path, cid, payload) for op_id, op, safe_path, cid, payload, _, _ in rows]
+            try:
+                with METRICS.span("outbox.replay"):
+                    self.remote.update(fold_ops([op[1:] for op in ops]), notify=True)
+            except Exception as e:
+                # Las escrituras se replican en orden: si el lote falla, las siguientes esperan
+                METRICS.increment("outbox.failures")
+                permanent = is_permanent(e)
+                if len(ops) > 1 and (permanent or attempts + 1 >= MAX_ATTEMPTS):
+                    self._isolate_until = ops[-1][0]
+                    continue
+                if permanent or attempts + 1 >= MAX_ATTEMPTS:
+                    METRICS.error("outbox", f"Escritura rechazada ({ops[0][1]} {ops[0][3]}): {e}")
+                    self._fail(ops[0][0], str(e))
+                    continue
+                delay = min(RETRY_BASE * 2 ** attempts, RETRY_MAX)
+                self.cache.reschedule([op[0] for op in ops], now + delay, str(e))
+                return delay
+            self.cache.complete(ops)
+            METRICS.increment("outbox.replayed_ops", len(ops))
+            self._notify_pending()
+            self._refresh_done({(path, cid) for _, _, path, cid, _ in ops})
+        return None
+
+    def _fail(self, op_id: int, error: str):
+        affected = self.cache.fail(op_id, error)
+        METRICS.increment("outbox.failed_ops")
+        self._notify_pending()
+        self._refresh_done(affected)
+
+    def _refresh_done(self, affected):
+        listened = self._listen_example
+        if listened is not None:
+            safe_path = encode_key(listened)
+            done = {cid for path, cid in affected if path == safe_path}
+            if done:
+                self._refresh_listener(listened, done)
+
+    def failed_writes(self) -> list:
+        """Escrituras rechazadas por el servidor como (op, ejemplo, id, error)"""
+        return [(op, decode_key(safe_path), cid, error) for op, safe_path, cid, error in self.cache.failed()]
+
+    def failed_count(self) -> int:
+        return self.cache.failed_count()
+
+    def retry_failed(self) -> None:
+        """Vuelve a encolar las escrituras rechazadas"""
+        self._refresh_done(self.cache.retry_failed())
+        self._notify_pending()
+        self._wake.set()
+
+    def discard_failed(self) -> None:
+        """Olvida las escrituras rechazadas; la vista vuelve al estado del servidor"""
+        self._refresh_done(self.cache.discard_failed())
+        self._notify_pending()
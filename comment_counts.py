@@ -0,0 +1,135 @@
+import time
+import threading
+from key_codec import encode_key
+from metrics import METRICS
+
+COUNT_TTL = 300
+KEYS_TTL = 60
+
+
+class CommentCounts:
+    def __init__(self, cache, on_change: callable, ttl: float = COUNT_TTL, keys_ttl: float = KEYS_TTL):
+        """
+        Número de comentarios por ejemplo sin descargar /sofa_comments
+
+        Una lectura shallow de /sofa_comments dice qué ejemplos tienen
+        comentarios (solo keys); los demás cuentan 0 sin más consultas. De
+        los que sí tienen, se cuenta con otra lectura shallow (solo IDs) y
+        únicamente para las filas visibles cuyo número ha caducado. Los
+        números se guardan en la caché SQLite, así que al arrancar se
+        muestran enseguida, y el ejemplo escuchado se actualiza con cada
+        evento del listener sin ninguna lectura extra.
+
+        Args:
+            cache: CommentCache donde se guardan los números
+            on_change: Recibe {key: número} con los que cambian, desde el hilo de fondo
+            ttl: Segundos que vale el número de un ejemplo
+            keys_ttl: Segundos que vale la lista de ejemplos con comentarios
+        """
+        self.cache = cache
+        self.on_change = on_change
+        self.ttl = ttl
+        self.keys_ttl = keys_ttl
+        self.remote = None
+        self.reads = 0
+        self._counts = cache.get_counts()
+        self._keys = None
+        self._keys_fetched = 0
+        self._visible = []
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def attach_remote(self, remote) -> None:
+        """Conecta FirebaseManager y revisa las filas visibles"""
+        with self._condition:
+            self.remote = remote
+            self._condition.notify()
+
+    def get(self, example_name: str):
+        """Número de comentarios conocido del ejemplo, o None si aún no se sabe"""
+        entry = self._counts.get(encode_key(example_name))
+        return entry[0] if entry else None
+
+    def request(self, example_names) -> None:
+        """Filas visibles ahora; las que tengan el número caducado se vuelven a contar"""
+        with self._condition:
+            self._visible = list(example_names)
+            self._condition.notify()
+
+    def set_count(self, example_name: str, count: int) -> None:
+        """Número exacto conocido por otra vía (el listener del ejemplo abierto)"""
+        safe_path = encode_key(example_name)
+        self._store({safe_path: count})
+        with self._condition:
+            if self._keys is not None:
+                if count:
+                    self._keys.add(safe_path)
+                else:
+                    self._keys.discard(safe_path)
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _store(self, counts: dict):
+        now = time.time()
+        changed = {key: count for key, count in counts.items()
+                   if self._counts.get(key, (None,))[0] != count}
+        self._counts.update((key, (count, now)) for key, count in counts.items())
+        self.cache.store_counts({key: (count, now) for key, count in counts.items()})
+        if changed:
+            self.on_change(changed)
+
+    def _stale(self, safe_path, now):
+        entry = self._counts.get(safe_path)
+        return entry is None or now - entry[1] > self.ttl
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped and (self.remote is None or not self._visible):
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                remote = self.remote
+                visible, self._visible = self._visible, []
+            try:
+                self._refresh(remote, visible)
+            except Exception as e:
+                METRICS.error("comments.count", f"Error contando comentarios: {e}")
+
+    def _refresh(self, remote, visible):
+        now = time.time()
+        if self._keys is None or now - self._keys_fetched > self.keys_ttl:
+            keys = remote.get_example_keys()
+            self.reads += 1
+            self._keys_fetched = now
+            if self._keys is not None:
+                # Los ejemplos que acaban de recibir su primer comentario se recuentan ya
+                for key in keys - self._keys:
+                    self._counts.pop(key, None)
+            self._keys = keys
+            # Los que ya no tienen comentarios pasan a 0 sin consultar nada
+            gone = {key: 0 for key, (count, _) in list(self._counts.items()) if count and key not in keys}
+            if gone:
+                self._store(gone)
+
+        absent = {}
+        for example_name in visible:
+            safe_path = encode_key(example_name)
+            if not self._stale(safe_path, now):
+                continue
+            if safe_path not in self._keys:
+                absent[safe_path] = 0
+                continue
+            with self._condition:
+                # Si el usuario ya ha desplazado la lista, lo que queda no interesa
+                if self._visible or self._stopped:
+                    break
+            self.reads += 1
+            self._store({safe_path: remote.count_comments(example_name)})
+        if absent:
+            self._store(absent)
@@ -0,0 +1,143 @@
+from comment_store import collect_thread
+from comment_view import sort_key
+
+PAGE_SIZE = 50
+
+
+class CommentPager:
+    def __init__(self, page_size: int = PAGE_SIZE):
+        """
+        Ventana de comentarios cargados de un ejemplo
+
+        Solo guarda las páginas de comentarios principales ya cargadas (del
+        más reciente al cursor) y las respuestas de los hilos desplegados, de
+        modo que la memoria depende del tamaño de página y no del hilo.
+
+        Args:
+            page_size: Número de comentarios principales por página
+        """
+        self.page_size = page_size
+        self.comments = {}
+        self.cursor = None
+        self.exhausted = False
+        self.expanded = set()
+        self.pinned = set()
+        self.reply_counts = {}
+        self.last_request = None
+
+    def add_page(self, page: dict, complete: bool) -> set:
+        """
+        Añade una página de comentarios principales
+
+        Args:
+            page: Comentarios de la página {id: datos}
+            complete: Si la página es autoritativa (del servidor, o de la caché
+                cuando no hay conexión) y decide si quedan más páginas
+
+        Returns:
+            IDs añadidos o modificados
+        """
+        changed = set()
+        roots = 0
+        for cid, comment in page.items():
+            if comment.get('parent_id') is not None:
+                continue
+            roots += 1
+            timestamp = sort_key(comment)
+            if timestamp != float('inf') and (self.cursor is None or timestamp < self.cursor):
+                self.cursor = timestamp
+            if self.comments.get(cid) != comment:
+                self.comments[cid] = comment
+                changed.add(cid)
+        if complete and roots < self.page_size:
+            self.exhausted = True
+        return changed
+
+    def next_request(self):
+        """
+        Cursor de la siguiente página o None si no hay que pedir nada
+
+        Evita pedir dos veces la misma página mientras se hace scroll.
+        """
+        if self.exhausted or self.cursor is None or self.last_request == self.cursor:
+            return None
+        self.last_request = self.cursor
+        return self.cursor
+
+    def expand(self, parent_id: str, replies: dict) -> set:
+        """Despliega un hilo con sus respuestas directas; devuelve los IDs afectados"""
+        self.expanded.add(parent_id)
+        changed = {parent_id}
+        for cid, comment in replies.items():
+            if comment.get('parent_id') == parent_id and self.comments.get(cid) != comment:
+                self.comments[cid] = comment
+                changed.add(cid)
+        return changed
+
+    def pin_thread(self, path: list) -> set:
+        """
+        Carga el camino de la raíz de un hilo a una de sus notas (salto desde la búsqueda)
+
+        La raíz se conserva aunque sea más antigua que las páginas cargadas,
+        sin mover el cursor de paginación.
+
+        Args:
+            path: Lista [(id, comentario)] de la raíz a la nota
+
+        Returns:
+            IDs añadidos o modificados
+        """
+        if not path:
+            return set()
+        root_id, root = path[0]
+        self.pinned.add(root_id)
+        changed = set()
+        if self.comments.get(root_id) != root:
+            self.comments[root_id] = root
+            changed.add(root_id)
+        for (parent_id, _), (cid, comment) in zip(path, path[1:]):
+            changed |= self.expand(parent_id, {cid: comment})
+        return changed
+
+    def collapse(self, parent_id: str) -> set:
+        """Pliega un hilo y descarta sus respuestas; devuelve los IDs afectados"""
+        descendants = collect_thread(self.comments, parent_id)[1:]
+        for cid in descendants:
+            self.comments.pop(cid, None)
+            self.expanded.discard(cid)
+        self.expanded.discard(parent_id)
+        return {parent_id, *descendants}
+
+    def apply(self, comments: dict, changed_ids) -> set:
+        """
+        Aplica cambios del listener, descartando los que caen fuera de la ventana
+
+        Args:
+            comments: Estado actual de los comentarios cambiados
+            changed_ids: IDs cambiados; los que no están en comments se han borrado
+
+        Returns:
+            IDs de la ventana afectados
+        """
+        affected = set()
+        for cid in changed_ids:
+            comment = comments.get(cid)
+            if comment is not None and (cid in self.pinned or self._in_window(comment)):
+                self.comments[cid] = comment
+                affected.add(cid)
+            elif self.comments.pop(cid, None) is not None:
+                affected.add(cid)
+        return affected
+
+    def _in_window(self, comment: dict) -> bool:
+        parent_id = comment.get('parent_id')
+        if parent_id is not None:
+            return parent_id in self.expanded
+        timestamp = sort_key(comment)
+        if self.exhausted or timestamp == float('inf'):
+            return True
+        return self.cursor is not None and timestamp >= self.cursor
+
+    def reply_state(self, cid: str):
+        """(número de respuestas conocidas, si el hilo está desplegado)"""
+        return self.reply_counts.get(cid, 0), cid in self.expanded
@@ -0,0 +1,331 @@
+import re
+import json
+import time
+import queue
+import sqlite3
+import threading
+from metrics import METRICS
+from key_codec import KEY_SCHEME, decode_key
+
+SEARCH_FILE = "sofa_comment_search.db"
+REFRESH_AGE = 24 * 3600
+RESULT_LIMIT = 100
+SNIPPET_TOKENS = 12
+
+
+def fts_query(text: str) -> str:
+    """
+    Consulta FTS5 a partir de lo que escribe el usuario
+
+    Cada palabra se busca literal (sin operadores de FTS) y la última
+    también como prefijo, para que "diverg" encuentre "divergence".
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def thread_roots(comments: dict) -> dict:
+    """Raíz del hilo de cada comentario, sin recursión"""
+    roots = {}
+    for cid in comments:
+        chain = []
+        seen = set()
+        current = cid
+        while current not in roots:
+            chain.append(current)
+            seen.add(current)
+            comment = comments.get(current)
+            parent = comment.get('parent_id') if isinstance(comment, dict) else None
+            # Sin padre conocido (o con un ciclo) el comentario encabeza su hilo
+            if parent is None or parent not in comments or parent in seen:
+                root = current
+                break
+            current = parent
+        else:
+            root = roots[current]
+        for node in chain:
+            roots[node] = root
+    return roots
+
+
+class CommentSearchIndex:
+    def __init__(self, db_file: str = SEARCH_FILE, on_progress: callable = None, refresh_age: float = REFRESH_AGE):
+        """
+        Índice de texto completo de todas las notas, en SQLite FTS5
+
+        Al conectar con el servidor, un hilo de fondo recorre /sofa_comments
+        ejemplo a ejemplo (keys con una lectura shallow y luego un get por
+        ejemplo, nunca todo el árbol de golpe) y solo vuelve a descargar los
+        que lleven más de refresh_age segundos sin indexar. Después el índice
+        se mantiene con los eventos del listener. Las búsquedas usan su propia
+        conexión (WAL), así que no esperan a las escrituras del hilo.
+
+        Args:
+            db_file: Ruta del archivo SQLite
+            on_progress: Recibe (indexados, total) desde el hilo de fondo (opcional)
+            refresh_age: Segundos que vale el índice de un ejemplo
+        """
+        self.db_file = db_file
+        self.on_progress = on_progress
+        self.refresh_age = refresh_age
+        self.available = True
+        self.remote = None
+        self.progress = (0, 0)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS notes (
+                    id INTEGER PRIMARY KEY,
+                    example TEXT NOT NULL,
+                    cid TEXT NOT NULL,
+                    path TEXT,
+                    user TEXT,
+                    ts REAL,
+                    parent_id TEXT,
+                    root_id TEXT,
+                    data TEXT NOT NULL,
+                    UNIQUE (example, cid)
+                );
+                CREATE INDEX IF NOT EXISTS notes_user ON notes (user, ts);
+                CREATE INDEX IF NOT EXISTS notes_ts ON notes (ts);
+                CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts
+                    USING fts5(text, tokenize="unicode61 remove_diacritics 2");
+                CREATE TABLE IF NOT EXISTS indexed (
+                    example TEXT PRIMARY KEY,
+                    fetched REAL NOT NULL
+                );
+            """)
+        except sqlite3.OperationalError as e:
+            # SQLite compilado sin FTS5: la búsqueda queda desactivada
+            METRICS.error("comment_search", f"Búsqueda de notas no disponible: {e}")
+            self.available = False
+        if self.available and self._conn.execute("PRAGMA user_version").fetchone()[0] < KEY_SCHEME:
+            # Índice con keys del esquema anterior: se reconstruye al conectar
+            with self._conn:
+                self._conn.execute("DELETE FROM notes_fts")
+                self._conn.execute("DELETE FROM notes")
+                self._conn.execute("DELETE FROM indexed")
+            self._conn.execute(f"PRAGMA user_version = {KEY_SCHEME}")
+        self._conn.commit()
+        self._read = sqlite3.connect(db_file, check_same_thread=False)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def attach_remote(self, remote) -> None:
+        """Conecta el backend y pone al día los ejemplos caducados"""
+        self._queue.put(("remote", remote))
+
+    def reindex(self) -> None:
+        """Vuelve a descargar todos los ejemplos"""
+        self._queue.put(("reindex", None))
+
+    def apply_changes(self, safe_path: str, comments: dict, changed_ids) -> None:
+        """
+        Cambios del listener de un ejemplo; se puede llamar desde cualquier hilo
+
+        Args:
+            safe_path: Key normalizada del ejemplo
+            comments: Estado actual de los comentarios (al menos de los cambiados)
+            changed_ids: IDs cambiados; los que no están en comments se han borrado
+        """
+        changed = {cid: comments.get(cid) for cid in changed_ids}
+        self._queue.put(("changes", (safe_path, changed)))
+
+    def stop(self) -> None:
+        self._queue.put(("stop", None))
+
+    # --- Consultas (hilo de Tk) ---
+
+    def search(self, text: str = "", user: str = None, since: float = None, until: float = None,
+               limit: int = RESULT_LIMIT) -> list:
+        """
+        Notas que contienen text, de más a menos relevante
+
+        Sin texto devuelve las notas más recientes que cumplen los filtros.
+
+        Args:
+            text: Palabras a buscar (la última también como prefijo)
+            user: Solo notas de este usuario (opcional)
+            since: Timestamp mínimo en ms (opcional)
+            until: Timestamp máximo en ms (opcional)
+            limit: Número máximo de resultados
+
+        Returns:
+            Lista de dicts con example, path, cid, user, ts, parent_id, root_id y snippet
+        """
+        if not self.available:
+            return []
+        filters = []
+        params = []
+        if user:
+            filters.append("n.user = ?")
+            params.append(user)
+        if since is not None:
+            filters.append("n.ts >= ?")
+            params.append(since)
+        if until is not None:
+            filters.append("n.ts <= ?")
+            params.append(until)
+        query = fts_query(text)
+        where = "".join(f" AND {f}" for f in filters)
+        with METRICS.span("comment_search.query"):
+            if query:
+                sql = (f"SELECT n.example, n.cid, n.user, n.ts, n.parent_id, n.root_id, "
+                       f"snippet(notes_fts, 0, '«', '»', '…', {SNIPPET_TOKENS}) "
+                       f"FROM notes_fts JOIN notes n ON n.id = notes_fts.rowid "
+                       f"WHERE notes_fts MATCH ?{where} ORDER BY bm25(notes_fts), n.ts DESC LIMIT ?")
+                rows = self._read.execute(sql, [query, *params, limit]).fetchall()
+            elif filters:
+                sql = (f"SELECT n.example, n.cid, n.user, n.ts, n.parent_id, n.root_id, "
+                       f"substr(f.text, 1, 120) FROM notes n JOIN notes_fts f ON f.rowid = n.id "
+                       f"WHERE 1{where} ORDER BY n.ts DESC LIMIT ?")
+                rows = self._read.execute(sql, [*params, limit]).fetchall()
+            else:
+                return []
+        keys = ("example", "cid", "user", "ts", "parent_id", "root_id", "snippet")
+        results = [dict(zip(keys, row)) for row in rows]
+        for result in results:
+            # La ruta sale de la key, sin depender del original_path de cada nota
+            result["path"] = decode_key(result["example"])
+        return results
+
+    def users(self) -> list:
+        if not self.available:
+            return []
+        return [row[0] for row in self._read.execute(
+            "SELECT DISTINCT user FROM notes WHERE user IS NOT NULL ORDER BY user")]
+
+    def thread_path(self, safe_path: str, cid: str) -> list:
+        """
+        Comentarios desde la raíz del hilo hasta cid, para saltar a la nota
+
+        Returns:
+            Lista [(id, comentario)] de la raíz a cid; vacía si no está indexado
+        """
+        path = []
+        seen = set()
+        current = cid
+        while current is not None and current not in seen:
+            seen.add(current)
+            row = self._read.execute("SELECT data FROM notes WHERE example = ? AND cid = ?",
+                                     (safe_path, current)).fetchone()
+            if row is None:
+                break
+            comment = json.loads(row[0])
+            path.append((current, comment))
+            current = comment.get('parent_id')
+        path.reverse()
+        return path
+
+    def count(self) -> int:
+        if not self.available:
+            return 0
+        return self._read.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    # --- Escritura (hilo de fondo) ---
+
+    def _run(self):
+        remote = None
+        pending = []
+        while True:
+            try:
+                # Con ejemplos por descargar solo se miran los mensajes sin esperar
+                kind, payload = self._queue.get(block=not pending)
+            except queue.Empty:
+                kind, payload = None, None
+            try:
+                if kind == "stop":
+                    return
+                if not self.available:
+                    continue
+                if kind == "remote":
+                    remote = self.remote = payload
+                    pending = self._plan(remote, force=False)
+                elif kind == "reindex" and remote is not None:
+                    pending = self._plan(remote, force=True)
+                elif kind == "changes":
+                    self._apply(*payload)
+                elif kind is None and pending:
+                    self._stream(remote, pending.pop())
+                    done, total = self.progress
+                    self._set_progress(done + 1, total)
+            except Exception as e:
+                METRICS.error("comment_search", f"Error indexando notas: {e}")
+
+    def _set_progress(self, done, total):
+        self.progress = (done, total)
+        if self.on_progress:
+            self.on_progress(done, total)
+
+    def _plan(self, remote, force):
+        keys = remote.get_example_keys()
+        fetched = dict(self._conn.execute("SELECT example, fetched FROM indexed"))
+        gone = [key for key in fetched if key not in keys]
+        if gone:
+            # Ejemplos que ya no tienen notas
+            with self._conn:
+                for key in gone:
+                    self._delete_example(key)
+        now = time.time()
+        stale = sorted(key for key in keys if force or now - fetched.get(key, 0) > self.refresh_age)
+        self._set_progress(0, len(stale))
+        # pop() saca del final: se indexa en orden alfabético
+        return stale[::-1]
+
+    def _stream(self, remote, safe_path):
+        with METRICS.span("comment_search.index_example"):
+            comments = remote.get_key(safe_path)
+            with self._conn:
+                self._delete_example(safe_path)
+                roots = thread_roots(comments)
+                for cid, comment in comments.items():
+                    if isinstance(comment, dict):
+                        self._insert(safe_path, cid, comment, roots.get(cid, cid))
+                self._conn.execute("INSERT OR REPLACE INTO indexed (example, fetched) VALUES (?, ?)",
+                                   (safe_path, time.time()))
+        METRICS.increment("comment_search.indexed_notes", len(comments))
+
+    def _apply(self, safe_path, changed):
+        with self._conn:
+            for cid, comment in changed.items():
+                self._delete_note(safe_path, cid)
+                if isinstance(comment, dict):
+                    self._insert(safe_path, cid, comment, self._root_of(safe_path, cid, comment))
+
+    def _root_of(self, safe_path, cid, comment):
+        parent = comment.get('parent_id')
+        if parent is None:
+            return cid
+        row = self._conn.execute("SELECT root_id FROM notes WHERE example = ? AND cid = ?",
+                                 (safe_path, parent)).fetchone()
+        return row[0] if row else parent
+
+    def _insert(self, safe_path, cid, comment, root_id):
+        timestamp = comment.get('timestamp')
+        cursor = self._conn.execute(
+            "INSERT INTO notes (example, cid, path, user, ts, parent_id, root_id, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (safe_path, cid, comment.get('original_path'), comment.get('user'),
+             timestamp if isinstance(timestamp, (int, float)) else None,
+             comment.get('parent_id'), root_id, json.dumps(comment))
+        )
+        self._conn.execute("INSERT INTO notes_fts (rowid, text) VALUES (?, ?)",
+                           (cursor.lastrowid, str(comment.get('text', ''))))
+
+    def _delete_note(self, safe_path, cid):
+        row = self._conn.execute("SELECT id FROM notes WHERE example = ? AND cid = ?", (safe_path, cid)).fetchone()
+        if row:
+            self._conn.execute("DELETE FROM notes_fts WHERE rowid = ?", row)
+            self._conn.execute("DELETE FROM notes WHERE id = ?", row)
+
+    def _delete_example(self, safe_path):
+        self._conn.execute("DELETE FROM notes_fts WHERE rowid IN (SELECT id FROM notes WHERE example = ?)",
+                           (safe_path,))
+        self._conn.execute("DELETE FROM notes WHERE example = ?", (safe_path,))
+        self._conn.execute("DELETE FROM indexed WHERE example = ?", (safe_path,))
@@ -0,0 +1,164 @@
+import threading
+
+
+class CommentStore:
+    def __init__(self, comments: dict = None):
+        """
+        Copia local de los comentarios de un ejemplo
+
+        Aplica los eventos 'put'/'patch' del listener de Firebase según su
+        event.path, sin volver a descargar el hilo completo, y mantiene el
+        índice de hijos por parent_id de forma incremental.
+
+        Args:
+            comments: Comentarios iniciales {id: datos} (opcional)
+        """
+        self.comments = {}
+        self.children = {}
+        self._lock = threading.Lock()
+        if comments:
+            self.reset(comments)
+
+    def reset(self, comments: dict) -> set:
+        """
+        Sustituye todo el contenido del store
+
+        Args:
+            comments: Nuevos comentarios {id: datos}
+
+        Returns:
+            IDs de los comentarios que han cambiado (los iguales no cuentan:
+            tras reconectar solo se entrega la diferencia)
+        """
+        with self._lock:
+            old = self.comments
+            self.comments = {}
+            self.children = {}
+            for cid, comment in (comments or {}).items():
+                if isinstance(comment, dict):
+                    self._insert(cid, dict(comment))
+            changed = {cid for cid, comment in self.comments.items() if old.get(cid) != comment}
+            changed.update(cid for cid in old if cid not in self.comments)
+            return changed
+
+    def apply_event(self, event_type: str, path: str, data) -> set:
+        """
+        Aplica un evento del listener de Firebase
+
+        Args:
+            event_type: 'put' o 'patch'
+            path: event.path relativo al ejemplo escuchado ('/', '/<id>', '/<id>/text'...)
+            data: event.data
+
+        Returns:
+            IDs de los comentarios insertados, editados o borrados
+        """
+        segments = [s for s in (path or "/").split("/") if s]
+        if event_type == 'put':
+            if not segments:
+                return self.reset(data if isinstance(data, dict) else {})
+            with self._lock:
+                return self._put(segments, data)
+        if event_type == 'patch' and isinstance(data, dict):
+            changed = set()
+            with self._lock:
+                for key, value in data.items():
+                    sub_segments = segments + [s for s in key.split("/") if s]
+                    if sub_segments:
+                        changed |= self._put(sub_segments, value)
+            return changed
+        return set()
+
+    def snapshot(self) -> dict:
+        """
+        Copia superficial de los comentarios actuales
+
+        Los comentarios modificados se sustituyen por un dict nuevo en vez de
+        editarse en el sitio, así que la copia es consistente sin copiar cada
+        comentario.
+        """
+        with self._lock:
+            return dict(self.comments)
+
+    def changes(self, ids) -> dict:
+        """Estado actual de los comentarios indicados: {id: datos o None si no existe}"""
+        with self._lock:
+            return {cid: self.comments.get(cid) for cid in ids}
+
+    def __len__(self):
+        with self._lock:
+            return len(self.comments)
+
+    def replies(self, parent_id: str = None) -> list:
+        """IDs de los comentarios cuyo parent_id es parent_id"""
+        with self._lock:
+            return list(self.children.get(parent_id, ()))
+
+    def _put(self, segments: list, value) -> set:
+        cid = segments[0]
+        if len(segments) == 1:
+            self._remove(cid)
+            if isinstance(value, dict):
+                self._insert(cid, dict(value))
+            return {cid}
+
+        old = self.comments.get(cid)
+        if old is None and value is None:
+            return set()
+        comment = dict(old or {})
+        # Copia los niveles anidados que se van a modificar
+        node = comment
+        for key in segments[1:-1]:
+            child = node.get(key)
+            node[key] = dict(child) if isinstance(child, dict) else {}
+            node = node[key]
+        if value is None:
+            node.pop(segments[-1], None)
+        else:
+            node[segments[-1]] = value
+
+        self._remove(cid)
+        self._insert(cid, comment)
+        return {cid}
+
+    def _insert(self, cid: str, comment: dict):
+        self.comments[cid] = comment
+        self.children.setdefault(comment.get('parent_id'), set()).add(cid)
+
+    def _remove(self, cid: str):
+        comment = self.comments.pop(cid, None)
+        if comment is None:
+            return
+        parent = comment.get('parent_id')
+        siblings = self.children.get(parent)
+        if siblings is not None:
+            siblings.discard(cid)
+            if not siblings:
+                del self.children[parent]
+
+
+def collect_thread(comments: dict, comment_id: str) -> list:
+    """
+    IDs de un comentario y de todas sus respuestas, sin recursión
+
+    Args:
+        comments: Comentarios {id: datos} del ejemplo
+        comment_id: ID del comentario raíz del hilo
+
+    Returns:
+        Lista con comment_id seguido de sus descendientes
+    """
+    children = {}
+    for cid, comment in comments.items():
+        children.setdefault(comment.get('parent_id'), []).append(cid)
+    ids = []
+    stack = [comment_id]
+    seen = set()
+    while stack:
+        cid = stack.pop()
+        if cid in seen:
+            continue
+        seen.add(cid)
+        ids.append(cid)
+        stack.extend(children.get(cid, ()))
+    return ids
@@ -0,0 +1,381 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from key_codec import migrated_key
+
+DEFAULT_CHUNK = 500
+MAX_CHUNK_BYTES = 4 * 1024 * 1024
+DEFAULT_WORKERS = 4
+RETRIES = 3
+RETRY_BASE = 1.0
+REPORT_INTERVAL = 2.0
+INVALID_KEY_CHARS = set(".$#[]/")
+
+
+def _write_checkpoint(path: str, data: dict) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=".sofa_transfer", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_file, path)
+    except OSError:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+
+def _read_checkpoint(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Throughput:
+    def __init__(self, label: str, interval: float = REPORT_INTERVAL):
+        """Cuenta comentarios y bytes e imprime el ritmo cada interval segundos"""
+        self.label = label
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.comments = 0
+        self.bytes = 0
+        self._last_report = self.start
+        self._lock = threading.Lock()
+
+    def add(self, comments: int, size: int) -> None:
+        with self._lock:
+            self.comments += comments
+            self.bytes += size
+            now = time.perf_counter()
+            if now - self._last_report < self.interval:
+                return
+            self._last_report = now
+        print(f"  {self.summary()}", flush=True)
+
+    def summary(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return (f"{self.label}: {self.comments} comentarios, {self.bytes / 1048576:.1f} MB en {elapsed:.1f} s "
+                f"({self.comments / elapsed:.0f} coment./s, {self.bytes / 1048576 / elapsed:.2f} MB/s)")
+
+
+def export_comments(backend, output: str, restart: bool = False, report: Throughput = None) -> dict:
+    """
+    Exporta /sofa_comments a NDJSON, un ejemplo cada vez
+
+    Las keys de los ejemplos salen de una lectura shallow; cada ejemplo se
+    descarga, se escribe y se suelta antes de pedir el siguiente, así que
+    la memoria depende del ejemplo más grande y no del total. Tras cada
+    ejemplo se guardan en <output>.export-checkpoint la última key completa
+    y el tamaño del archivo; al relanzar, se recorta lo escrito después y
+    se sigue desde la key siguiente.
+
+    Cada línea es {"example": key, "id": id, "data": comentario}.
+
+    Returns:
+        Dict con examples, comments, bytes y resumed (ejemplos saltados)
+    """
+    checkpoint_file = output + ".export-checkpoint"
+    checkpoint = None if restart else _read_checkpoint(checkpoint_file)
+    keys = sorted(backend.get_example_keys())
+    report = report or Throughput("Exportado")
+
+    if checkpoint and os.path.exists(output):
+        # Lo escrito tras el último checkpoint es un ejemplo a medias
+        with open(output, "r+b") as f:
+            f.truncate(checkpoint["offset"])
+        keys = [key for key in keys if key > checkpoint["last"]]
+        mode = "ab"
+        resumed = checkpoint["examples"]
+    else:
+        checkpoint = {"last": "", "offset": 0, "examples": 0, "comments": 0}
+        mode = "wb"
+        resumed = 0
+
+    with open(output, mode) as f:
+        for key in keys:
+            comments = backend.get_key(key) or {}
+            size = 0
+            for cid, comment in comments.items():
+                line = json.dumps({"example": key, "id": cid, "data": comment}, ensure_ascii=False) + "\n"
+                data = line.encode("utf-8")
+                f.write(data)
+                size += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+            checkpoint = {
+                "last": key,
+                "offset": f.tell(),
+                "examples": checkpoint["examples"] + 1,
+                "comments": checkpoint["comments"] + len(comments)
+            }
+            _write_checkpoint(checkpoint_file, checkpoint)
+            report.add(len(comments), size)
+
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    return {"examples": checkpoint["examples"], "comments": checkpoint["comments"],
+            "bytes": os.path.getsize(output), "resumed": resumed}
+
+
+def _update_with_retry(backend, updates: dict) -> None:
+    for attempt in range(RETRIES):
+        try:
+            backend.update(updates)
+            return
+        except Exception:
+            if attempt == RETRIES - 1:
+                raise
+            time.sleep(RETRY_BASE * 2 ** attempt)
+
+
+def parse_line(line: str):
+    """
+    Valida una línea del NDJSON
+
+    Returns:
+        (ruta relativa a /sofa_comments, comentario)
+
+    Raises:
+        ValueError: Si la línea no es un comentario válido
+    """
+    entry = json.loads(line)
+    if not isinstance(entry, dict):
+        raise ValueError("no es un objeto")
+    example, cid, data = entry.get("example"), entry.get("id"), entry.get("data")
+    for name, key in (("example", example), ("id", cid)):
+        if not isinstance(key, str) or not key or INVALID_KEY_CHARS & set(key):
+            raise ValueError(f"{name} no es una key válida: {key!r}")
+    if not isinstance(data, dict):
+        raise ValueError("data no es un objeto")
+    return f"{example}/{cid}", data
+
+
+class _Importer:
+    def __init__(self, backend, workers: int, checkpoint_file: str, report: Throughput):
+        # Los lotes terminan en cualquier orden; el checkpoint es la línea
+        # hasta la que todo está escrito
+        self.backend = backend
+        self.checkpoint_file = checkpoint_file
+        self.report = report
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers * 2)
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.done_line = 0
+        self.failed = []
+
+    def submit(self, first_line: int, last_line: int, updates: dict, size: int):
+        # Como mucho workers * 2 lotes en memoria
+        self.slots.acquire()
+        with self.lock:
+            self.pending[first_line] = None
+        self.executor.submit(self._write, first_line, last_line, updates, size)
+
+    def _write(self, first_line, last_line, updates, size):
+        try:
+            try:
+                _update_with_retry(self.backend, updates)
+            except Exception as e:
+                self.failed.append((first_line, last_line, str(e)))
+                print(f"Error importando líneas {first_line}-{last_line}: {e}")
+                return
+            self.report.add(len(updates), size)
+            self._complete(first_line, last_line)
+        finally:
+            self.slots.release()
+
+    def _complete(self, first_line, last_line):
+        with self.lock:
+            self.pending[first_line] = last_line
+            advanced = False
+            while self.pending:
+                first = min(self.pending)
+                last = self.pending[first]
+                if last is None or first != self.done_line + 1:
+                    break
+                del self.pending[first]
+                self.done_line = last
+                advanced = True
+            if advanced and not self.failed:
+                _write_checkpoint(self.checkpoint_file, {"line": self.done_line})
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def import_comments(backend, source: str, chunk: int = DEFAULT_CHUNK, workers: int = DEFAULT_WORKERS,
+                    restart: bool = False, report: Throughput = None) -> dict:
+    """
+    Importa un NDJSON de export_comments con escrituras multi-ruta
+
+    Las líneas se leen en streaming y se agrupan en lotes de chunk
+    comentarios (o MAX_CHUNK_BYTES); cada lote es un update() atómico
+    relativo a /sofa_comments y se envían hasta workers a la vez. Escribir
+    un comentario en su ruta es idempotente, así que repetir un lote no
+    duplica nada; aun así se guarda en <source>.import-checkpoint la última línea
+    con todo lo anterior escrito para no repetir trabajo al relanzar.
+
+    Returns:
+        Dict con comments, invalid (líneas descartadas), failed (lotes fallidos) y resumed
+    """
+    checkpoint_file = source + ".import-checkpoint"
+    checkpoint = None if restart else _read_checkpoint(checkpoint_file)
+    skip = checkpoint["line"] if checkpoint else 0
+    report = report or Throughput("Importado")
+    importer = _Importer(backend, workers, checkpoint_file, report)
+    importer.done_line = skip
+    invalid = 0
+    comments = 0
+    updates = {}
+    size = 0
+    first_line = skip + 1
+    line_number = 0
+    try:
+        with open(source, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if line_number <= skip:
+                    continue
+                if line.strip():
+                    try:
+                        path, data = parse_line(line)
+                        updates[path] = data
+                        size += len(line)
+                        comments += 1
+                    except ValueError as e:
+                        invalid += 1
+                        print(f"Línea {line_number} descartada: {e}")
+                if len(updates) >= chunk or size >= MAX_CHUNK_BYTES:
+                    importer.submit(first_line, line_number, updates, size)
+                    updates, size, first_line = {}, 0, line_number + 1
+            if updates:
+                importer.submit(first_line, line_number, updates, size)
+    finally:
+        importer.close()
+
+    if not importer.failed and os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    return {"comments": comments, "invalid": invalid, "failed": len(importer.failed), "resumed": skip}
+
+
+def migrate_keys(backend, chunk: int = DEFAULT_CHUNK, dry_run: bool = False, report: Throughput = None) -> dict:
+    """
+    Pasa las keys de /sofa_comments del esquema anterior al de key_codec
+
+    Solo se descargan los ejemplos cuya key cambia (lectura shallow de las
+    keys y luego un ejemplo cada vez). Cada comentario va a la key de su
+    original_path, o a la deducida de la key antigua si no lo tiene, con
+    escrituras multi-ruta de hasta chunk comentarios que crean el nuevo y
+    borran el antiguo a la vez: un comentario nunca queda duplicado ni
+    perdido. Si se interrumpe, basta con relanzarla; lo ya movido no vuelve
+    a aparecer como pendiente.
+
+    Returns:
+        Dict con examples (keys revisadas), moved (comentarios movidos) y failed
+    """
+    report = report or Throughput("Migrado")
+    keys = sorted(key for key in backend.get_example_keys() if migrated_key(key) is not None)
+    moved = 0
+    failed = 0
+    for key in keys:
+        comments = backend.get_key(key)
+        updates = {}
+        size = 0
+        for cid, comment in comments.items():
+            original_path = comment.get('original_path') if isinstance(comment, dict) else None
+            target = migrated_key(key, original_path)
+            if target is None:
+                continue
+            updates[f"{target}/{cid}"] = comment
+            updates[f"{key}/{cid}"] = None
+            size += len(json.dumps(comment))
+            if len(updates) >= chunk * 2 or size >= MAX_CHUNK_BYTES:
+                failed += _move(backend, key, updates, size, dry_run, report)
+                moved += len(updates) // 2
+                updates, size = {}, 0
+        if updates:
+            failed += _move(backend, key, updates, size, dry_run, report)
+            moved += len(updates) // 2
+    return {"examples": len(keys), "moved": moved - failed, "failed": failed}
+
+
+def _move(backend, key, updates, size, dry_run, report):
+    # Devuelve los comentarios que no se han podido mover
+    if dry_run:
+        for path in updates:
+            if updates[path] is not None:
+                print(f"  {key} -> {path}")
+    else:
+        try:
+            _update_with_retry(backend, updates)
+        except Exception as e:
+            print(f"Error migrando {key}: {e}")
+            return len(updates) // 2
+    report.add(len(updates) // 2, size)
+    return 0
+
+
+def transfer_main(argv: list, create_backend: callable) -> int:
+    """
+    Puntos de entrada python interfaz_sofa.py export|import|migrate-keys [opciones]
+
+    Args:
+        argv: Argumentos empezando por "export", "import" o "migrate-keys"
+        create_backend: Crea el backend de comentarios (Firebase o el local)
+
+    Returns:
+        Código de salida: 0 si todo va bien, 1 si hay errores
+    """
+    parser = argparse.ArgumentParser(prog="interfaz_sofa.py",
+                                     description="Copia de seguridad y migración de /sofa_comments en NDJSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Exporta todos los comentarios")
+    export_parser.add_argument("output", help="Archivo NDJSON de salida")
+    export_parser.add_argument("--restart", action="store_true", help="Ignora el checkpoint y empieza de cero")
+    import_parser = commands.add_parser("import", help="Importa comentarios exportados")
+    import_parser.add_argument("source", help="Archivo NDJSON de entrada")
+    import_parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="Comentarios por escritura")
+    import_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Escrituras simultáneas")
+    import_parser.add_argument("--restart", action="store_true", help="Ignora el checkpoint y empieza de cero")
+    migrate_parser = commands.add_parser("migrate-keys", help="Pasa las keys al esquema reversible")
+    migrate_parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="Comentarios por escritura")
+    migrate_parser.add_argument("--dry-run", action="store_true", help="Solo muestra lo que se movería")
+    args = parser.parse_args(argv)
+
+    backend = create_backend()
+    if args.command == "export":
+        report = Throughput("Exportado")
+        result = export_comments(backend, args.output, args.restart, report)
+        if result["resumed"]:
+            print(f"Reanudado tras {result['resumed']} ejemplos ya exportados")
+        print(report.summary())
+        print(f"{result['examples']} ejemplos, {result['comments']} comentarios en {args.output}")
+        return 0
+
+    if args.command == "migrate-keys":
+        report = Throughput("Migrado")
+        result = migrate_keys(backend, max(1, args.chunk), args.dry_run, report)
+        print(report.summary())
+        action = "a mover" if args.dry_run else "movidos"
+        print(f"{result['examples']} keys revisadas, {result['moved']} comentarios {action}")
+        if result["failed"]:
+            print(f"{result['failed']} comentarios sin mover: relanza el mismo comando para reintentarlos")
+            return 1
+        return 0
+
+    report = Throughput("Importado")
+    result = import_comments(backend, args.source, max(1, args.chunk), max(1, args.workers), args.restart, report)
+    if result["resumed"]:
+        print(f"Reanudado desde la línea {result['resumed'] + 1}")
+    print(report.summary())
+    if result["invalid"]:
+        print(f"{result['invalid']} líneas descartadas")
+    if result["failed"]:
+        print(f"{result['failed']} lotes fallidos: relanza el mismo comando para reintentarlos")
+        return 1
+    return 0
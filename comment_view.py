@@ -0,0 +1,414 @@
+import bisect
+import tkinter as tk
+from tkinter import ttk
+from datetime import datetime
+from attachments import attachment_refs, thumbnail_size
+
+ESTIMATED_ROW_HEIGHT = 90
+ROW_PADDING = 10
+INDENT = 10
+MAX_INDENT_LEVEL = 12
+
+
+def format_timestamp(timestamp) -> str:
+    """Texto a mostrar para el campo timestamp de un comentario"""
+    if isinstance(timestamp, dict):
+        return "Recién guardado"
+    if isinstance(timestamp, (int, float)):
+        return datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d %H:%M:%S')
+    return timestamp or 'Fecha desconocida'
+
+
+def sort_key(comment: dict):
+    # Los timestamps pendientes del servidor ({'.sv': ...}) son los más recientes
+    timestamp = comment.get('timestamp', 0)
+    return timestamp if isinstance(timestamp, (int, float)) else float('inf')
+
+
+class CommentRow:
+    def __init__(self, parent, cid: str, comment: dict, is_own: bool, actions: dict, reply_state=None,
+                 attachment_photo: callable = None):
+        """
+        Widgets de un comentario: cabecera, texto, imágenes adjuntas y botones
+
+        Args:
+            parent: Widget contenedor (el canvas de comentarios)
+            cid: ID del comentario
+            comment: Datos del comentario
+            is_own: Si el comentario es del usuario actual
+            actions: Callbacks 'edit', 'delete', 'reply' y 'toggle_replies' que
+                reciben el ID, y 'open_attachment' (opcional) que recibe el hash
+            reply_state: (número de respuestas, hilo desplegado) o None si las
+                respuestas se muestran siempre
+            attachment_photo: Función hash -> PhotoImage de la miniatura o None
+                si aún no está (opcional)
+        """
+        self.user = comment.get('user', 'Anónimo')
+        self.item = None
+        self.actions = actions
+        self.attachment_photo = attachment_photo
+        self.attachment_keys = ()
+        self.attachment_labels = {}
+        self.attachments_frame = None
+        self.frame = ttk.Frame(parent)
+
+        header_frame = ttk.Frame(self.frame)
+        header_frame.pack(fill=tk.X)
+
+        initials = "".join([w[0] for w in self.user.split() if w]).upper()[:2]
+        ttk.Label(header_frame, text=f"👤[{initials}] {self.user}").pack(side=tk.LEFT)
+        self.time_label = ttk.Label(header_frame, style="Status.TLabel")
+        self.time_label.pack(side=tk.LEFT, padx=10)
+
+        self.text_label = ttk.Label(self.frame, wraplength=350, anchor='w')
+        self.text_label.pack(fill=tk.X)
+
+        self.btn_frame = btn_frame = ttk.Frame(self.frame)
+        btn_frame.pack(fill=tk.X)
+
+        if is_own:
+            ttk.Button(btn_frame, text="Editar",
+                       command=lambda: actions['edit'](cid)).pack(side=tk.LEFT, padx=2)
+            ttk.Button(btn_frame, text="Borrar",
+                       command=lambda: actions['delete'](cid)).pack(side=tk.LEFT, padx=2)
+
+        ttk.Button(btn_frame, text="Responder",
+                   command=lambda: actions['reply'](cid)).pack(side=tk.LEFT, padx=2)
+
+        self.replies_button = ttk.Button(btn_frame, command=lambda: actions['toggle_replies'](cid))
+
+        self.update(comment, reply_state)
+
+    def update(self, comment: dict, reply_state=None):
+        """Actualiza el texto, la fecha y el botón de respuestas sin recrear los widgets"""
+        count, expanded = reply_state or (0, False)
+        if expanded:
+            self.replies_button.config(text="Ocultar respuestas")
+            self.replies_button.pack(side=tk.LEFT, padx=2)
+        elif count:
+            self.replies_button.config(text=f"Ver respuestas ({count})")
+            self.replies_button.pack(side=tk.LEFT, padx=2)
+        else:
+            self.replies_button.pack_forget()
+
+        if comment.get('_pending'):
+            self.time_label.config(text="⏳ Pendiente de sincronizar")
+        else:
+            self.time_label.config(text=f"🕒 {format_timestamp(comment.get('timestamp', 'Fecha desconocida'))}")
+        self.text_label.config(text=comment.get('text', ''))
+
+        refs = attachment_refs(comment)
+        keys = tuple(ref['hash'] for ref in refs)
+        if keys != self.attachment_keys:
+            self._build_attachments(refs)
+            self.attachment_keys = keys
+
+    def _build_attachments(self, refs: list):
+        if self.attachments_frame is not None:
+            self.attachments_frame.destroy()
+            self.attachments_frame = None
+        self.attachment_labels = {}
+        if not refs:
+            return
+        self.attachments_frame = ttk.Frame(self.frame)
+        self.attachments_frame.pack(fill=tk.X, pady=2, before=self.btn_frame)
+        open_attachment = self.actions.get('open_attachment')
+        for ref in refs:
+            # Hueco en blanco del tamaño final: la fila no cambia de altura al llegar la miniatura
+            width, height = thumbnail_size(ref['width'], ref['height'])
+            placeholder = tk.PhotoImage(width=width, height=height)
+            label = tk.Label(self.attachments_frame, image=placeholder, borderwidth=1, relief=tk.SOLID,
+                             cursor="hand2" if open_attachment else "")
+            label.placeholder = placeholder
+            label.pack(side=tk.LEFT, padx=2)
+            if open_attachment:
+                label.bind("<Button-1>", lambda e, digest=ref['hash']: open_attachment(digest))
+            self.attachment_labels[ref['hash']] = label
+        self.refresh_attachments()
+
+    def refresh_attachments(self, digests=None):
+        """Pone las miniaturas ya disponibles (todas, o solo las de digests)"""
+        if not self.attachment_photo:
+            return
+        for digest, label in self.attachment_labels.items():
+            if digests is not None and digest not in digests:
+                continue
+            photo = self.attachment_photo(digest)
+            if photo is not None:
+                label.config(image=photo)
+
+
+class CommentListView:
+    def __init__(self, canvas: tk.Canvas, scrollbar: ttk.Scrollbar, current_user: str, actions: dict,
+                 reply_state: callable = None, on_near_end: callable = None, attachment_photo: callable = None):
+        """
+        Lista virtualizada de comentarios sobre un canvas
+
+        Reutiliza los widgets de cada comentario por su ID, solo actualiza los
+        que han cambiado y solo construye las filas visibles o cercanas al área
+        visible. Las filas lejanas se destruyen y su altura medida se conserva
+        para mantener estable la posición del scroll.
+
+        Args:
+            canvas: Canvas donde se dibujan las filas
+            scrollbar: Scrollbar vertical asociada al canvas
+            current_user: Usuario actual (decide si se muestran Editar/Borrar)
+            actions: Callbacks 'edit', 'delete', 'reply' y 'toggle_replies' que
+                reciben el ID, y 'open_attachment' (opcional) que recibe el hash
+            reply_state: Función ID -> (número de respuestas, hilo desplegado)
+                para mostrar el botón de respuestas (opcional)
+            on_near_end: Se llama cuando se ve el final de la lista, para
+                cargar la siguiente página (opcional)
+            attachment_photo: Función hash -> PhotoImage de la miniatura o
+                None; solo se llama para las filas construidas (opcional)
+        """
+        self.canvas = canvas
+        self.scrollbar = scrollbar
+        self.current_user = current_user
+        self.actions = actions
+        self.reply_state = reply_state
+        self.on_near_end = on_near_end
+        self.attachment_photo = attachment_photo
+
+        self.comments = {}
+        self.order = []
+        self.positions = {}
+        self.offsets = []
+        self.total_height = 0
+        self.heights = {}
+        self.rows = {}
+
+        self.message = ttk.Label(canvas)
+        self.message_item = None
+        self._last_view = None
+        self._refresh_pending = False
+        self._in_layout = False
+
+        self.canvas.configure(yscrollcommand=self._on_yview)
+        self.canvas.bind("<Configure>", lambda e: self._schedule_refresh())
+
+    def clear(self, message: str = None):
+        """Borra todas las filas y vuelve al inicio (al cambiar de ejemplo)"""
+        for cid in list(self.rows):
+            self._destroy_row(cid)
+        self.comments = {}
+        self.order = []
+        self.positions = {}
+        self.heights = {}
+        self._compute_offsets()
+        self.canvas.yview_moveto(0)
+        if message:
+            self.show_message(message)
+        else:
+            self._hide_message()
+
+    def show_message(self, text: str):
+        """Muestra un aviso en lugar de la lista de comentarios"""
+        self.message.config(text=text)
+        if self.message_item is None:
+            self.message_item = self.canvas.create_window((10, 10), window=self.message, anchor="nw")
+
+    def _hide_message(self):
+        if self.message_item is not None:
+            self.canvas.delete(self.message_item)
+            self.message_item = None
+
+    def update(self, comments: dict, changed_ids: set = None):
+        """
+        Aplica un nuevo estado de comentarios conservando el scroll
+
+        Args:
+            comments: Comentarios actuales {id: datos}
+            changed_ids: IDs modificados; si es None se calculan comparando
+                con el estado anterior
+        """
+        comments = comments or {}
+        old = self.comments
+        if changed_ids is None:
+            changed_ids = {cid for cid in set(old) | set(comments) if old.get(cid) != comments.get(cid)}
+        self.comments = comments
+
+        if not comments:
+            self.clear("No hay notas para este ejemplo.")
+            return
+        self._hide_message()
+
+        anchor = self._anchor()
+        structural = not self.order
+        for cid in changed_ids:
+            before, after = old.get(cid), comments.get(cid)
+            if (before is None or after is None or
+                    before.get('parent_id') != after.get('parent_id') or
+                    before.get('timestamp') != after.get('timestamp')):
+                structural = True
+            row = self.rows.get(cid)
+            if row is not None:
+                if after is None or row.user != after.get('user', 'Anónimo'):
+                    self._destroy_row(cid)
+                else:
+                    row.update(after, self._reply_state(cid))
+            self.heights.pop(cid, None)
+
+        if structural:
+            self._flatten()
+        self._layout(anchor)
+
+    def refresh_attachments(self, digests):
+        """Pone en las filas construidas las miniaturas que acaban de llegar"""
+        digests = set(digests)
+        for row in self.rows.values():
+            if digests.intersection(row.attachment_keys):
+                row.refresh_attachments(digests)
+
+    def show(self, cid: str):
+        """Desplaza la vista para que el comentario quede arriba"""
+        index = self.positions.get(cid)
+        if index is None or not self.total_height:
+            return
+        self.canvas.yview_moveto(self.offsets[index] / self.total_height)
+        self._layout()
+
+    def _flatten(self):
+        # Recorrido iterativo del árbol: sin límite de recursión en hilos profundos
+        children = {}
+        for cid, comment in self.comments.items():
+            children.setdefault(comment.get('parent_id'), []).append(cid)
+        for ids in children.values():
+            ids.sort(key=lambda x: sort_key(self.comments[x]), reverse=True)
+
+        order = []
+        stack = [(cid, 0) for cid in reversed(children.get(None, []))]
+        while stack:
+            cid, level = stack.pop()
+            order.append((cid, level))
+            for child in reversed(children.get(cid, [])):
+                stack.append((child, level + 1))
+
+        self.order = order
+        self.positions = {cid: index for index, (cid, _) in enumerate(order)}
+        for cid in list(self.rows):
+            if cid not in self.positions:
+                self._destroy_row(cid)
+
+    def _width(self) -> int:
+        return max(self.canvas.winfo_width(), 200)
+
+    def _compute_offsets(self):
+        offsets = []
+        y = 0
+        for cid, _ in self.order:
+            offsets.append(y)
+            y += self.heights.get(cid, ESTIMATED_ROW_HEIGHT) + ROW_PADDING
+        self.offsets = offsets
+        self.total_height = y
+        self.canvas.configure(scrollregion=(0, 0, self._width(), max(y, 1)))
+
+    def _anchor(self):
+        if not self.offsets:
+            return None
+        top = self.canvas.canvasy(0)
+        if top <= 0:
+            return None
+        index = max(bisect.bisect_right(self.offsets, top) - 1, 0)
+        return self.order[index][0], top - self.offsets[index]
+
+    def _restore_anchor(self, anchor):
+        cid, delta = anchor
+        index = self.positions.get(cid)
+        if index is not None and self.total_height:
+            self.canvas.yview_moveto((self.offsets[index] + delta) / self.total_height)
+
+    def _visible_range(self):
+        top = self.canvas.canvasy(0)
+        height = max(self.canvas.winfo_height(), ESTIMATED_ROW_HEIGHT)
+        start = max(bisect.bisect_right(self.offsets, top - height) - 1, 0)
+        end = bisect.bisect_left(self.offsets, top + 2 * height)
+        return start, end
+
+    def _layout(self, anchor=None):
+        # _measure procesa tareas pendientes de Tk, que pueden volver a llamar aquí
+        if not self.order or self._in_layout:
+            return
+        self._in_layout = True
+        try:
+            self._layout_rows(anchor)
+        finally:
+            self._in_layout = False
+
+    def _layout_rows(self, anchor):
+        for _ in range(3):
+            self._compute_offsets()
+            if anchor:
+                self._restore_anchor(anchor)
+            start, end = self._visible_range()
+            for cid, _ in self.order[start:end]:
+                if cid not in self.rows:
+                    self._build_row(cid)
+            self._prune(start, end)
+            if not self._measure():
+                break
+        else:
+            self._compute_offsets()
+            if anchor:
+                self._restore_anchor(anchor)
+        self._place_rows()
+        if self.on_near_end and end >= len(self.order):
+            self.canvas.after_idle(self.on_near_end)
+
+    def _reply_state(self, cid: str):
+        return self.reply_state(cid) if self.reply_state else None
+
+    def _build_row(self, cid: str):
+        comment = self.comments[cid]
+        row = CommentRow(self.canvas, cid, comment, comment.get('user') == self.current_user, self.actions,
+                         self._reply_state(cid), self.attachment_photo)
+        row.item = self.canvas.create_window((0, self.offsets[self.positions[cid]]),
+                                             window=row.frame, anchor="nw")
+        self.rows[cid] = row
+
+    def _destroy_row(self, cid: str):
+        row = self.rows.pop(cid)
+        self.canvas.delete(row.item)
+        row.frame.destroy()
+
+    def _prune(self, start: int, end: int):
+        keep = end - start
+        for cid in list(self.rows):
+            index = self.positions[cid]
+            if index < start - keep or index > end + keep:
+                self._destroy_row(cid)
+
+    def _measure(self) -> bool:
+        if all(cid in self.heights for cid in self.rows):
+            return False
+        self.canvas.update_idletasks()
+        changed = False
+        for cid, row in self.rows.items():
+            height = row.frame.winfo_reqheight()
+            if self.heights.get(cid) != height:
+                self.heights[cid] = height
+                changed = True
+        return changed
+
+    def _place_rows(self):
+        width = self._width()
+        for cid, row in self.rows.items():
+            level = self.order[self.positions[cid]][1]
+            x = INDENT * min(level, MAX_INDENT_LEVEL)
+            self.canvas.coords(row.item, x, self.offsets[self.positions[cid]])
+            self.canvas.itemconfigure(row.item, width=max(width - x - INDENT, 100))
+
+    def _on_yview(self, first, last):
+        self.scrollbar.set(first, last)
+        if (first, last) != self._last_view:
+            self._schedule_refresh()
+        self._last_view = (first, last)
+
+    def _schedule_refresh(self):
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.canvas.after_idle(self._refresh)
+
+    def _refresh(self):
+        self._refresh_pending = False
+        self._layout()
@@ -0,0 +1,279 @@
+import os
+import json
+import threading
+from metrics import METRICS
+
+SCENE_EXTENSIONS = ('.scn', '.py', '.xml')
+INDEX_FILE = "sofa_examples_index.json"
+
+
+class ExampleIndexer:
+    def __init__(self, examples_dir: str, index_file: str = INDEX_FILE, batch_size: int = 200):
+        """
+        Indexa en segundo plano las escenas de la carpeta de ejemplos
+
+        El índice se guarda en disco por directorio (mtime del directorio y
+        tamaño/mtime de cada escena), de modo que una actualización solo vuelve
+        a listar los directorios cuyo mtime ha cambiado.
+
+        Args:
+            examples_dir: Carpeta raíz de los ejemplos SOFA
+            index_file: Archivo JSON donde se persiste el índice
+            batch_size: Número de rutas que se entregan en cada lote
+        """
+        self.examples_dir = examples_dir
+        self.index_file = index_file
+        self.batch_size = batch_size
+        self._dirs = {}
+        self._lock = threading.Lock()
+        # Serializa los recorridos completos y las actualizaciones por directorio
+        self._update_lock = threading.Lock()
+        self._cancel = None
+        self._thread = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("examples_dir") == self.examples_dir:
+            self._dirs = data.get("dirs", {})
+
+    def _save(self, dirs: dict):
+        tmp_file = f"{self.index_file}.tmp"
+        try:
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"examples_dir": self.examples_dir, "dirs": dirs}, f)
+            os.replace(tmp_file, self.index_file)
+        except OSError as e:
+            METRICS.error("examples.index", f"Error guardando índice de ejemplos: {e}")
+
+    def cached_paths(self) -> list:
+        """
+        Devuelve las rutas relativas del último índice guardado, sin tocar el disco
+
+        Returns:
+            Lista de rutas relativas en orden de recorrido
+        """
+        with self._lock:
+            dirs = self._dirs
+        paths = []
+        for rel_dir, entry in dirs.items():
+            for name in entry["files"]:
+                paths.append(os.path.join(rel_dir, name) if rel_dir else name)
+        return paths
+
+    def dir_mtimes(self) -> dict:
+        """mtime guardado de cada directorio indexado, por ruta relativa"""
+        with self._lock:
+            return {rel_dir: entry["mtime"] for rel_dir, entry in self._dirs.items()}
+
+    def update_dirs(self, rel_dirs) -> tuple:
+        """
+        Vuelve a leer solo los directorios indicados y actualiza el índice
+
+        Un subdirectorio nuevo se lee entero; uno que ya no existe se quita
+        con todo su contenido. Una escena que desaparece y otra que aparece
+        con el mismo tamaño y mtime se consideran un renombrado.
+
+        Args:
+            rel_dirs: Rutas relativas de los directorios que han cambiado
+
+        Returns:
+            (añadidas, eliminadas, renombradas); las renombradas son pares
+            (antigua, nueva) y no aparecen en las otras dos listas
+        """
+        with self._update_lock:
+            with self._lock:
+                dirs = dict(self._dirs)
+            added = {}
+            removed = {}
+            # Primero los más superficiales: si un padre ya quitó un subárbol no se relee
+            for rel_dir in sorted(set(rel_dirs), key=lambda d: (d.count(os.sep), d)):
+                if rel_dir in dirs or self._parent(rel_dir) in dirs:
+                    self._update_dir(dirs, rel_dir, added, removed)
+            if not added and not removed:
+                with self._lock:
+                    self._dirs = dirs
+                return [], [], []
+
+            # Un mismo archivo puede salir y volver a entrar (por ejemplo, git checkout)
+            for path in added.keys() & removed.keys():
+                del added[path]
+                del removed[path]
+            renamed = self._pair_renames(added, removed)
+            with self._lock:
+                self._dirs = dirs
+            self._save(dirs)
+        return list(added), list(removed), renamed
+
+    @staticmethod
+    def _parent(rel_dir):
+        return os.path.dirname(rel_dir) if rel_dir else None
+
+    @staticmethod
+    def _join(rel_dir, name):
+        return os.path.join(rel_dir, name) if rel_dir else name
+
+    def _update_dir(self, dirs, rel_dir, added, removed):
+        abs_dir = os.path.join(self.examples_dir, rel_dir) if rel_dir else self.examples_dir
+        old = dirs.get(rel_dir)
+        try:
+            entry = self._read_dir(abs_dir, os.stat(abs_dir).st_mtime)
+        except OSError:
+            if old is not None:
+                self._drop_tree(dirs, rel_dir, removed)
+            return
+
+        old_files = old["files"] if old else {}
+        for name, meta in entry["files"].items():
+            if name not in old_files:
+                added[self._join(rel_dir, name)] = meta
+        for name, meta in old_files.items():
+            if name not in entry["files"]:
+                removed[self._join(rel_dir, name)] = meta
+        dirs[rel_dir] = entry
+
+        old_subdirs = set(old["subdirs"]) if old else set()
+        for name in old_subdirs - set(entry["subdirs"]):
+            self._drop_tree(dirs, self._join(rel_dir, name), removed)
+        for name in entry["subdirs"]:
+            if name not in old_subdirs:
+                self._update_dir(dirs, self._join(rel_dir, name), added, removed)
+
+    def _drop_tree(self, dirs, rel_dir, removed):
+        entry = dirs.pop(rel_dir, None)
+        if entry is None:
+            return
+        for name, meta in entry["files"].items():
+            removed[self._join(rel_dir, name)] = meta
+        for name in entry["subdirs"]:
+            self._drop_tree(dirs, self._join(rel_dir, name), removed)
+
+    @staticmethod
+    def _pair_renames(added, removed):
+        by_identity = {}
+        for path, meta in removed.items():
+            identity = (os.path.splitext(path)[1].lower(), *meta)
+            by_identity[identity] = None if identity in by_identity else path
+        renamed = []
+        for path, meta in list(added.items()):
+            old_path = by_identity.pop((os.path.splitext(path)[1].lower(), *meta), None)
+            if old_path is not None:
+                renamed.append((old_path, path))
+                del added[path]
+                del removed[old_path]
+        return renamed
+
+    def scan(self) -> list:
+        """
+        Reconcilia el índice en el hilo actual, sin interfaz
+
+        Returns:
+            Todas las rutas relativas de escenas, en orden de recorrido
+        """
+        paths = []
+        self._scan(set(), threading.Event(), paths.extend, lambda removed: None, None)
+        return paths
+
+    def refresh(self, known: set, on_added: callable, on_removed: callable, on_done: callable = None):
+        """
+        Lanza un recorrido incremental en un hilo de fondo
+
+        Cancela el recorrido anterior si sigue en marcha. Los callbacks se
+        invocan desde el hilo de fondo.
+
+        Args:
+            known: Rutas que ya muestra la interfaz
+            on_added: Recibe cada lote de rutas nuevas
+            on_removed: Recibe las rutas que ya no existen
+            on_done: Recibe el número total de escenas al terminar (opcional)
+        """
+        self.cancel()
+        cancel = threading.Event()
+        self._cancel = cancel
+        self._thread = threading.Thread(
+            target=self._scan,
+            args=(set(known), cancel, on_added, on_removed, on_done),
+            daemon=True
+        )
+        self._thread.start()
+
+    def cancel(self):
+        """Detiene el recorrido en curso, si lo hay"""
+        if self._cancel:
+            self._cancel.set()
+
+    def _read_dir(self, abs_dir: str, mtime: float) -> dict:
+        files = {}
+        subdirs = []
+        with os.scandir(abs_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            subdirs.append(entry.name)
+                    elif entry.name.lower().endswith(SCENE_EXTENSIONS):
+                        stat = entry.stat()
+                        files[entry.name] = [stat.st_size, stat.st_mtime]
+                except OSError:
+                    continue
+        return {"mtime": mtime, "files": dict(sorted(files.items())), "subdirs": sorted(subdirs)}
+
+    def _scan(self, known, cancel, on_added, on_removed, on_done):
+        with self._update_lock:
+            self._scan_locked(known, cancel, on_added, on_removed, on_done)
+
+    def _scan_locked(self, known, cancel, on_added, on_removed, on_done):
+        with self._lock:
+            old_dirs = self._dirs
+        new_dirs = {}
+        seen = set()
+        batch = []
+        stack = [""]
+
+        while stack:
+            if cancel.is_set():
+                return
+            rel_dir = stack.pop()
+            abs_dir = os.path.join(self.examples_dir, rel_dir) if rel_dir else self.examples_dir
+            try:
+                mtime = os.stat(abs_dir).st_mtime
+                cached = old_dirs.get(rel_dir)
+                if cached and cached["mtime"] == mtime:
+                    entry = cached
+                else:
+                    entry = self._read_dir(abs_dir, mtime)
+            except OSError:
+                continue
+            new_dirs[rel_dir] = entry
+
+            for name in entry["files"]:
+                rel_path = os.path.join(rel_dir, name) if rel_dir else name
+                seen.add(rel_path)
+                if rel_path not in known:
+                    batch.append(rel_path)
+                    if len(batch) >= self.batch_size and not cancel.is_set():
+                        on_added(batch)
+                        batch = []
+            # Orden inverso para que la pila recorra igual que os.walk
+            for name in reversed(entry["subdirs"]):
+                stack.append(os.path.join(rel_dir, name) if rel_dir else name)
+
+        if cancel.is_set():
+            return
+        if batch:
+            on_added(batch)
+        removed = [path for path in known if path not in seen]
+        if removed:
+            on_removed(removed)
+
+        with self._lock:
+            self._dirs = new_dirs
+        self._save(new_dirs)
+        if on_done:
+            on_done(len(seen))
@@ -0,0 +1,266 @@
+import tkinter as tk
+
+ROW_HEIGHT = 20
+THUMB_ROW_HEIGHT = 56
+THUMB_WIDTH = 64
+TEXT_PADDING = 6
+SELECT_BG = "#0078d7"
+SELECT_FG = "white"
+BADGE_FG = "gray40"
+ALERT_FG = "#d00000"
+FONT = ('Consolas', 9)
+
+
+class ExampleListView:
+    def __init__(self, canvas: tk.Canvas, scrollbar, on_select: callable, on_activate: callable,
+                 thumbnail: callable = None, on_visible: callable = None, badge: callable = None):
+        """
+        Lista virtualizada de rutas de ejemplos sobre un Canvas
+
+        Solo existen items de canvas para las filas visibles; se reutilizan al
+        hacer scroll, así que el coste no depende del número de ejemplos. Con
+        las miniaturas activadas cada fila pide su imagen al hacerse visible.
+
+        Args:
+            canvas: Canvas donde se dibujan las filas
+            scrollbar: Scrollbar vertical asociada
+            on_select: Recibe la ruta seleccionada
+            on_activate: Recibe la ruta al hacer doble clic o pulsar Intro
+            thumbnail: Función ruta -> PhotoImage o None si aún no está cargada (opcional)
+            on_visible: Recibe la lista de rutas visibles tras cada redibujado (opcional)
+            badge: Función ruta -> (texto, alerta) que se muestra a la derecha de
+                la fila; con alerta el texto sale en rojo (opcional)
+        """
+        self.canvas = canvas
+        self.scrollbar = scrollbar
+        self.on_select = on_select
+        self.on_activate = on_activate
+        self.thumbnail = thumbnail
+        self.on_visible = on_visible
+        self.badge = badge
+        self.show_thumbnails = False
+        self.row_height = ROW_HEIGHT
+        self._items = []
+        self._index = {}
+        self._selected = None
+        self._rows = {}
+        self._pool = []
+        self._after_id = None
+
+        self.canvas.configure(yscrollcommand=self._on_scroll, yscrollincrement=self.row_height,
+                              background="white", takefocus=1)
+        self.scrollbar.configure(command=self.canvas.yview)
+        self.canvas.bind("<Configure>", lambda e: (self._invalidate(), self._update_region()))
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<Double-Button-1>", self._on_double_click)
+        self.canvas.bind("<Up>", lambda e: self._move(-1))
+        self.canvas.bind("<Down>", lambda e: self._move(1))
+        self.canvas.bind("<Prior>", lambda e: self._move(-self._page_rows()))
+        self.canvas.bind("<Next>", lambda e: self._move(self._page_rows()))
+        self.canvas.bind("<Return>", lambda e: self._activate())
+        self.canvas.bind("<MouseWheel>", lambda e: self.canvas.yview_scroll(int(-e.delta / 120) * 3, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-3, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.canvas.yview_scroll(3, "units"))
+
+    def __len__(self):
+        return len(self._items)
+
+    def items(self) -> list:
+        """Copia de las rutas en orden"""
+        return list(self._items)
+
+    def contains(self, path: str) -> bool:
+        return path in self._index
+
+    def selection(self):
+        """Ruta seleccionada o None"""
+        return self._selected
+
+    def set_items(self, paths) -> None:
+        """Sustituye todas las rutas conservando la selección si sigue presente"""
+        self._items = list(paths)
+        self._reindex()
+        if self._selected not in self._index:
+            self._selected = None
+        self._update_region()
+
+    def append(self, paths) -> None:
+        """Añade rutas al final"""
+        for path in paths:
+            if path not in self._index:
+                self._index[path] = len(self._items)
+                self._items.append(path)
+        self._update_region()
+
+    def remove(self, paths) -> None:
+        """Quita rutas de la lista"""
+        removed = set(paths)
+        if not removed & self._index.keys():
+            return
+        self._items = [p for p in self._items if p not in removed]
+        self._reindex()
+        if self._selected in removed:
+            self._selected = None
+        self._update_region()
+
+    def rename(self, pairs) -> None:
+        """Cambia rutas (antigua, nueva) conservando su posición y la selección"""
+        renamed = dict(pairs)
+        if not renamed.keys() & self._index.keys():
+            return
+        self._items = list(dict.fromkeys(renamed.get(p, p) for p in self._items))
+        self._reindex()
+        self._selected = renamed.get(self._selected, self._selected)
+        self._update_region()
+
+    def select(self, path: str, notify: bool = True) -> None:
+        """Selecciona una ruta, la hace visible y opcionalmente avisa a on_select"""
+        if path not in self._index:
+            return
+        self._selected = path
+        self.see(self._index[path])
+        self.redraw()
+        if notify:
+            self.on_select(path)
+
+    def see(self, index: int) -> None:
+        """Desplaza la vista lo mínimo para que la fila index sea visible"""
+        top = int(self.canvas.canvasy(0) // self.row_height)
+        visible = max(1, self.canvas.winfo_height() // self.row_height)
+        if index < top:
+            self.canvas.yview_moveto(index / max(1, len(self._items)))
+        elif index >= top + visible:
+            self.canvas.yview_moveto((index - visible + 1) / max(1, len(self._items)))
+
+    def set_thumbnails(self, enabled: bool) -> None:
+        """Activa o desactiva las miniaturas manteniendo la fila superior"""
+        top = int(self.canvas.canvasy(0) // self.row_height)
+        self.show_thumbnails = enabled
+        self.row_height = THUMB_ROW_HEIGHT if enabled else ROW_HEIGHT
+        self.canvas.configure(yscrollincrement=self.row_height)
+        for row in self._rows.values():
+            self._release(row)
+        self._rows = {}
+        self._update_region()
+        self.canvas.yview_moveto(top / max(1, len(self._items)))
+
+    def redraw(self) -> None:
+        """Redibuja las filas visibles (por ejemplo, cuando llega una miniatura)"""
+        self._invalidate()
+        self._draw()
+
+    def _reindex(self):
+        self._index = {path: i for i, path in enumerate(self._items)}
+        # Las filas dibujadas pueden apuntar a otras rutas: se rellenan de nuevo
+        self._invalidate()
+
+    def _invalidate(self):
+        for row in self._rows.values():
+            row["path"] = None
+
+    def _update_region(self):
+        width = self.canvas.winfo_width()
+        total = len(self._items) * self.row_height
+        self.canvas.configure(scrollregion=(0, 0, width, total))
+        # Si la lista encoge por debajo de la vista, se vuelve al final de la lista
+        max_top = max(0, total - self.canvas.winfo_height())
+        if self.canvas.canvasy(0) > max_top:
+            self.canvas.yview_moveto(max_top / max(1, total))
+        self._draw()
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        # Las ráfagas de eventos de scroll se agrupan en un solo redibujado
+        if self._after_id is None:
+            self._after_id = self.canvas.after_idle(self._draw)
+
+    def _page_rows(self) -> int:
+        return max(1, self.canvas.winfo_height() // self.row_height - 1)
+
+    def _draw(self):
+        self._after_id = None
+        height = max(self.canvas.winfo_height(), self.row_height)
+        first = max(0, int(self.canvas.canvasy(0) // self.row_height))
+        last = min(len(self._items), first + height // self.row_height + 2)
+
+        # Primero se avisa de lo visible para que las peticiones viejas se descarten
+        if self.on_visible:
+            self.on_visible(self._items[first:last])
+
+        for index in [i for i in self._rows if not first <= i < last]:
+            self._release(self._rows.pop(index))
+        for index in range(first, last):
+            row = self._rows.get(index)
+            if row is None:
+                row = self._pool.pop() if self._pool else self._create_row()
+                self._rows[index] = row
+            self._fill(row, index)
+
+    def _create_row(self) -> dict:
+        return {
+            "rect": self.canvas.create_rectangle(0, 0, 0, 0, width=0),
+            "text": self.canvas.create_text(0, 0, anchor="w", font=FONT),
+            "image": self.canvas.create_image(0, 0, anchor="w"),
+            "badge": self.canvas.create_text(0, 0, anchor="e", font=FONT),
+            "path": None,
+            "selected": None,
+            "photo": None,
+            "badge_value": None
+        }
+
+    def _release(self, row):
+        for key in ("rect", "text", "image", "badge"):
+            self.canvas.itemconfigure(row[key], state="hidden")
+        row["path"] = None
+        row["photo"] = None
+        self._pool.append(row)
+
+    def _fill(self, row, index):
+        path = self._items[index]
+        selected = path == self._selected
+        top = index * self.row_height
+        middle = top + self.row_height / 2
+        photo = self.thumbnail(path) if self.show_thumbnails and self.thumbnail else None
+        badge = self.badge(path) if self.badge else None
+        if (row["path"] == path and row["selected"] == selected and row["photo"] is photo
+                and row["badge_value"] == badge):
+            return
+
+        width = max(self.canvas.winfo_width(), 1)
+        text_x = TEXT_PADDING + (THUMB_WIDTH + TEXT_PADDING if self.show_thumbnails else 0)
+        self.canvas.coords(row["rect"], 0, top, width, top + self.row_height)
+        self.canvas.itemconfigure(row["rect"], state="normal", fill=SELECT_BG if selected else "white")
+        self.canvas.coords(row["text"], text_x, middle)
+        self.canvas.itemconfigure(row["text"], state="normal", text=path, fill=SELECT_FG if selected else "black")
+        self.canvas.coords(row["image"], TEXT_PADDING, middle)
+        self.canvas.itemconfigure(row["image"], state="normal" if photo else "hidden", image=photo or "")
+        text, alert = badge or ("", False)
+        self.canvas.coords(row["badge"], width - TEXT_PADDING, middle)
+        self.canvas.itemconfigure(row["badge"], state="normal" if text else "hidden", text=text,
+                                  fill=SELECT_FG if selected else (ALERT_FG if alert else BADGE_FG))
+        row.update(path=path, selected=selected, photo=photo, badge_value=badge)
+
+    def _index_at(self, y):
+        index = int(self.canvas.canvasy(y) // self.row_height)
+        return index if 0 <= index < len(self._items) else None
+
+    def _on_click(self, event):
+        self.canvas.focus_set()
+        index = self._index_at(event.y)
+        if index is not None:
+            self.select(self._items[index])
+
+    def _on_double_click(self, event):
+        index = self._index_at(event.y)
+        if index is not None:
+            self.on_activate(self._items[index])
+
+    def _move(self, delta):
+        if not self._items:
+            return
+        current = self._index.get(self._selected, -1 if delta > 0 else len(self._items))
+        self.select(self._items[max(0, min(len(self._items) - 1, current + delta))])
+
+    def _activate(self):
+        if self._selected is not None:
+            self.on_activate(self._selected)
@@ -0,0 +1,195 @@
+import os
+import re
+from collections import OrderedDict
+
+RESULT_CACHE_SIZE = 32
+
+
+def _subsequence_pattern(term: str):
+    # [^c]*c no puede retroceder: comprobar la subsecuencia es lineal en la ruta
+    return re.compile("".join(f"[^{re.escape(char)}]*{re.escape(char)}" for char in term))
+
+
+class _CharBits(dict):
+    # Asigna un bit nuevo a cada carácter la primera vez que aparece
+    def __missing__(self, char):
+        bit = self[char] = 1 << len(self)
+        return bit
+
+
+class ExampleSearchIndex:
+    def __init__(self):
+        """
+        Índice de búsqueda difusa sobre las rutas de los ejemplos
+
+        Por cada ruta se precalcula su versión en minúsculas, el nombre del
+        archivo y una máscara de bits con los caracteres que contiene. Una
+        consulta descarta por máscara las rutas a las que les falta algún
+        carácter y solo comprueba el orden en las demás, con una expresión
+        regular sin retroceso. Si la consulta
+        amplía una anterior (se sigue escribiendo) se parte de sus resultados.
+
+        Una ruta coincide si contiene los caracteres de cada palabra de la
+        consulta en orden. Se ordenan primero las que contienen la palabra
+        seguida en el nombre del archivo, luego las que la contienen seguida
+        en cualquier parte y por último el resto, respetando dentro de cada
+        grupo el orden de la lista.
+
+        Las rutas añadidas se indexan por tramos con build_step() (en los
+        ratos libres del mainloop) o, si falta algo, en la siguiente búsqueda.
+        """
+        self._order = {}
+        self._lower = []
+        self._names = []
+        self._masks = []
+        self._paths = []
+        self._bits = _CharBits()
+        self._pending = []
+        self._pending_keys = set()
+        self._removed = 0
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._order) + len(self._pending)
+
+    def paths(self) -> list:
+        """Todas las rutas en orden de inserción, sin esperar a que se indexen"""
+        return [path for path in self._paths if path is not None] + self._pending
+
+    def set_paths(self, paths) -> None:
+        """Sustituye todas las rutas"""
+        self.__init__()
+        self.add(paths)
+
+    def add(self, paths) -> None:
+        for path in paths:
+            lower = path.lower()
+            if lower not in self._order and lower not in self._pending_keys:
+                self._pending_keys.add(lower)
+                self._pending.append(path)
+        self._cache.clear()
+
+    def remove(self, paths) -> None:
+        self._build()
+        for path in paths:
+            index = self._order.pop(path.lower(), None)
+            if index is not None:
+                self._paths[index] = None
+                self._lower[index] = None
+                self._masks[index] = 0
+                self._removed += 1
+        self._cache.clear()
+        if self._removed > len(self._paths) // 4:
+            self._compact()
+
+    def rename(self, pairs) -> None:
+        """Cambia rutas (antigua, nueva) conservando su posición"""
+        self._build()
+        for old, new in pairs:
+            index = self._order.pop(old.lower(), None)
+            if index is None:
+                continue
+            lower = new.lower()
+            self._order[lower] = index
+            self._paths[index] = new
+            self._lower[index] = lower
+            self._names[index] = os.path.basename(lower.replace("\\", "/"))
+            self._masks[index] = sum(map(self._bits.__getitem__, set(lower)))
+        self._cache.clear()
+
+    def search(self, query: str) -> list:
+        """
+        Rutas que coinciden con la consulta, de mejor a peor
+
+        Las palabras separadas por espacios deben coincidir todas. Con la
+        consulta vacía se devuelven todas las rutas en orden de inserción.
+        """
+        terms = query.lower().split()
+        if not terms:
+            return self.paths()
+        self._build()
+        key = " ".join(terms)
+        # La caché guarda (resultados ordenados, mismos índices en orden de lista)
+        cached = self._cache.get(key)
+        if cached is None:
+            cached = self._cache[key] = self._match(key, terms)
+            if len(self._cache) > RESULT_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        paths = self._paths
+        return [paths[i] for i in cached[0]]
+
+    def build_step(self, limit: int = 5000) -> bool:
+        """
+        Indexa hasta limit rutas pendientes
+
+        Returns:
+            True si aún quedan rutas por indexar
+        """
+        pending = self._pending[:limit]
+        del self._pending[:limit]
+        bits = self._bits
+        for path in pending:
+            lower = path.lower()
+            self._pending_keys.discard(lower)
+            self._order[lower] = len(self._paths)
+            self._paths.append(path)
+            self._lower.append(lower)
+            self._names.append(os.path.basename(lower.replace("\\", "/")))
+            self._masks.append(sum(map(bits.__getitem__, set(lower))))
+        return bool(self._pending)
+
+    def _build(self):
+        while self._pending:
+            self.build_step(len(self._pending))
+
+    def _compact(self):
+        keep = [i for i, path in enumerate(self._paths) if path is not None]
+        self._paths = [self._paths[i] for i in keep]
+        self._lower = [self._lower[i] for i in keep]
+        self._names = [self._names[i] for i in keep]
+        self._masks = [self._masks[i] for i in keep]
+        self._order = {lower: i for i, lower in enumerate(self._lower)}
+        self._removed = 0
+        self._cache.clear()
+
+    def _match(self, key, terms):
+        chars = set("".join(terms))
+        if not chars <= self._bits.keys():
+            return [], []
+        query_mask = sum(map(self._bits.__getitem__, chars))
+
+        # Seguir escribiendo solo puede reducir los resultados: se parte de la
+        # consulta en caché más larga que sea prefijo de la actual
+        previous = max((k for k in self._cache if key.startswith(k)), key=len, default=None)
+        masks = self._masks
+        if previous is not None:
+            # Una palabra nueva de una letra no pasa por la expresión regular:
+            # la máscara es la que la comprueba también aquí
+            candidates = [i for i in self._cache[previous][1] if masks[i] & query_mask == query_mask]
+        else:
+            candidates = [i for i, mask in enumerate(masks) if mask & query_mask == query_mask]
+
+        lower = self._lower
+        for term in terms:
+            if len(term) > 1:
+                match = _subsequence_pattern(term).match
+                candidates = [i for i in candidates if match(lower[i])]
+
+        names = self._names
+        if len(terms) == 1:
+            term = terms[0]
+            contiguous = [i for i in candidates if term in lower[i]]
+            in_name = [i for i in contiguous if term in names[i]]
+            in_name_set = set(in_name)
+            contiguous_set = set(contiguous)
+            ranked = (in_name
+                      + [i for i in contiguous if i not in in_name_set]
+                      + [i for i in candidates if i not in contiguous_set])
+        else:
+            # 2 puntos por palabra seguida en el nombre, 1 si está seguida en la ruta;
+            # sorted es estable: a igual puntuación se mantiene el orden de la lista
+            ranked = sorted(candidates, key=lambda i: -sum(
+                (term in names[i]) + (term in lower[i]) for term in terms))
+        return ranked, candidates
@@ -0,0 +1,241 @@
+import os
+import sys
+import time
+import errno
+import ctypes
+import select
+import struct
+import threading
+from example_indexer import SCENE_EXTENSIONS
+from metrics import METRICS
+
+DEBOUNCE = 0.3
+MAX_DELAY = 2.0
+POLL_INTERVAL = 2.0
+IDLE_WAIT = 1.0
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class _PollingBackend:
+    name = "sondeo"
+
+    def __init__(self, examples_dir: str, stopped: threading.Event, interval: float = POLL_INTERVAL):
+        """
+        Detecta cambios comparando el mtime de cada directorio indexado
+
+        Crear, borrar o renombrar una entrada cambia el mtime de su
+        directorio, así que basta un stat por directorio en cada vuelta.
+        """
+        self.examples_dir = examples_dir
+        self.stopped = stopped
+        self.idle_wait = interval
+        self._mtimes = {}
+
+    def sync(self, dir_mtimes: dict) -> set:
+        self._mtimes = dict(dir_mtimes)
+        return set()
+
+    def wait(self, timeout: float) -> set:
+        if self.stopped.wait(timeout):
+            return set()
+        changed = set()
+        for rel_dir, mtime in self._mtimes.items():
+            try:
+                current = os.stat(os.path.join(self.examples_dir, rel_dir) if rel_dir else self.examples_dir).st_mtime
+            except OSError:
+                current = None
+            if current != mtime:
+                # Se anota el valor nuevo para no repetir el aviso en cada vuelta
+                self._mtimes[rel_dir] = current
+                changed.add(rel_dir)
+        return changed
+
+    def close(self):
+        pass
+
+
+class _InotifyBackend:
+    name = "inotify"
+
+    def __init__(self, examples_dir: str, stopped: threading.Event):
+        """
+        Detecta cambios con inotify (Linux), un watch por directorio indexado
+
+        Solo interesan las altas, bajas y renombrados de escenas y
+        directorios; el resto de eventos del directorio se ignora.
+        """
+        self.examples_dir = examples_dir
+        self.stopped = stopped
+        self.idle_wait = IDLE_WAIT
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._paths = {}
+        self._watches = {}
+
+    def sync(self, dir_mtimes: dict) -> set:
+        """Vigila los directorios nuevos; devuelve los que hay que releer por si cambiaron antes"""
+        added = set()
+        for rel_dir in dir_mtimes:
+            if rel_dir in self._watches:
+                continue
+            path = os.path.join(self.examples_dir, rel_dir) if rel_dir else self.examples_dir
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise OSError(error, "Límite de inotify alcanzado (fs.inotify.max_user_watches)")
+                continue
+            self._watches[rel_dir] = wd
+            self._paths[wd] = rel_dir
+            added.add(rel_dir)
+        for rel_dir in [d for d in self._watches if d not in dir_mtimes]:
+            self._libc.inotify_rm_watch(self._fd, self._watches.pop(rel_dir))
+        return added
+
+    def wait(self, timeout: float) -> set:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Se han perdido eventos: se releen todos los directorios
+                changed.update(self._watches)
+                continue
+            rel_dir = self._paths.get(wd)
+            if rel_dir is None:
+                continue
+            if mask & IN_IGNORED:
+                del self._paths[wd]
+                if self._watches.get(rel_dir) == wd:
+                    del self._watches[rel_dir]
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF) or mask & IN_ISDIR \
+                    or os.fsdecode(name).lower().endswith(SCENE_EXTENSIONS):
+                changed.add(rel_dir)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class ExampleWatcher:
+    def __init__(self, indexer, on_changes: callable, debounce: float = DEBOUNCE,
+                 max_delay: float = MAX_DELAY, poll_interval: float = POLL_INTERVAL, use_inotify: bool = True):
+        """
+        Sigue los cambios de la carpeta de ejemplos y actualiza el índice
+
+        Los directorios que cambian se acumulan y se releen juntos cuando
+        pasan debounce segundos sin cambios nuevos (o max_delay desde el
+        primero), así que una ráfaga como un git checkout llega como un solo
+        lote. Usa inotify en Linux y, si no está disponible, compara el mtime
+        de los directorios cada poll_interval segundos.
+
+        Args:
+            indexer: ExampleIndexer cuyo índice se mantiene al día
+            on_changes: Recibe (añadidas, eliminadas, renombradas) desde el hilo de fondo
+            debounce: Segundos sin cambios antes de aplicar el lote
+            max_delay: Espera máxima de un lote durante una ráfaga continua
+            poll_interval: Intervalo del sondeo cuando no hay inotify
+            use_inotify: False para forzar el sondeo
+        """
+        self.indexer = indexer
+        self.on_changes = on_changes
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and sys.platform.startswith("linux")
+        self.backend = None
+        self._stopped = threading.Event()
+        self._resync = threading.Event()
+        self._thread = None
+
+    @property
+    def mode(self):
+        """Mecanismo en uso ('inotify' o 'sondeo'), o None si no se ha iniciado"""
+        return self.backend.name if self.backend else None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self.backend = self._create_backend()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def resync(self) -> None:
+        """Avisa de que el índice ha cambiado por otra vía (por ejemplo, un recorrido completo)"""
+        self._resync.set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _create_backend(self):
+        if self.use_inotify:
+            try:
+                return _InotifyBackend(self.indexer.examples_dir, self._stopped)
+            except (OSError, AttributeError) as e:
+                METRICS.error("examples.watch", f"inotify no disponible, se usa sondeo: {e}")
+        return _PollingBackend(self.indexer.examples_dir, self._stopped, self.poll_interval)
+
+    def _sync(self) -> set:
+        try:
+            return self.backend.sync(self.indexer.dir_mtimes())
+        except OSError as e:
+            METRICS.error("examples.watch", f"{e}; se pasa a sondeo")
+            self.backend.close()
+            self.backend = _PollingBackend(self.indexer.examples_dir, self._stopped, self.poll_interval)
+            return self.backend.sync(self.indexer.dir_mtimes())
+
+    def _run(self):
+        # Los directorios recién vigilados se releen una vez: pudieron cambiar antes del watch
+        pending = self._sync()
+        first = last = time.monotonic() if pending else None
+        try:
+            while not self._stopped.is_set():
+                if self._resync.is_set():
+                    self._resync.clear()
+                    pending |= self._sync()
+                changed = self.backend.wait(self.debounce if pending else self.backend.idle_wait)
+                now = time.monotonic()
+                if changed:
+                    pending |= changed
+                    last = now
+                    first = first or now
+                if pending and (now - last >= self.debounce or now - first >= self.max_delay):
+                    pending = self._flush(pending)
+                    first = last = time.monotonic() if pending else None
+        finally:
+            self.backend.close()
+
+    def _flush(self, rel_dirs) -> set:
+        try:
+            with METRICS.span("examples.update_dirs"):
+                added, removed, renamed = self.indexer.update_dirs(rel_dirs)
+        except Exception as e:
+            METRICS.error("examples.watch", f"Error actualizando ejemplos: {e}")
+            return set()
+        if added or removed or renamed:
+            self.on_changes(added, removed, renamed)
+        return self._sync()
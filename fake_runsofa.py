@@ -0,0 +1,37 @@
+"""
+Sustituto de runSofa para probar el modo batch sin SOFA instalado
+
+Acepta las mismas opciones que usa batch_runner (-g batch -n N escena).
+Simula cada paso con una espera y reserva memoria proporcional al tamaño
+de la escena. Falla si el nombre de la escena contiene "fail".
+
+Variables de entorno:
+    FAKE_SOFA_STEP_MS: Milisegundos por paso (1 por defecto)
+"""
+import os
+import sys
+import time
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-g", "--gui", default="qglviewer")
+    parser.add_argument("-n", "--nb_iterations", type=int, default=0)
+    parser.add_argument("scene")
+    args, _ = parser.parse_known_args()
+
+    if "fail" in os.path.basename(args.scene):
+        print(f"[ERROR] [SceneLoader] No se pudo cargar {args.scene}", file=sys.stderr)
+        return 1
+    size = os.path.getsize(args.scene) if os.path.exists(args.scene) else 0
+    memory = bytearray(min(size * 100, 256 * 1024 * 1024))
+    step = float(os.environ.get("FAKE_SOFA_STEP_MS", "1")) / 1000
+    for i in range(args.nb_iterations):
+        time.sleep(step)
+    print(f"[INFO] {args.nb_iterations} pasos de {args.scene} ({len(memory)} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
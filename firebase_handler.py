@@ -1,42 +1,257 @@
-import firebase_admin
-from firebase_admin import credentials, db
+import base64
+import hashlib
+import queue
+import threading
 from pathlib import Path
 from datetime import datetime
+from comment_store import CommentStore
+from metrics import METRICS
+from key_codec import encode_key, decode_key
 
-class FirebaseManager:
-    def __init__(self):
-        """Inicializa la conexión con Firebase Realtime Database"""
-        self.notification_callback = None
-        self.cred_path = Path(__file__).parent / "firebase-key.json"
 
-        if not self.cred_path.exists():
-            raise FileNotFoundError("Archivo de credenciales Firebase no encontrado")
+def activity_updates(updates: dict) -> dict:
+    """
+    Escritura de /sofa_activity que anuncia las notas nuevas de un update()
 
-        self.cred = credentials.Certificate(str(self.cred_path))
-        firebase_admin.initialize_app(self.cred, {
-            'databaseURL': 'https://interfaz-en-tiempo-real-default-rtdb.firebaseio.com/'
-        })
-        self.ref = db.reference('/sofa_comments')
+    Cada ejemplo tocado se sustituye por las notas nuevas de esta escritura,
+    así que /sofa_activity guarda como mucho la última tanda de cada ejemplo
+    y su stream nunca trae comentarios antiguos.
 
-    def set_notification_callback(self, callback):
-        """Configura la función a llamar cuando llegue una notificación"""
-        self.notification_callback = callback
+    Args:
+        updates: Dict {ruta relativa a /sofa_comments: valor}
+
+    Returns:
+        Dict {key del ejemplo: {id: {user, text, timestamp}}}
+    """
+    activity = {}
+    for path, value in updates.items():
+        head, _, cid = path.strip("/").partition("/")
+        if cid and "/" not in cid and isinstance(value, dict) and 'user' in value and 'text' in value:
+            activity.setdefault(head, {})[cid] = {
+                "user": value['user'],
+                "text": value['text'],
+                "timestamp": {'.sv': 'timestamp'}
+            }
+    return activity
+
+
+def activity_notes(event_type: str, path: str, data) -> list:
+    """
+    Notas que anuncia un evento del stream de /sofa_activity
+
+    Returns:
+        Lista de (key del ejemplo, nota); el 'put' en / con el estado inicial
+        (al conectar o reconectar) no anuncia nada
+    """
+    notes = []
+    for key, sub_type, sub_path, value in split_event(event_type, path, data):
+        segments = [s for s in sub_path.split("/") if s]
+        if sub_type == 'put' and not segments and isinstance(value, dict):
+            candidates = value.values()
+        elif sub_type == 'put' and len(segments) == 1:
+            candidates = [value]
+        elif sub_type == 'patch' and not segments and isinstance(value, dict):
+            candidates = [v for k, v in value.items() if "/" not in k.strip("/")]
+        else:
+            continue
+        notes.extend((key, note) for note in candidates
+                     if isinstance(note, dict) and 'user' in note and 'text' in note)
+    return notes
+
+
+def split_event(event_type: str, path: str, data) -> list:
+    """
+    Reparte un evento de un stream sobre la raíz entre los ejemplos que toca
+
+    Returns:
+        Lista de (key del ejemplo, tipo, ruta relativa al ejemplo, datos); el
+        'put' en / con todo el nodo no se reparte
+    """
+    segments = [s for s in (path or "/").split("/") if s]
+    if segments:
+        return [(segments[0], event_type, "/" + "/".join(segments[1:]), data)]
+    if event_type != 'patch' or not isinstance(data, dict):
+        return []
+    # update() multi-ruta sobre la raíz: las rutas empiezan por la key del
+    # ejemplo y no se solapan, así que un ejemplo se sustituye entero o se parchea
+    events = []
+    patches = {}
+    for key, value in data.items():
+        head, _, rest = key.strip("/").partition("/")
+        if rest:
+            patches.setdefault(head, {})[rest] = value
+        else:
+            events.append((head, 'put', "/", value))
+    events.extend((head, 'patch', "/", patch) for head, patch in patches.items())
+    return events
+
+
+class ListenerManager:
+    def __init__(self, ref):
+        """
+        Mantiene como máximo un stream de Firebase abierto a la vez
+
+        Cada nueva suscripción cierra la anterior, de modo que no quedan
+        streams ni hilos huérfanos. listen() conecta de forma síncrona, así que
+        abrir y cerrar se hace en un hilo propio, en orden, y quien llama
+        vuelve enseguida.
+
+        Args:
+            ref: Referencia base de la que cuelgan las suscripciones
+        """
+        self.ref = ref
+        self._lock = threading.Lock()
+        self._registration = None
+        self._key = None
+        self._generation = 0
+        self._tasks = queue.Queue()
+        self._worker = None
+        self.opened = 0
+        self.closed = 0
+
+    def subscribe(self, key: str, callback: callable, on_result: callable = None) -> None:
+        """
+        Abre un stream sobre ref/key y cierra el que estuviera activo
+
+        Args:
+            key: Ruta hija de la referencia base ("" para la propia referencia)
+            callback: Función que recibe cada evento del stream
+            on_result: Recibe (key, None) al abrirse el stream o (key, error)
+                si falla, desde el hilo de los streams (opcional)
+        """
+        with self._lock:
+            self._generation += 1
+            self._key = key
+            generation = self._generation
+        self._submit(self._open, key, callback, on_result, generation)
+
+    def close(self) -> None:
+        """Cierra el stream activo, si lo hay"""
+        with self._lock:
+            self._generation += 1
+            self._key = None
+        self._submit(self._close_current)
+
+    def _submit(self, *task):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+        self._tasks.put(task)
+
+    def _run(self):
+        while True:
+            function, *args = self._tasks.get()
+            function(*args)
+
+    def _open(self, key, callback, on_result, generation):
+        self._close_current()
+        if generation != self._generation:
+            # Ya se pidió otra suscripción o el cierre
+            return
+
+        def listener(event):
+            # Un stream ya cerrado puede entregar un último evento en vuelo
+            if generation == self._generation:
+                callback(event)
+
+        try:
+            with METRICS.span("rtdb.listen"):
+                registration = (self.ref.child(key) if key else self.ref).listen(listener)
+        except Exception as e:
+            METRICS.error("rtdb.listener", f"Error abriendo listener: {e}")
+            with self._lock:
+                if generation == self._generation:
+                    self._key = None
+            if on_result:
+                on_result(key, e)
+            return
+        with self._lock:
+            current = generation == self._generation
+            if current:
+                self._registration = registration
+                self.opened += 1
+        if not current:
+            self._close_registration(registration)
+            return
+        if on_result:
+            on_result(key, None)
 
-    def _normalize_path(self, path: str) -> str:
+    def _close_current(self):
+        with self._lock:
+            registration, self._registration = self._registration, None
+            if registration is not None:
+                self.closed += 1
+        if registration is not None:
+            self._close_registration(registration)
+
+    @staticmethod
+    def _close_registration(registration):
+        try:
+            registration.close()
+        except Exception as e:
+            METRICS.error("rtdb.listener", f"Error cerrando listener: {e}")
+
+    @property
+    def active_key(self):
+        """Key escuchada (o en proceso de conexión) actualmente, o None"""
+        return self._key
+
+    def open_streams(self) -> int:
+        """Número de streams abiertos actualmente"""
+        return self.opened - self.closed
+
+
+class ExampleRoute:
+    def __init__(self, safe_path: str, example_name: str, store: CommentStore, callback: callable,
+                 initial: callable = None):
+        """Ejemplo abierto al que se entregan los eventos de su stream"""
+        self.safe_path = safe_path
+        self.example_name = example_name
+        self.store = store
+        self.callback = callback
+        # Carga los comentarios ya conocidos; se llama una vez, en el hilo del stream
+        self.initial = initial
+        # Aplica un evento y entrega su callback antes de pasar al siguiente
+        self.deliver_lock = threading.Lock()
+
+
+class CommentBackend:
+    def __init__(self, ref, blob_ref=None, activity_ref=None):
         """
-        Convierte rutas de Windows a formato válido para Firebase
-        Reemplaza caracteres especiales que no son permitidos como keys en Firebase
+        Operaciones de comentarios sobre una referencia de tipo Realtime Database
+
+        Toda la lógica (keys de key_codec, timestamps de servidor, paginación,
+        listener con CommentStore) vive aquí; cada backend solo aporta la
+        referencia a /sofa_comments, la de /sofa_blobs para los adjuntos y la
+        de /sofa_activity para las notificaciones.
+        Basta con que ref implemente el subconjunto de
+        firebase_admin.db.Reference que se usa: child(), push(),
+        get(shallow=), set(), update() con rutas de varios niveles, delete(),
+        listen() y las consultas order_by_child() con start_at(), end_at(),
+        equal_to() y limit_to_last().
+
+        Args:
+            ref: Referencia a /sofa_comments
+            blob_ref: Referencia a /sofa_blobs (opcional; sin ella no hay adjuntos)
+            activity_ref: Referencia a /sofa_activity (opcional; sin ella no hay notificaciones)
         """
-        return (path
-                .replace("\\", "_slash_")
-                .replace(".", "_dot_")
-                .replace("#", "_hash_")
-                .replace("$", "_dollar_")
-                .replace("[", "_lbracket_")
-                .replace("]", "_rbracket_")
-                .replace("/", "_fwslash_"))
+        self.notification_callback = None
+        self.ref = ref
+        self.blob_ref = blob_ref
+        self.activity_ref = activity_ref
+        self.listeners = ListenerManager(self.ref)
+        self.activity = ListenerManager(activity_ref) if activity_ref is not None else None
+        self._route = None
+        self._route_lock = threading.Lock()
+
+    def set_notification_callback(self, callback):
+        """Configura la función a llamar cuando llegue una notificación"""
+        self.notification_callback = callback
 
-    def save_comment(self, example_name: str, user: str, text: str, parent_id: str = None) -> None:
+    @METRICS.timed("rtdb.save_comment")
+    def save_comment(self, example_name: str, user: str, text: str, parent_id: str = None,
+                     attachments: list = None) -> None:
         """
         Guarda un comentario en Firebase asociado a un ejemplo
 
@@ -45,8 +260,9 @@ class FirebaseManager:
             user: Nombre del usuario que hace el comentario
             text: Contenido del comentario
             parent_id: ID del comentario padre para hilos (opcional)
+            attachments: Referencias {hash, width, height} de imágenes ya subidas con put_blob (opcional)
         """
-        safe_path = self._normalize_path(example_name)
+        safe_path = encode_key(example_name)
         comment_data = {
             "user": user,
             "text": text,
@@ -54,8 +270,16 @@ class FirebaseManager:
             "original_path": example_name,
             "parent_id": parent_id
         }
-        self.ref.child(safe_path).push().set(comment_data)
+        if parent_id is None:
+            # Permite paginar en el servidor solo los comentarios principales
+            comment_data["thread_timestamp"] = {'.sv': 'timestamp'}
+        if attachments:
+            comment_data["attachments"] = attachments
+        comment_ref = self.ref.child(safe_path).push()
+        comment_ref.set(comment_data)
+        self._publish_activity({f"{safe_path}/{comment_ref.key}": comment_data})
 
+    @METRICS.timed("rtdb.update_comment")
     def update_comment(self, example_name: str, comment_id: str, new_text: str) -> None:
         """
         Actualiza el texto de un comentario existente
@@ -65,12 +289,13 @@ class FirebaseManager:
             comment_id: ID del comentario a actualizar
             new_text: Nuevo texto para el comentario
         """
-        safe_path = self._normalize_path(example_name)
+        safe_path = encode_key(example_name)
         self.ref.child(safe_path).child(comment_id).update({
             "text": new_text,
             "edited_timestamp": {'.sv': 'timestamp'}
         })
 
+    @METRICS.timed("rtdb.delete_comment")
     def delete_comment(self, example_name: str, comment_id: str) -> None:
         """
         Borra un comentario dado su ID
@@ -79,9 +304,34 @@ class FirebaseManager:
             example_name: Nombre/ruta del ejemplo SOFA
             comment_id: ID del comentario a borrar
         """
-        safe_path = self._normalize_path(example_name)
+        safe_path = encode_key(example_name)
         self.ref.child(safe_path).child(comment_id).delete()
 
+    @METRICS.timed("rtdb.update")
+    def update(self, updates: dict, notify: bool = False) -> None:
+        """
+        Escritura multi-ruta atómica relativa a /sofa_comments
+
+        Args:
+            updates: Dict {ruta relativa: valor}; None borra la ruta
+            notify: Anuncia en /sofa_activity las notas nuevas que contiene (las
+                importaciones y migraciones no lo hacen)
+        """
+        self.ref.update(updates)
+        if notify:
+            self._publish_activity(updates)
+
+    def _publish_activity(self, updates: dict) -> None:
+        activity = activity_updates(updates) if self.activity_ref is not None else None
+        if not activity:
+            return
+        try:
+            self.activity_ref.update(activity)
+        except Exception as e:
+            # Las notas ya están guardadas: solo se pierde el aviso
+            METRICS.error("rtdb.activity", f"Error anunciando notas nuevas: {e}")
+
+    @METRICS.timed("rtdb.get_comments")
     def get_comments(self, example_name: str) -> dict:
         """
         Obtiene todos los comentarios para un ejemplo específico
@@ -92,30 +342,223 @@ class FirebaseManager:
         Returns:
             Dict con todos los comentarios o dict vacío si no hay
         """
-        safe_path = self._normalize_path(example_name)
+        safe_path = encode_key(example_name)
         return self.ref.child(safe_path).get() or {}
 
-    def listen_updates(self, example_name: str, callback: callable):
+    @METRICS.timed("rtdb.get_key")
+    def get_key(self, key: str) -> dict:
+        """
+        Comentarios guardados bajo una key de /sofa_comments tal cual, sin codificarla
+
+        Para recorridos que parten de get_example_keys() (índice, exportación,
+        migración de keys).
         """
-        Configura un listener en tiempo real para cambios en los comentarios
+        return self.ref.child(key).get() or {}
+
+    @METRICS.timed("rtdb.get_comments_page")
+    def get_comments_page(self, example_name: str, limit: int, before: float = None) -> dict:
+        """
+        Obtiene los comentarios principales más recientes, ordenados en el servidor
+
+        Requiere la regla ".indexOn": ["thread_timestamp", "parent_id"] en
+        /sofa_comments/$example (ver README).
+
+        Args:
+            example_name: Nombre/ruta del ejemplo SOFA
+            limit: Número máximo de comentarios
+            before: Solo comentarios anteriores a este timestamp (opcional)
+
+        Returns:
+            Dict con los comentarios de la página
+        """
+        safe_path = encode_key(example_name)
+        query = self.ref.child(safe_path).order_by_child('thread_timestamp').start_at(0)
+        if before is not None:
+            query = query.end_at(before - 1)
+        return query.limit_to_last(limit).get() or {}
+
+    @METRICS.timed("rtdb.get_example_keys")
+    def get_example_keys(self) -> set:
+        """
+        Keys de los ejemplos que tienen algún comentario
+
+        Lectura shallow: el servidor devuelve solo las keys del primer nivel,
+        sin descargar ningún comentario.
+        """
+        return set(self.ref.get(shallow=True) or {})
+
+    def get_commented_examples(self) -> set:
+        """Rutas de los ejemplos con comentarios, decodificadas de las keys"""
+        return {decode_key(key) for key in self.get_example_keys()}
+
+    @METRICS.timed("rtdb.count_comments")
+    def count_comments(self, example_name: str) -> int:
+        """
+        Número de comentarios de un ejemplo con una lectura shallow (solo IDs)
+
+        Args:
+            example_name: Nombre/ruta del ejemplo SOFA
+        """
+        safe_path = encode_key(example_name)
+        return len(self.ref.child(safe_path).get(shallow=True) or {})
+
+    @METRICS.timed("rtdb.get_replies")
+    def get_replies(self, example_name: str, parent_id: str) -> dict:
+        """
+        Obtiene las respuestas directas a un comentario
+
+        Args:
+            example_name: Nombre/ruta del ejemplo SOFA
+            parent_id: ID del comentario padre
+
+        Returns:
+            Dict con las respuestas o dict vacío si no hay
+        """
+        safe_path = encode_key(example_name)
+        return self.ref.child(safe_path).order_by_child('parent_id').equal_to(parent_id).get() or {}
+
+    @METRICS.timed("rtdb.has_blob")
+    def has_blob(self, digest: str) -> bool:
+        """Si el adjunto ya está subido (lee solo su tamaño)"""
+        return self.blob_ref.child(digest).child('size').get() is not None
+
+    @METRICS.timed("rtdb.put_blob")
+    def put_blob(self, digest: str, data: bytes, mime: str) -> None:
+        """
+        Sube un adjunto a /sofa_blobs/<hash>
+
+        El contenido va en base64 dentro del nodo; como la key es el hash,
+        subir dos veces la misma imagen no ocupa más.
+        """
+        self.blob_ref.child(digest).set({
+            "data": base64.b64encode(data).decode("ascii"),
+            "type": mime,
+            "size": len(data)
+        })
+
+    @METRICS.timed("rtdb.get_blob")
+    def get_blob(self, digest: str):
+        """Bytes del adjunto, o None si no existe o no coincide con su hash"""
+        blob = self.blob_ref.child(digest).get()
+        if not isinstance(blob, dict) or not isinstance(blob.get("data"), str):
+            return None
+        data = base64.b64decode(blob["data"])
+        return data if hashlib.sha256(data).hexdigest() == digest else None
+
+    def listen_updates(self, example_name: str, callback: callable, initial: callable = None,
+                       on_status: callable = None):
+        """
+        Entrega en tiempo real los cambios en los comentarios de un ejemplo
+
+        Abre un stream sobre /sofa_comments/<ejemplo> (y cierra el del ejemplo
+        anterior). Su 'put' inicial carga el CommentStore del ejemplo y los
+        eventos siguientes se aplican sobre él según su ruta, sin volver a
+        descargar el hilo. Las notificaciones de los demás ejemplos llegan por
+        el stream de /sofa_activity (ver open_stream). No bloquea: la conexión
+        se hace en el hilo de los streams.
 
         Args:
             example_name: Nombre/ruta del ejemplo SOFA a monitorear
-            callback: Función a ejecutar cuando hay cambios (recibe los nuevos datos)
+            callback: Función a ejecutar cuando hay cambios; recibe el ejemplo,
+                {id: comentario o None si se ha borrado} con solo los cambiados
+                y el CommentStore del ejemplo. Se invoca desde un hilo de fondo.
+            initial: Función sin argumentos que devuelve los comentarios ya
+                conocidos (p. ej. de una caché local); con ellos el 'put' inicial
+                solo entrega lo que ha cambiado. Se llama desde el hilo del
+                stream (opcional)
+            on_status: Recibe None al abrirse cada stream o la excepción si no
+                se pudo abrir, desde un hilo de fondo (opcional)
         """
-        safe_path = self._normalize_path(example_name)
+        safe_path = encode_key(example_name)
+        route = self._route
+        if (route is None or route.safe_path != safe_path or route.callback != callback
+                or self.listeners.active_key != safe_path):
+            if route is not None and route.safe_path == safe_path:
+                # Reconexión del mismo ejemplo: el store sigue valiendo
+                route = ExampleRoute(safe_path, example_name, route.store, callback)
+            else:
+                # Solo se guarda el store del ejemplo abierto; la caché local da el arranque en caliente
+                route = ExampleRoute(safe_path, example_name, CommentStore(), callback, initial)
+            with self._route_lock:
+                self._route = route
+            self.listeners.subscribe(safe_path, lambda event, route=route: self._on_event(route, event),
+                                     on_result=(lambda key, error: on_status(error)) if on_status else None)
+        self.open_stream(on_status)
 
-        def listener(event):
-            if event.data:  # Ignora eventos de borrado
-                if (event.event_type == 'put' and event.path is not None and
-                    self.notification_callback and isinstance(event.data, dict)):
-
-                    if 'user' in event.data and 'text' in event.data:
-                        self.notification_callback(
-                            example_name,
-                            event.data['user'],
-                            event.data['text']
-                        )
-                callback(self.ref.child(safe_path).get())
-
-        self.ref.child(safe_path).listen(listener)
\ No newline at end of file
+    def open_stream(self, on_status: callable = None) -> None:
+        """
+        Abre el stream de /sofa_activity si no está abierto ni conectándose
+
+        Solo trae la última tanda de notas nuevas de cada ejemplo (ver
+        activity_updates), nunca /sofa_comments, y basta para las
+        notificaciones de todos los ejemplos. No bloquea.
+
+        Args:
+            on_status: Recibe None al abrirse o la excepción si falla, desde
+                un hilo de fondo (opcional)
+        """
+        if self.activity is not None and self.activity.active_key is None:
+            self.activity.subscribe("", self._on_activity,
+                                    on_result=(lambda key, error: on_status(error)) if on_status else None)
+
+    def _on_activity(self, event):
+        METRICS.increment("rtdb.activity_events")
+        if not self.notification_callback:
+            return
+        for key, note in activity_notes(event.event_type, event.path, event.data):
+            self.notification_callback(decode_key(key), note['user'], note['text'])
+
+    def _on_event(self, route, event):
+        METRICS.increment("rtdb.listener_events")
+        with METRICS.span("rtdb.listener_event"), route.deliver_lock:
+            if route.initial is not None and event.event_type == 'put' and event.path in ("/", ""):
+                # Antes del primer put se carga lo conocido, fuera de _route_lock
+                load, route.initial = route.initial, None
+                try:
+                    route.store.reset(load() or {})
+                except Exception as e:
+                    METRICS.error("rtdb.listener", f"Error cargando {route.example_name}: {e}")
+            with self._route_lock:
+                if self._route is not route:
+                    return
+                changes = route.store.changes(route.store.apply_event(event.event_type, event.path, event.data))
+            # El callback escribe en la caché y el índice: va fuera de _route_lock para no
+            # frenar a listen_updates en el hilo de Tk; deliver_lock mantiene el orden
+            if changes:
+                route.callback(route.example_name, changes, route.store)
+
+    def stop_listening(self) -> None:
+        """Cierra el stream del ejemplo y suelta su store; el de /sofa_activity sigue para las notificaciones"""
+        with self._route_lock:
+            self._route = None
+        self.listeners.close()
+
+    def close(self) -> None:
+        """Cierra los streams"""
+        self.stop_listening()
+        if self.activity is not None:
+            self.activity.close()
+
+    def open_streams(self) -> int:
+        """Número de listeners en tiempo real abiertos"""
+        activity = self.activity.open_streams() if self.activity is not None else 0
+        return self.listeners.open_streams() + activity
+
+
+class FirebaseManager(CommentBackend):
+    def __init__(self):
+        """Inicializa la conexión con Firebase Realtime Database"""
+        self.cred_path = Path(__file__).parent / "firebase-key.json"
+
+        if not self.cred_path.exists():
+            raise FileNotFoundError("Archivo de credenciales Firebase no encontrado")
+
+        # Import diferido: firebase_admin tarda en cargar y solo hace falta aquí
+        import firebase_admin
+        from firebase_admin import credentials, db
+        self.cred = credentials.Certificate(str(self.cred_path))
+        firebase_admin.initialize_app(self.cred, {
+            'databaseURL': 'https://interfaz-en-tiempo-real-default-rtdb.firebaseio.com/'
+        })
+        super().__init__(db.reference('/sofa_comments'), db.reference('/sofa_blobs'),
+                         db.reference('/sofa_activity'))
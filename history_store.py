@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from metrics import METRICS
+
+HISTORY_FILE = "sofa_history.json"
+MAX_ENTRIES = 100
+RECENT_LAUNCHES = 10
+SAVE_DELAY = 1.0
+HALF_LIFE_DAYS = 7
+
+
+def frecency(entry: dict, now: float = None) -> float:
+    """
+    Puntuación de frecuencia y recencia de una entrada del historial
+
+    Cada uno de los últimos lanzamientos vale 1 y pierde la mitad de su
+    peso cada HALF_LIFE_DAYS días; la media se escala por el total de
+    lanzamientos, así que un ejemplo muy usado hace tiempo cede ante uno
+    abierto varias veces esta semana.
+    """
+    now = time.time() if now is None else now
+    recent = entry["recent"] or [entry["last"]]
+    half_life = HALF_LIFE_DAYS * 86400
+    weight = sum(0.5 ** (max(0.0, now - ts) / half_life) for ts in recent) / len(recent)
+    return entry["count"] * weight
+
+
+class HistoryStore:
+    def __init__(self, history_file: str = HISTORY_FILE, max_entries: int = MAX_ENTRIES,
+                 save_delay: float = SAVE_DELAY):
+        """
+        Historial de ejemplos abiertos, en memoria y con escritura diferida
+
+        Cada entrada guarda el número de lanzamientos, el primero, el último
+        y los RECENT_LAUNCHES más recientes. Los cambios se escriben
+        save_delay segundos después del último, en un hilo aparte, con un
+        archivo temporal y os.replace(). Antes de escribir se mezcla lo que
+        haya en disco (otra instancia abierta) quedándose con la entrada
+        usada más recientemente, así que ninguna pisa el historial de otra.
+
+        Args:
+            history_file: Ruta del JSON del historial
+            max_entries: Entradas que se conservan
+            save_delay: Segundos de espera antes de escribir
+        """
+        self.history_file = history_file
+        self.max_entries = max_entries
+        self.save_delay = save_delay
+        self._removed = set()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+        self._entries = self._read_disk()
+
+    @staticmethod
+    def normalize(path: str) -> str:
+        return os.path.normpath(path)
+
+    def _read_disk(self) -> dict:
+        try:
+            with open(self.history_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        entries = {}
+        if isinstance(data, list):
+            # Formato antiguo: lista de rutas de la más reciente a la más antigua,
+            # fechadas a partir del mtime del archivo para que releerlo no las rejuvenezca
+            try:
+                saved = os.path.getmtime(self.history_file)
+            except OSError:
+                saved = time.time()
+            for i, path in enumerate(data):
+                if isinstance(path, str):
+                    ts = saved - i
+                    entries.setdefault(self.normalize(path), {"count": 1, "first": ts, "last": ts, "recent": [ts]})
+            return entries
+        for path, entry in data.get("entries", {}).items():
+            try:
+                entries[path] = {
+                    "count": int(entry["count"]),
+                    "first": float(entry["first"]),
+                    "last": float(entry["last"]),
+                    "recent": [float(ts) for ts in entry.get("recent", [])][-RECENT_LAUNCHES:]
+                }
+            except (KeyError, TypeError, ValueError):
+                continue
+        return entries
+
+    def record(self, path: str, when: float = None) -> dict:
+        """Anota un lanzamiento y programa el guardado"""
+        path = self.normalize(path)
+        when = time.time() if when is None else when
+        with self._lock:
+            entry = self._entries.pop(path, None) or {"count": 0, "first": when, "last": when, "recent": []}
+            entry["count"] += 1
+            entry["last"] = when
+            entry["recent"] = (entry["recent"] + [when])[-RECENT_LAUNCHES:]
+            self._entries[path] = entry
+            self._removed.discard(path)
+            self._trim()
+        self._schedule_save()
+        return dict(entry)
+
+    def remove(self, path: str) -> None:
+        path = self.normalize(path)
+        with self._lock:
+            self._entries.pop(path, None)
+            self._removed.add(path)
+        self._schedule_save()
+
+    def clear(self) -> None:
+        """Vacía el historial, también el de disco, y lo escribe enseguida"""
+        with self._lock:
+            self._removed.update(self._entries)
+            self._entries.clear()
+            self._cancel_timer()
+            self._dirty = False
+        self._write(merge=False)
+
+    def get(self, path: str):
+        with self._lock:
+            entry = self._entries.get(self.normalize(path))
+            return dict(entry) if entry else None
+
+    def ranked(self, now: float = None) -> list:
+        """Rutas de mayor a menor frecency; a igualdad, la usada más recientemente"""
+        with self._lock:
+            items = list(self._entries.items())
+        now = time.time() if now is None else now
+        items.sort(key=lambda item: (frecency(item[1], now), item[1]["last"]), reverse=True)
+        return [path for path, _ in items]
+
+    def flush(self) -> None:
+        """Escribe ya los cambios pendientes (al salir)"""
+        with self._lock:
+            self._cancel_timer()
+            dirty = self._dirty
+        if dirty:
+            self._write()
+
+    def _trim(self):
+        while len(self._entries) > self.max_entries:
+            oldest = min(self._entries, key=lambda p: frecency(self._entries[p]))
+            del self._entries[oldest]
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule_save(self):
+        with self._lock:
+            self._dirty = True
+            self._cancel_timer()
+            self._timer = threading.Timer(self.save_delay, self._write)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _write(self, merge: bool = True):
+        with self._write_lock:
+            # Lo que haya escrito otra instancia también pasa a memoria
+            disk = self._read_disk() if merge else {}
+            with self._lock:
+                self._timer = None
+                self._dirty = False
+                for path, entry in disk.items():
+                    current = self._entries.get(path)
+                    if path not in self._removed and (current is None or entry["last"] > current["last"]):
+                        self._entries[path] = entry
+                self._trim()
+                entries = {path: dict(entry) for path, entry in self._entries.items()}
+
+            directory = os.path.dirname(os.path.abspath(self.history_file))
+            tmp_file = None
+            try:
+                fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=".sofa_history", suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"version": 2, "entries": entries}, f)
+                os.replace(tmp_file, self.history_file)
+            except OSError as e:
+                METRICS.error("history", f"Error guardando historial: {e}")
+                if tmp_file and os.path.exists(tmp_file):
+                    os.remove(tmp_file)
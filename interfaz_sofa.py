@@ -1,105 +1,179 @@
+import time
+_STARTUP_T0 = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import subprocess
 import os
-import json
+import sys
 from datetime import datetime
-import firebase_admin
-from firebase_admin import credentials, db
-from pathlib import Path
-from plyer import notification
-from PIL import Image, ImageTk
-
-class FirebaseManager:
-    def __init__(self):
-        self.cred_path = Path(__file__).parent / "firebase-key.json"
-        self.notification_callback = None
-        if not self.cred_path.exists():
-            raise FileNotFoundError("Archivo de credenciales Firebase no encontrado")
-        self.cred = credentials.Certificate(str(self.cred_path))
-        firebase_admin.initialize_app(self.cred, {
-            'databaseURL': 'https://interfaz-en-tiempo-real-default-rtdb.firebaseio.com/'
-        })
-        self.ref = db.reference('/sofa_comments')
-
-    def set_notification_callback(self, callback):
-        self.notification_callback = callback
-
-    def _normalize_path(self, path: str) -> str:
-        return (path.replace("\\", "_slash_")
-                    .replace(".", "_dot_")
-                    .replace("$", "_dollar_")
-                    .replace("#", "_hash_")
-                    .replace("[", "_lbracket_")
-                    .replace("]", "_rbracket_")
-                    .replace("/", "_fwslash_"))
-
-    def save_comment(self, example_name: str, user: str, text: str, parent_id: str = None) -> None:
-        safe_path = self._normalize_path(example_name)
-        comment_data = {
-            "user": user,
-            "text": text,
-            "timestamp": {'.sv': 'timestamp'},
-            "original_path": example_name,
-            "parent_id": parent_id
-        }
-        self.ref.child(safe_path).push().set(comment_data)
-
-    def update_comment(self, example_name: str, comment_id: str, new_text: str) -> None:
-        safe_path = self._normalize_path(example_name)
-        self.ref.child(safe_path).child(comment_id).update({
-            "text": new_text,
-            "edited_timestamp": {'.sv': 'timestamp'}
-        })
-
-    def delete_comment(self, example_name: str, comment_id: str) -> None:
-        safe_path = self._normalize_path(example_name)
-        self.ref.child(safe_path).child(comment_id).delete()
-
-    def get_comments(self, example_name: str) -> dict:
-        safe_path = self._normalize_path(example_name)
-        return self.ref.child(safe_path).get() or {}
-
-    def listen_updates(self, example_name: str, callback: callable):
-        safe_path = self._normalize_path(example_name)
-        def listener(event):
-            if event.data:
-                if event.event_type == 'put' and event.path is not None:
-                    if self.notification_callback and isinstance(event.data, dict) and 'user' in event.data:
-                        self.notification_callback(
-                            example_name,
-                            event.data['user'],
-                            event.data['text']
-                        )
-                callback(self.ref.child(safe_path).get())
-        self.ref.child(safe_path).listen(listener)
+import threading
+from example_indexer import ExampleIndexer
+from firebase_handler import FirebaseManager
+from comment_store import collect_thread
+from comment_view import CommentListView, format_timestamp
+from ui_dispatch import UIDispatcher
+from comment_cache import CommentCache, CachedCommentManager
+from comment_pager import CommentPager
+from comment_counts import CommentCounts
+from comment_search import CommentSearchIndex
+from startup_timer import StartupTimer
+from process_manager import ProcessManager
+from scene_analyzer import SceneAnalyzer, SceneMetadataCache
+from scene_preflight import ScenePreflight, PreflightCache, default_search_paths, default_plugin_dirs, describe
+from example_list_view import ExampleListView
+from example_search import ExampleSearchIndex
+from example_watcher import ExampleWatcher
+from thumbnails import ThumbnailService, ThumbnailDiskCache
+from attachments import AttachmentService, IMAGE_FILETYPES, MAX_ATTACHMENTS
+from history_store import HistoryStore
+from notification_service import NotificationService
+from metrics import METRICS, METRICS_FILE, PROFILE_FILE, SessionProfiler
+
+SOFA_EXECUTABLE = r"C:\Users\alexr\anaconda3\envs\sofa\Library\bin\runSofa.exe"
+EXAMPLES_DIR = r"C:\Users\alexr\anaconda3\envs\sofa\Library\share\sofa\examples"
+# SOFA_COMMENT_BACKEND=memoria trabaja sin Firebase, con los comentarios en este SQLite
+COMMENT_BACKEND = os.environ.get("SOFA_COMMENT_BACKEND", "firebase")
+MEMORY_BACKEND_FILE = "sofa_comments_local.db"
+
 
 class SOFAInterface:
     def __init__(self, root):
         self.root = root
-        self.history_file = "sofa_history.json"
-        self.sofa_executable = r"C:\Users\alexr\anaconda3\envs\sofa\Library\bin\runSofa.exe"
-        self.examples_dir = r"C:\Users\alexr\anaconda3\envs\sofa\Library\share\sofa\examples"
+        self.profiler = SessionProfiler()
+        if PROFILE_FILE:
+            # SOFA_PROFILE=archivo.prof perfila la sesión entera desde el arranque
+            self.profiler.start()
+        self.history = HistoryStore()
+        self.history_paths = []
+        self.sofa_executable = SOFA_EXECUTABLE
+        self.examples_dir = EXAMPLES_DIR
         self.current_user = os.getlogin()
         self.current_example = None
         self.notification_enabled = True
-        self.unread_comments = 0
         self.editing_comment_id = None
         self.replying_to_comment_id = None
         self.current_comments = {}
+        self.comments_example = None
+        self.comment_pager = CommentPager()
+        self.pending_writes = 0
+        self.failed_writes = 0
+        self.dispatcher = UIDispatcher(self.root)
+        self.setup_dispatch()
+        # Los avisos se agrupan y limitan en su propio hilo; el listener solo encola
+        self.notifications = NotificationService(
+            self.current_user,
+            on_unread_change=lambda counts: self.dispatcher.post('unread', counts, key='unread')
+        )
+        self.unread_counts = self.notifications.unread_counts()
+        self.process_manager = ProcessManager(
+            self.sofa_executable,
+            on_change=lambda: self.dispatcher.post('processes', None, key='processes')
+        )
+        self.scene_analyzer = SceneAnalyzer(
+            SceneMetadataCache(),
+            on_result=lambda path, metadata: self.dispatcher.post('scene_metadata', (path, metadata), key='scene')
+        )
+        self.preflight = ScenePreflight(
+            PreflightCache(), default_search_paths(self.examples_dir), default_plugin_dirs(self.sofa_executable)
+        )
+        self.preview_path = None
+        self.thumbnails = ThumbnailService(
+            self.sofa_executable,
+            ThumbnailDiskCache(),
+            on_ready=lambda path, png_path: self.dispatcher.post('thumbnails', [(path, png_path)], key='thumbnails')
+        )
+        self.attachments = AttachmentService(
+            on_ready=lambda digest, png_path: self.dispatcher.post('attachments', [(digest, png_path)], key='attachments')
+        )
+        self.pending_attachments = []
+        self.attachments_preparing = 0
+        self.attachments_generation = 0
+        self.startup = StartupTimer(_STARTUP_T0, expected=('interactivo', 'firebase', 'escaneo_ejemplos'))
+        self.startup.mark('imports')
+        with self.startup.phase('indice_ejemplos'):
+            self.example_indexer = ExampleIndexer(self.examples_dir)
+        self.example_watcher = ExampleWatcher(
+            self.example_indexer,
+            on_changes=lambda added, removed, renamed: self.dispatcher.post(
+                'examples_changed', (added, removed, renamed)
+            )
+        )
+        self.examples_loaded = False
+        self.examples_generation = 0
+        self.examples_scanning = False
+        self.search_index = ExampleSearchIndex()
+        # Archivos abiertos con "Buscar archivo" fuera de examples_dir: el escaneo no los ve
+        self.external_examples = set()
+        self.search_build_id = None
+
+        # Firebase se conecta en segundo plano; mientras tanto se trabaja sobre la caché
+        self.firebase = None
+        self.firebase_status = "⏳ Conectando..."
+        self.listener_error = None
+        with self.startup.phase('cache_comentarios'):
+            comment_cache = CommentCache()
+            self.comment_counts = CommentCounts(
+                comment_cache,
+                on_change=lambda counts: self.dispatcher.post('comment_counts', counts, key='counts')
+            )
+            self.comment_search = CommentSearchIndex(
+                on_progress=lambda done, total: self.dispatcher.post('note_index', (done, total), key='note_index')
+            )
+            self.comment_manager = CachedCommentManager(
+                None,
+                comment_cache,
+                on_pending_change=lambda count: self.dispatcher.post('pending_writes', count, key='pending'),
+                on_count=self.comment_counts.set_count,
+                on_remote_change=self.comment_search.apply_changes,
+                on_listener_status=lambda error: self.dispatcher.post('listener_status', error, key='listener_status')
+            )
+            self.pending_writes = self.comment_manager.pending_count()
+            self.failed_writes = self.comment_manager.failed_count()
+        self.register_gauges()
+
+        with self.startup.phase('ui'):
+            self.setup_ui()
+            self.setup_notifications()
+        with self.startup.phase('historial'):
+            self.load_history()
+        self.init_firebase()
+        self.load_examples()
+        self.root.after_idle(self.finish_startup)
 
-        try:
-            self.firebase = FirebaseManager()
-            self.firebase_status = "✅ Conectado"
-        except Exception as e:
-            print(f"Error Firebase: {e}")
-            self.firebase = None
-            self.firebase_status = "❌ Desconectado"
+    def init_firebase(self):
+        def worker():
+            start = time.perf_counter()
+            try:
+                with METRICS.span("rtdb.connect"):
+                    firebase = create_comment_backend()
+            except Exception as e:
+                METRICS.error("rtdb.connect", f"Error Firebase: {e}")
+                firebase = None
+            self.startup.record('firebase', start)
+            self.dispatcher.post('firebase_ready', firebase)
 
-        self.setup_ui()
-        self.setup_notifications()
-        self.load_history()
-        self.load_examples()
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_firebase_ready(self, firebase):
+        self.firebase = firebase
+        if firebase is None:
+            self.firebase_status = "❌ Desconectado"
+            self.update_status_label()
+            return
+        self.firebase_status = "✅ Conectado"
+        self.comment_manager.attach_remote(firebase)
+        self.comment_counts.attach_remote(firebase)
+        self.comment_search.attach_remote(firebase)
+        self.attachments.attach_remote(firebase)
+        if self.comments_example:
+            # La página abierta salió solo de la caché: se recarga contra el servidor
+            example_name = self.comments_example
+            self.comments_example = None
+            self.open_example_comments(example_name)
+        self.update_status_label()
+
+    def finish_startup(self):
+        # Primer ciclo ocioso del mainloop: la ventana ya está dibujada y responde
+        self.startup.mark('interactivo')
         self.verify_installation()
 
     def setup_ui(self):
@@ -112,11 +186,11 @@ class SOFAInterface:
         style.configure("TLabel", font=('Arial', 10))
         style.configure("Status.TLabel", font=('Arial', 9), foreground="gray")
 
-        notebook = ttk.Notebook(self.root)
+        notebook = self.notebook = ttk.Notebook(self.root)
         notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
         # Pestaña de Ejemplos
-        tab1 = ttk.Frame(notebook)
+        tab1 = self.examples_tab = ttk.Frame(notebook)
         notebook.add(tab1, text="Ejemplos")
 
         main_frame = ttk.Frame(tab1)
@@ -126,14 +200,49 @@ class SOFAInterface:
         list_frame = ttk.Frame(main_frame)
         list_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
-        ttk.Label(list_frame, text="Ejemplos disponibles:").pack(pady=5, anchor='w')
-        self.example_list = tk.Listbox(list_frame, height=25, font=('Consolas', 9))
-        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.example_list.yview)
-        self.example_list.configure(yscrollcommand=scrollbar.set)
-        self.example_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        list_header = ttk.Frame(list_frame)
+        list_header.pack(fill=tk.X)
+        self.examples_label = ttk.Label(list_header, text="Ejemplos disponibles:")
+        self.examples_label.pack(side=tk.LEFT, pady=5)
+        self.thumbnails_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            list_header, text="Miniaturas",
+            variable=self.thumbnails_var,
+            command=lambda: self.example_view.set_thumbnails(self.thumbnails_var.get())
+        ).pack(side=tk.RIGHT)
+
+        # Búsqueda difusa: filtra la lista en cada pulsación
+        search_frame = ttk.Frame(list_frame)
+        search_frame.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(search_frame, text="Buscar:").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", lambda *args: self.apply_search())
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+        search_entry.bind("<Escape>", lambda e: self.search_var.set(""))
+        search_entry.bind("<Down>", lambda e: self.focus_example_list())
+        search_entry.bind("<Return>", lambda e: self.focus_example_list())
+
+        # Resumen de la escena seleccionada (debajo de la lista)
+        preview_frame = ttk.LabelFrame(list_frame, text="Escena")
+        preview_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=(5, 0))
+        self.scene_preview = ttk.Label(preview_frame, text="Selecciona un ejemplo", justify=tk.LEFT, wraplength=520)
+        self.scene_preview.pack(fill=tk.X, padx=5, pady=5, anchor='w')
+
+        # Solo se dibujan las filas visibles; las miniaturas se piden al aparecer
+        examples_canvas = tk.Canvas(list_frame, highlightthickness=0, height=400)
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical")
+        self.example_view = ExampleListView(
+            examples_canvas,
+            scrollbar,
+            on_select=self.show_example_comments,
+            on_activate=lambda example_name: self.open_example(),
+            thumbnail=self.get_thumbnail,
+            on_visible=self.on_examples_visible,
+            badge=self.example_badge
+        )
+        examples_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.example_list.bind("<<ListboxSelect>>", self.show_example_comments)
-        self.example_list.bind("<Double-Button-1>", lambda e: self.open_example())
 
         # Área de comentarios (derecha)
         comments_frame = ttk.Frame(main_frame, width=400)
@@ -144,15 +253,25 @@ class SOFAInterface:
         # Canvas y Scrollbar para comentarios
         self.comments_canvas = tk.Canvas(comments_frame, borderwidth=0, highlightthickness=0)
         self.scrollbar = ttk.Scrollbar(comments_frame, orient="vertical", command=self.comments_canvas.yview)
-        self.comments_frame = ttk.Frame(self.comments_canvas)
-        
-        self.comments_canvas.configure(yscrollcommand=self.scrollbar.set)
         self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.comments_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        self.comments_canvas.create_window((0,0), window=self.comments_frame, anchor="nw")
-        
-        self.comments_frame.bind("<Configure>", lambda e: self.comments_canvas.configure(
-            scrollregion=self.comments_canvas.bbox("all")))
+
+        # Solo se construyen las filas visibles; los widgets se reutilizan por ID
+        self.comments_view = CommentListView(
+            self.comments_canvas,
+            self.scrollbar,
+            self.current_user,
+            {
+                'edit': self.start_edit_comment,
+                'delete': self.delete_comment,
+                'reply': self.start_reply_comment,
+                'toggle_replies': self.toggle_replies,
+                'open_attachment': self.show_attachment
+            },
+            reply_state=lambda cid: self.comment_pager.reply_state(cid),
+            on_near_end=self.load_more_comments,
+            attachment_photo=self.attachment_photo
+        )
 
         # Área para nuevo comentario
         ttk.Label(comments_frame, text="Añadir nueva nota:").pack(pady=(10, 5), anchor='w')
@@ -175,19 +294,24 @@ class SOFAInterface:
         self.btn_cancel.pack(side=tk.LEFT, padx=2)
         self.btn_cancel.config(state="disabled")
 
+        self.btn_attach = ttk.Button(btn_frame, text="Adjuntar imagen", command=self.choose_attachments)
+        self.btn_attach.pack(side=tk.LEFT, padx=2)
+        self.btn_clear_attachments = ttk.Button(btn_frame, text="Quitar", command=self.clear_attachments)
+        self.attachments_label = ttk.Label(btn_frame, style="Status.TLabel")
+        self.attachments_label.pack(side=tk.LEFT, padx=5)
+
         status_frame = ttk.Frame(comments_frame)
         status_frame.pack(fill=tk.X, pady=(5, 0))
-        ttk.Label(
-            status_frame,
-            text=f"Usuario: {self.current_user} | Firebase: {self.firebase_status}",
-            style="Status.TLabel"
-        ).pack(side=tk.LEFT)
+        self.status_label = ttk.Label(status_frame, style="Status.TLabel")
+        self.status_label.pack(side=tk.LEFT)
+        self.status_label.bind("<Button-1>", lambda e: self.show_failed_writes())
+        self.update_status_label()
 
         # Pestaña de Recientes
         tab2 = ttk.Frame(notebook)
         notebook.add(tab2, text="Recientes")
 
-        ttk.Label(tab2, text="Archivos abiertos recientemente:").pack(pady=5, anchor='w', padx=10)
+        ttk.Label(tab2, text="Archivos abiertos recientemente (los más usados primero):").pack(pady=5, anchor='w', padx=10)
         self.history_list = tk.Listbox(tab2, height=25, font=('Consolas', 9))
         scrollbar2 = ttk.Scrollbar(tab2, orient="vertical", command=self.history_list.yview)
         self.history_list.configure(yscrollcommand=scrollbar2.set)
@@ -195,6 +319,11 @@ class SOFAInterface:
         scrollbar2.pack(side=tk.RIGHT, fill=tk.Y, padx=(0, 10))
         self.history_list.bind("<Double-Button-1>", lambda e: self.open_from_history())
 
+        # Pestaña de Simulaciones
+        self.setup_process_panel(notebook)
+        self.setup_note_search_panel(notebook)
+        self.setup_diagnostics_panel(notebook)
+
         # Botones principales
         btn_frame_main = ttk.Frame(self.root)
         btn_frame_main.pack(fill=tk.X, padx=10, pady=(0, 10))
@@ -202,12 +331,460 @@ class SOFAInterface:
         ttk.Button(btn_frame_main, text="Abrir ejemplo", command=self.open_example).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame_main, text="Buscar archivo...", command=self.browse_file).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame_main, text="Actualizar lista", command=self.load_examples).pack(side=tk.LEFT, padx=5)
+        self.launch_label = ttk.Label(btn_frame_main, style="Status.TLabel")
+        self.launch_label.pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame_main, text="Limpiar historial", command=self.clear_history).pack(side=tk.RIGHT, padx=5)
-        ttk.Button(btn_frame_main, text="Salir", command=self.root.quit).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame_main, text="Salir", command=self.quit_app).pack(side=tk.RIGHT, padx=5)
+        self.root.protocol("WM_DELETE_WINDOW", self.quit_app)
+
+    def setup_process_panel(self, notebook):
+        tab = ttk.Frame(notebook)
+        notebook.add(tab, text="Simulaciones")
+
+        top_frame = ttk.Frame(tab)
+        top_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(top_frame, text="Máx. simultáneas:").pack(side=tk.LEFT)
+        self.max_concurrent_var = tk.IntVar(value=self.process_manager.max_concurrent)
+        ttk.Spinbox(
+            top_frame, from_=1, to=16, width=4,
+            textvariable=self.max_concurrent_var,
+            command=self.set_max_concurrent
+        ).pack(side=tk.LEFT, padx=5)
+        ttk.Button(top_frame, text="Detener", command=self.stop_selected_process).pack(side=tk.LEFT, padx=5)
+        ttk.Button(top_frame, text="Limpiar terminadas", command=self.process_manager.clear_finished).pack(side=tk.LEFT, padx=5)
+        self.process_summary = ttk.Label(top_frame, style="Status.TLabel")
+        self.process_summary.pack(side=tk.RIGHT)
+
+        columns = (
+            ("pid", "PID", 70),
+            ("scene", "Escena", 380),
+            ("state", "Estado", 130),
+            ("uptime", "Tiempo", 80),
+            ("cpu", "CPU", 60),
+            ("rss", "Memoria", 90)
+        )
+        self.process_tree = ttk.Treeview(tab, columns=[c[0] for c in columns], show="headings", height=8, selectmode="browse")
+        for column, text, width in columns:
+            self.process_tree.heading(column, text=text)
+            self.process_tree.column(column, width=width, anchor='w')
+        self.process_tree.pack(fill=tk.X, padx=10)
+        self.process_tree.bind("<<TreeviewSelect>>", lambda e: self.update_process_output())
+
+        ttk.Label(tab, text="Salida:").pack(pady=5, anchor='w', padx=10)
+        output_frame = ttk.Frame(tab)
+        output_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        self.process_output = tk.Text(output_frame, wrap=tk.NONE, font=('Consolas', 9), state="disabled")
+        output_scrollbar = ttk.Scrollbar(output_frame, orient="vertical", command=self.process_output.yview)
+        self.process_output.configure(yscrollcommand=output_scrollbar.set)
+        self.process_output.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        output_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.output_run_id = None
+        self.output_line_count = 0
+
+        self.refresh_processes()
+        self.root.after(1000, self.tick_processes)
+
+    def setup_note_search_panel(self, notebook):
+        tab = ttk.Frame(notebook)
+        notebook.add(tab, text="Buscar notas")
+
+        form = ttk.Frame(tab)
+        form.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(form, text="Texto:").pack(side=tk.LEFT)
+        self.note_query_var = tk.StringVar()
+        query_entry = ttk.Entry(form, textvariable=self.note_query_var, width=36)
+        query_entry.pack(side=tk.LEFT, padx=5)
+        query_entry.bind("<Return>", lambda e: self.search_notes())
+        ttk.Label(form, text="Usuario:").pack(side=tk.LEFT)
+        self.note_user_var = tk.StringVar()
+        self.note_user_combo = ttk.Combobox(form, textvariable=self.note_user_var, width=14,
+                                            postcommand=self.refresh_note_users)
+        self.note_user_combo.pack(side=tk.LEFT, padx=5)
+        ttk.Label(form, text="Desde:").pack(side=tk.LEFT)
+        self.note_since_var = tk.StringVar()
+        ttk.Entry(form, textvariable=self.note_since_var, width=11).pack(side=tk.LEFT, padx=5)
+        ttk.Label(form, text="Hasta:").pack(side=tk.LEFT)
+        self.note_until_var = tk.StringVar()
+        ttk.Entry(form, textvariable=self.note_until_var, width=11).pack(side=tk.LEFT, padx=5)
+        ttk.Button(form, text="Buscar", command=self.search_notes).pack(side=tk.LEFT, padx=5)
+        ttk.Button(form, text="Reindexar", command=self.comment_search.reindex).pack(side=tk.LEFT)
+        for var in (self.note_query_var, self.note_user_var):
+            var.trace_add("write", lambda *args: self.schedule_note_search())
+
+        self.note_search_status = ttk.Label(tab, text="Fechas en formato AAAA-MM-DD", style="Status.TLabel")
+        self.note_search_status.pack(anchor='w', padx=10)
+
+        columns = (
+            ("example", "Ejemplo", 260),
+            ("user", "Usuario", 100),
+            ("date", "Fecha", 130),
+            ("snippet", "Nota", 440)
+        )
+        self.note_results_tree = ttk.Treeview(tab, columns=[c[0] for c in columns], show="headings", selectmode="browse")
+        for column, text, width in columns:
+            self.note_results_tree.heading(column, text=text)
+            self.note_results_tree.column(column, width=width, anchor='w')
+        self.note_results_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(5, 10))
+        self.note_results_tree.bind("<Double-Button-1>", lambda e: self.open_note_result())
+        self.note_results_tree.bind("<Return>", lambda e: self.open_note_result())
+        self.note_results = {}
+        self.note_search_id = None
+
+    def schedule_note_search(self):
+        # Se busca al dejar de escribir, no en cada tecla
+        if self.note_search_id is not None:
+            self.root.after_cancel(self.note_search_id)
+        self.note_search_id = self.root.after(250, self.search_notes)
+
+    def refresh_note_users(self):
+        self.note_user_combo.config(values=[""] + self.comment_search.users())
+
+    @staticmethod
+    def parse_note_date(text, end_of_day=False):
+        text = text.strip()
+        if not text:
+            return None
+        day = datetime.strptime(text, "%Y-%m-%d")
+        return day.timestamp() * 1000 + (86400000 - 1 if end_of_day else 0)
+
+    def search_notes(self):
+        self.note_search_id = None
+        try:
+            since = self.parse_note_date(self.note_since_var.get())
+            until = self.parse_note_date(self.note_until_var.get(), end_of_day=True)
+        except ValueError:
+            self.note_search_status.config(text="Fecha no válida: usa AAAA-MM-DD")
+            return
+        results = self.comment_search.search(
+            self.note_query_var.get(), user=self.note_user_var.get().strip() or None, since=since, until=until
+        )
+        self.note_results_tree.delete(*self.note_results_tree.get_children())
+        self.note_results = {}
+        for result in results:
+            iid = self.note_results_tree.insert("", tk.END, values=(
+                result["path"], result["user"] or "", format_timestamp(result["ts"]),
+                " ".join((result["snippet"] or "").split())
+            ))
+            self.note_results[iid] = result
+        self.update_note_search_status(*self.comment_search.progress)
+
+    def update_note_search_status(self, done, total):
+        if not self.comment_search.available:
+            text = "Búsqueda no disponible (SQLite sin FTS5)"
+        elif done < total:
+            text = f"Indexando notas: {done} de {total} ejemplos"
+        elif self.firebase is None:
+            text = "Sin conexión: se busca en lo ya indexado"
+        else:
+            text = "Índice al día"
+        if self.note_results or self.note_query_var.get().strip():
+            text = f"{len(self.note_results)} resultados | {text}"
+        self.note_search_status.config(text=text)
+
+    def open_note_result(self):
+        selection = self.note_results_tree.selection()
+        if selection and selection[0] in self.note_results:
+            self.jump_to_comment(self.note_results[selection[0]])
+
+    def jump_to_comment(self, result):
+        example_name = result["path"]
+        self.notebook.select(self.examples_tab)
+        if self.example_view.contains(example_name):
+            self.example_view.select(example_name, notify=False)
+        self.show_example_comments(example_name)
+        path = self.comment_search.thread_path(result["example"], result["cid"])
+        if not path:
+            return
+        # El hilo se carga aunque su raíz sea más antigua que las páginas ya vistas
+        changed = self.comment_pager.pin_thread(path)
+        changed |= self.refresh_reply_counts({cid for cid, _ in path})
+        self.refresh_comments_view(changed)
+        for parent_id, _ in path[:-1]:
+            # Completa los hermanos de cada nivel desde la caché y el servidor
+            self.expand_replies(parent_id)
+        self.comments_view.show(result["cid"])
+
+    def register_gauges(self):
+        METRICS.register_gauge("rtdb.open_listeners", self.comment_manager.open_streams)
+        METRICS.register_gauge("outbox.pending", lambda: self.pending_writes)
+        METRICS.register_gauge("ui.dispatch_queue", self.dispatcher.pending)
+        METRICS.register_gauge("process.running", self.process_manager.running_count)
+        METRICS.register_gauge("process.queued", self.process_manager.queued_count)
+        METRICS.register_gauge("examples.count", lambda: len(self.search_index))
+        METRICS.register_gauge("comments.loaded", lambda: len(self.current_comments))
+
+    def setup_diagnostics_panel(self, notebook):
+        # Pestaña oculta: Ctrl+Shift+D la muestra u oculta
+        self.diagnostics_tab = tab = ttk.Frame(notebook)
+        notebook.add(tab, text="Diagnóstico")
+        notebook.hide(tab)
+        self.root.bind("<Control-Shift-D>", lambda e: self.toggle_diagnostics())
+        notebook.bind("<<NotebookTabChanged>>", lambda e: self.schedule_diagnostics(), add="+")
+        self.diagnostics_after = None
+
+        top_frame = ttk.Frame(tab)
+        top_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(top_frame, text="Exportar JSON", command=lambda: self.export_metrics(".json")).pack(side=tk.LEFT, padx=5)
+        ttk.Button(top_frame, text="Exportar Prometheus", command=lambda: self.export_metrics(".prom")).pack(side=tk.LEFT, padx=5)
+        self.btn_profile = ttk.Button(top_frame, text="Iniciar perfil", command=self.toggle_profile)
+        self.btn_profile.pack(side=tk.LEFT, padx=5)
+        ttk.Button(top_frame, text="Reiniciar", command=self.reset_metrics).pack(side=tk.LEFT, padx=5)
+        self.diagnostics_summary = ttk.Label(top_frame, style="Status.TLabel")
+        self.diagnostics_summary.pack(side=tk.RIGHT)
+
+        columns = (
+            ("kind", "Tipo", 80),
+            ("value", "Valor", 90),
+            ("count", "N", 70),
+            ("p50", "p50 ms", 80),
+            ("p95", "p95 ms", 80),
+            ("max", "Máx. ms", 80)
+        )
+        self.metrics_tree = ttk.Treeview(tab, columns=[c[0] for c in columns], height=14)
+        self.metrics_tree.heading("#0", text="Métrica")
+        self.metrics_tree.column("#0", width=260, anchor='w')
+        for column, text, width in columns:
+            self.metrics_tree.heading(column, text=text)
+            self.metrics_tree.column(column, width=width, anchor='e')
+        self.metrics_tree.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        ttk.Label(tab, text="Últimos errores:").pack(pady=5, anchor='w', padx=10)
+        self.errors_list = tk.Listbox(tab, height=6, font=('Consolas', 9))
+        self.errors_list.pack(fill=tk.X, padx=10, pady=(0, 10))
+        self.errors_shown = None
+
+    def toggle_diagnostics(self):
+        tab = self.diagnostics_tab
+        if self.notebook.tab(tab, "state") == "hidden":
+            self.notebook.add(tab)
+            self.notebook.select(tab)
+        else:
+            self.notebook.hide(tab)
+
+    def schedule_diagnostics(self):
+        if self.diagnostics_after is not None:
+            self.root.after_cancel(self.diagnostics_after)
+            self.diagnostics_after = None
+        self.refresh_diagnostics()
+
+    def refresh_diagnostics(self):
+        self.diagnostics_after = None
+        # Solo se refresca mientras la pestaña está a la vista
+        if self.notebook.select() != str(self.diagnostics_tab):
+            return
+        snapshot = METRICS.snapshot()
+        rows = [(name, ("contador", value, "", "", "", "")) for name, value in snapshot["counters"].items()]
+        rows += [(name, ("gauge", "-" if value is None else value, "", "", "", ""))
+                 for name, value in snapshot["gauges"].items()]
+        rows += [(name, ("latencia", f"{h['sum_ms'] / h['count']:.2f}" if h["count"] else "", h["count"],
+                         f"{h['p50_ms']:g}", f"{h['p95_ms']:g}", f"{h['max_ms']:.1f}"))
+                 for name, h in snapshot["histograms"].items()]
+        names = set()
+        for index, (name, values) in enumerate(sorted(rows)):
+            names.add(name)
+            if self.metrics_tree.exists(name):
+                self.metrics_tree.item(name, values=values)
+                self.metrics_tree.move(name, "", index)
+            else:
+                self.metrics_tree.insert("", index, iid=name, text=name, values=values)
+        for name in set(self.metrics_tree.get_children()) - names:
+            self.metrics_tree.delete(name)
+
+        errors = snapshot["errors"]
+        latest = (len(errors), errors[-1]["time"]) if errors else None
+        if latest != self.errors_shown:
+            self.errors_list.delete(0, tk.END)
+            for error in reversed(errors):
+                when = datetime.fromtimestamp(error["time"]).strftime("%H:%M:%S")
+                self.errors_list.insert(tk.END, f"{when}  {error['message']}")
+            self.errors_shown = latest
+        profile = " | perfilando" if self.profiler.running else ""
+        self.diagnostics_summary.config(text=f"Sesión: {snapshot['uptime_s']:.0f} s{profile}")
+        self.diagnostics_after = self.root.after(1000, self.refresh_diagnostics)
+
+    def export_metrics(self, extension):
+        path = filedialog.asksaveasfilename(
+            title="Exportar métricas",
+            defaultextension=extension,
+            initialfile=f"sofa_metrics_{datetime.now():%Y%m%d_%H%M%S}{extension}",
+            filetypes=[("Prometheus", "*.prom")] if extension == ".prom" else [("JSON", "*.json")]
+        )
+        if path:
+            METRICS.dump(path)
 
-    def setup_notifications(self):
+    def toggle_profile(self):
+        if not self.profiler.running:
+            self.profiler.start()
+            self.btn_profile.config(text="Detener perfil")
+            return
+        path = PROFILE_FILE or f"sofa_profile_{datetime.now():%Y%m%d_%H%M%S}.prof"
+        print(self.profiler.stop(path))
+        self.btn_profile.config(text="Iniciar perfil")
+        messagebox.showinfo("Perfil", f"Perfil guardado en {os.path.abspath(path)}\n(resumen en la consola)")
+
+    def reset_metrics(self):
+        METRICS.reset()
+        self.schedule_diagnostics()
+
+    def set_max_concurrent(self):
+        try:
+            self.process_manager.set_max_concurrent(self.max_concurrent_var.get())
+        except (tk.TclError, ValueError):
+            self.max_concurrent_var.set(self.process_manager.max_concurrent)
+
+    def stop_selected_process(self):
+        selection = self.process_tree.selection()
+        if selection:
+            self.process_manager.stop(int(selection[0]))
+
+    def tick_processes(self):
+        # Tiempo, CPU y memoria cambian sin que haya eventos: se refrescan cada segundo
+        if self.process_manager.running_count():
+            self.refresh_processes()
+        self.root.after(1000, self.tick_processes)
+
+    def refresh_processes(self):
+        processes = self.process_manager.processes()
+        current = set(self.process_tree.get_children())
+        seen = set()
+        for process in processes:
+            iid = str(process.run_id)
+            seen.add(iid)
+            values = self.format_process(process)
+            if iid in current:
+                if tuple(self.process_tree.item(iid, "values")) != values:
+                    self.process_tree.item(iid, values=values)
+            else:
+                self.process_tree.insert("", tk.END, iid=iid, values=values)
+        for iid in current - seen:
+            self.process_tree.delete(iid)
+
+        self.process_summary.config(
+            text=f"En ejecución: {self.process_manager.running_count()}/{self.process_manager.max_concurrent}"
+                 f" | En cola: {self.process_manager.queued_count()}"
+        )
+        self.update_process_output()
+
+    @staticmethod
+    def format_process(process):
+        uptime = int(process.uptime())
+        hours, rest = divmod(uptime, 3600)
+        uptime_text = f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if process.started else "-"
+        state = process.state
+        if process.state == "error" and process.returncode is not None:
+            state = f"{state} (código {process.returncode})"
+        cpu, rss = process.resource_usage()
+        return (
+            str(process.pid or "-"),
+            process.scene,
+            state,
+            uptime_text,
+            f"{cpu:.0f}%" if cpu is not None else "-",
+            f"{rss / (1024 * 1024):.0f} MB" if rss is not None else "-"
+        )
+
+    def update_process_output(self):
+        selection = self.process_tree.selection()
+        process = self.process_manager.get(int(selection[0])) if selection else None
+        if process is None:
+            if self.output_run_id is not None:
+                self.set_process_output([], reset=True)
+                self.output_run_id = None
+            return
+
+        line_count = self.output_line_count if process.run_id == self.output_run_id else 0
+        lines, self.output_line_count, reset = process.output_since(line_count)
+        reset = reset or process.run_id != self.output_run_id
+        self.output_run_id = process.run_id
+        if lines or reset:
+            self.set_process_output(lines, reset)
+
+    def set_process_output(self, lines, reset):
+        # Solo se añaden las líneas nuevas; se redibuja si el buffer circular ha descartado alguna
+        at_end = self.process_output.yview()[1] >= 1.0
+        self.process_output.config(state="normal")
+        if reset:
+            self.process_output.delete(1.0, tk.END)
+        if lines:
+            self.process_output.insert(tk.END, "\n".join(lines) + "\n")
+        # El widget no guarda más líneas que el buffer del proceso
+        excess = int(self.process_output.index("end-1c").split(".")[0]) - 1 - self.process_manager.output_lines
+        if excess > 0:
+            self.process_output.delete(1.0, f"{excess + 1}.0")
+        self.process_output.config(state="disabled")
+        if at_end or reset:
+            self.process_output.see(tk.END)
+
+    def update_status_label(self):
+        text = f"Usuario: {self.current_user} | Firebase: {self.firebase_status}"
         if self.firebase:
-            self.firebase.set_notification_callback(self.show_notification)
+            text += f" | Streams: {self.comment_manager.open_streams()}"
+            if self.listener_error:
+                text += " | ⚠ Sin tiempo real"
+        if self.pending_writes:
+            text += f" | Pendientes: {self.pending_writes}"
+        if self.failed_writes:
+            text += f" | ❌ Rechazadas: {self.failed_writes} (clic para ver)"
+        self.status_label.config(text=text)
+
+    def show_failed_writes(self):
+        failed = self.comment_manager.failed_writes()
+        if not failed:
+            return
+        names = {'set': "nueva nota", 'update': "edición", 'delete': "borrado"}
+        lines = [f"• {names.get(op, op)} en {example}: {error}" for op, example, _, error in failed[:10]]
+        if len(failed) > 10:
+            lines.append(f"... y {len(failed) - 10} más")
+        answer = messagebox.askyesnocancel(
+            "Escrituras rechazadas",
+            "El servidor rechazó estas escrituras:\n\n" + "\n".join(lines) +
+            "\n\nSí: reintentar · No: descartarlas · Cancelar: dejarlas así"
+        )
+        if answer:
+            self.comment_manager.retry_failed()
+        elif answer is False:
+            self.comment_manager.discard_failed()
+
+    def set_listener_status(self, error):
+        # El stream se abre en segundo plano; si falla se reintenta al abrir otro ejemplo
+        self.listener_error = error
+        if error is not None:
+            self.status_label.config(text=f"⚠ No se pudo abrir el tiempo real: {error}")
+            self.root.after(5000, self.update_status_label)
+        else:
+            self.update_status_label()
+
+    def set_pending_writes(self, count):
+        self.pending_writes = count
+        self.failed_writes = self.comment_manager.failed_count()
+        self.update_status_label()
+
+    def quit_app(self):
+        active = self.process_manager.running_count() + self.process_manager.queued_count()
+        if active and not messagebox.askokcancel(
+                "Salir", f"Hay {active} simulaciones en marcha o en cola.\nSe detendrán al salir."):
+            return
+        self.process_manager.stop_all()
+        self.comment_manager.close()
+        self.history.flush()
+        self.notifications.stop()
+        self.comment_counts.stop()
+        self.comment_search.stop()
+        self.example_indexer.cancel()
+        self.example_watcher.stop()
+        self.scene_analyzer.stop()
+        self.preflight.shutdown()
+        self.thumbnails.shutdown()
+        self.attachments.shutdown()
+        self.dispatcher.stop()
+        if self.profiler.running:
+            print(self.profiler.stop(PROFILE_FILE or "sofa_profile.prof"))
+        if METRICS_FILE:
+            METRICS.dump(METRICS_FILE)
+        self.root.quit()
+
+    def setup_notifications(self):
+        self.comment_manager.set_notification_callback(self.on_notification_event)
 
         self.notification_status = ttk.Label(
             self.root,
@@ -215,6 +792,7 @@ class SOFAInterface:
             style="Status.TLabel"
         )
         self.notification_status.pack(side=tk.RIGHT, padx=10)
+        self.update_notification_badge()
 
         self.notification_menu = tk.Menu(self.root, tearoff=0)
         self.notification_enabled_var = tk.BooleanVar(value=self.notification_enabled)
@@ -231,103 +809,160 @@ class SOFAInterface:
         self.notification_status.bind("<Button-3>", lambda e:
             self.notification_menu.tk_popup(e.x_root, e.y_root))
 
-    def show_notification(self, example_name, user, comment_text):
-        if not self.notification_enabled:
-            return
-        self.unread_comments += 1
-        self.update_notification_badge()
-        notification.notify(
-            title=f"Nuevo comentario en {example_name}",
-            message=f"{user}: {comment_text[:100]}...",
-            app_name="SOFA Manager",
-            timeout=10
+    def setup_dispatch(self):
+        # Los hilos de fondo no tocan Tk: publican eventos que el mainloop despacha
+        self.dispatcher.register('comments', lambda p: self.apply_comments_update(*p), merge=self.merge_comment_events)
+        self.dispatcher.register('comments_page', lambda p: self.apply_comments_page(*p))
+        self.dispatcher.register('comments_replies', lambda p: self.apply_comments_replies(*p))
+        self.dispatcher.register('unread', self.set_unread_counts, merge=lambda old, new: new)
+        self.dispatcher.register('comment_counts', lambda p: self.example_view.redraw(), merge=lambda old, new: {**old, **new})
+        self.dispatcher.register(
+            'examples_added',
+            lambda p: self.add_examples(*p),
+            merge=lambda old, new: (new[0], old[1] + new[1])
         )
+        self.dispatcher.register(
+            'examples_removed',
+            lambda p: self.remove_examples(*p),
+            merge=lambda old, new: (new[0], old[1] + new[1])
+        )
+        self.dispatcher.register('examples_done', lambda p: self.finish_examples_scan(*p))
+        # Cada lote del watcher ya agrupa una ráfaga; se aplican en orden, sin fusionar
+        self.dispatcher.register('examples_changed', lambda p: self.apply_example_changes(*p))
+        self.dispatcher.register('note_index', lambda p: self.update_note_search_status(*p), merge=lambda old, new: new)
+        self.dispatcher.register('pending_writes', self.set_pending_writes, merge=lambda old, new: new)
+        self.dispatcher.register('firebase_ready', self.on_firebase_ready)
+        self.dispatcher.register('listener_status', self.set_listener_status, merge=lambda old, new: new)
+        self.dispatcher.register('scene_metadata', lambda p: self.show_scene_metadata(*p), merge=lambda old, new: new)
+        self.dispatcher.register('thumbnails', self.add_thumbnails, merge=lambda old, new: old + new)
+        self.dispatcher.register('attachments', self.add_attachment_photos, merge=lambda old, new: old + new)
+        self.dispatcher.register('attachments_prepared', lambda p: self.on_attachments_prepared(*p))
+        self.dispatcher.register('attachment_open', lambda p: self.on_attachment_fetched(*p))
+        self.dispatcher.register('preflight', lambda p: self.on_preflight(*p))
+        self.dispatcher.register('processes', lambda p: self.refresh_processes(), merge=lambda old, new: new)
+        self.dispatcher.start()
+
+    @staticmethod
+    def merge_comment_events(old, new):
+        # Cada evento trae solo los comentarios cambiados; los ausentes se han borrado
+        example_name, old_comments, old_changed = old
+        _, new_comments, new_changed = new
+        comments = {cid: c for cid, c in old_comments.items() if cid not in new_changed}
+        comments.update(new_comments)
+        return example_name, comments, set(old_changed) | set(new_changed)
+
+    def on_comments_event(self, example_name, comments, changed_ids):
+        # Hilo del listener: varias ráfagas del mismo ejemplo se fusionan en un solo redibujado
+        self.dispatcher.post('comments', (example_name, comments, changed_ids), key=example_name)
+
+    def on_comments_page_event(self, example_name, page):
+        self.dispatcher.post('comments_page', (example_name, page))
+
+    def on_comments_replies_event(self, example_name, parent_id, replies):
+        self.dispatcher.post('comments_replies', (example_name, parent_id, replies))
+
+    def on_notification_event(self, example_name, user, comment_text):
+        self.notifications.submit(example_name, user, comment_text)
+
+    def apply_comments_update(self, example_name, comments, changed_ids):
+        if example_name == self.comments_example:
+            self.update_comments_display(comments, changed_ids)
+
+    def apply_comments_page(self, example_name, page):
+        if example_name == self.comments_example:
+            self.add_comments_page(page, complete=True)
+
+    def apply_comments_replies(self, example_name, parent_id, replies):
+        if example_name == self.comments_example and parent_id in self.comment_pager.expanded:
+            changed = self.comment_pager.expand(parent_id, replies)
+            self.refresh_reply_counts(replies)
+            self.refresh_comments_view(changed | set(replies))
+
+    def set_unread_counts(self, counts):
+        self.unread_counts = counts
+        self.update_notification_badge()
+        self.example_view.redraw()
 
     def update_notification_badge(self):
-        self.notification_status.config(text=f"🔔 {self.unread_comments}")
-        self.notification_status.config(foreground="red" if self.unread_comments > 0 else "black")
+        total = sum(self.unread_counts.values())
+        self.notification_status.config(text=f"🔔 {total}")
+        self.notification_status.config(foreground="red" if total > 0 else "black")
 
     def toggle_notifications(self):
         self.notification_enabled = self.notification_enabled_var.get()
+        self.notifications.set_enabled(self.notification_enabled)
         status = "activadas" if self.notification_enabled else "desactivadas"
         messagebox.showinfo("Notificaciones", f"Notificaciones {status}")
 
     def show_all_notifications(self):
-        self.unread_comments = 0
-        self.update_notification_badge()
-        messagebox.showinfo("Notificaciones", "Marcando todas como leídas")
-
-    def update_comments_display(self, comments):
-        # Limpiar el frame de comentarios
-        for widget in self.comments_frame.winfo_children():
-            widget.destroy()
-
-        if not comments:
-            no_comments = ttk.Label(self.comments_frame, text="No hay notas para este ejemplo.")
-            no_comments.pack(pady=10)
+        if self.unread_counts:
+            pending = sorted(self.unread_counts.items(), key=lambda item: -item[1])
+            lines = [f"{count}  {name}" for name, count in pending[:15]]
+            if len(pending) > 15:
+                lines.append(f"... y {len(pending) - 15} ejemplos más")
+            messagebox.showinfo("Notificaciones", "Sin leer:\n\n" + "\n".join(lines) + "\n\nMarcando todas como leídas")
+        else:
+            messagebox.showinfo("Notificaciones", "No hay notas sin leer")
+        self.notifications.mark_read()
+
+    @METRICS.timed("ui.comments_update")
+    def update_comments_display(self, comments, changed_ids):
+        loaded = self.comment_pager.comments
+        parents = {c.get('parent_id') for c in comments.values()}
+        parents |= {loaded[cid].get('parent_id') for cid in changed_ids if cid in loaded}
+        # Solo se conservan los cambios que caen en la ventana cargada
+        affected = self.comment_pager.apply(comments, changed_ids)
+        affected |= self.refresh_reply_counts(parents & set(loaded))
+        if affected:
+            self.refresh_comments_view(affected)
+
+    @METRICS.timed("ui.comments_render")
+    def refresh_comments_view(self, changed_ids):
+        # Copia: la vista compara con el estado anterior que ella misma guarda
+        self.current_comments = dict(self.comment_pager.comments)
+        self.comments_view.update(self.current_comments, changed_ids)
+
+    def refresh_reply_counts(self, ids):
+        if not ids:
+            return set()
+        counts = self.comment_manager.reply_counts(self.comments_example, ids)
+        changed = set()
+        for cid in ids:
+            count = counts.get(cid, 0)
+            if self.comment_pager.reply_counts.get(cid, 0) != count:
+                self.comment_pager.reply_counts[cid] = count
+                changed.add(cid)
+        return changed
+
+    def add_comments_page(self, page, complete):
+        changed = self.comment_pager.add_page(page, complete)
+        self.refresh_reply_counts(changed)
+        self.refresh_comments_view(changed)
+
+    def load_more_comments(self):
+        before = self.comment_pager.next_request()
+        if before is None or not self.comments_example:
             return
-        
-        self.current_comments = comments
-        comments_by_id = {}
-        children_map = {}
-
-        # Organizar comentarios por parent_id
-        for cid, comment in comments.items():
-            comments_by_id[cid] = comment
-            parent = comment.get('parent_id')
-            children_map.setdefault(parent, []).append(cid)
-
-        # Función recursiva para mostrar hilos
-        def display_thread(parent_id=None, level=0):
-            if parent_id not in children_map:
-                return
+        page = self.comment_manager.get_comments_page(
+            self.comments_example, self.comment_pager.page_size, before,
+            on_server_page=self.on_comments_page_event
+        )
+        self.add_comments_page(page, complete=self.comment_manager.remote is None)
 
-            for cid in sorted(children_map[parent_id], 
-                            key=lambda x: comments_by_id[x].get('timestamp', 0), 
-                            reverse=True):
-                comment = comments_by_id[cid]
-                user = comment.get('user', 'Anónimo')
-                text = comment.get('text', '')
-                timestamp = comment.get('timestamp', 'Fecha desconocida')
-                
-                if isinstance(timestamp, dict):
-                    timestamp = "Recién guardado"
-                elif isinstance(timestamp, (int, float)):
-                    timestamp = datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d %H:%M:%S')
-
-                # Frame para cada comentario
-                comment_frame = ttk.Frame(self.comments_frame)
-                comment_frame.pack(fill=tk.X, pady=5, padx=(10 * level, 10))
-
-                # Cabecera del comentario
-                header_frame = ttk.Frame(comment_frame)
-                header_frame.pack(fill=tk.X)
-                
-                initials = "".join([w[0] for w in user.split() if w]).upper()[:2]
-                ttk.Label(header_frame, text=f"👤[{initials}] {user}").pack(side=tk.LEFT)
-                ttk.Label(header_frame, text=f"🕒 {timestamp}", style="Status.TLabel").pack(side=tk.LEFT, padx=10)
-
-                # Texto del comentario
-                ttk.Label(comment_frame, text=text, wraplength=350, anchor='w').pack(fill=tk.X)
-
-                # Botones de acciones
-                btn_frame = ttk.Frame(comment_frame)
-                btn_frame.pack(fill=tk.X)
-                
-                if user == self.current_user:
-                    ttk.Button(btn_frame, text="Editar", 
-                            command=lambda cid=cid: self.start_edit_comment(cid)).pack(side=tk.LEFT, padx=2)
-                    ttk.Button(btn_frame, text="Borrar", 
-                            command=lambda cid=cid: self.delete_comment(cid)).pack(side=tk.LEFT, padx=2)
-                
-                ttk.Button(btn_frame, text="Responder", 
-                        command=lambda cid=cid: self.start_reply_comment(cid)).pack(side=tk.LEFT, padx=2)
-
-                # Comentarios hijos
-                display_thread(cid, level + 1)
-        
-        display_thread()
-        self.comments_canvas.yview_moveto(0)  # Scroll al inicio
+    def toggle_replies(self, comment_id):
+        if comment_id in self.comment_pager.expanded:
+            self.refresh_comments_view(self.comment_pager.collapse(comment_id))
+        else:
+            self.expand_replies(comment_id)
+
+    def expand_replies(self, comment_id):
+        replies = self.comment_manager.get_replies(
+            self.comments_example, comment_id,
+            on_server_replies=lambda example, result: self.on_comments_replies_event(example, comment_id, result)
+        )
+        changed = self.comment_pager.expand(comment_id, replies)
+        self.refresh_reply_counts(replies)
+        self.refresh_comments_view(changed)
 
     def start_edit_comment(self, comment_id):
         if not self.current_comments or comment_id not in self.current_comments:
@@ -342,6 +977,9 @@ class SOFAInterface:
         self.new_comment.insert(tk.END, comment.get("text", ""))
         self.btn_save.config(text="Guardar Cambios")
         self.btn_cancel.config(state="normal")
+        # Al editar solo cambia el texto; las imágenes se adjuntan a notas nuevas
+        self.clear_attachments()
+        self.btn_attach.config(state="disabled")
 
     def delete_comment(self, comment_id):
         if not self.current_comments or comment_id not in self.current_comments:
@@ -350,9 +988,14 @@ class SOFAInterface:
         if comment.get("user") != self.current_user:
             messagebox.showwarning("Permiso denegado", "Solo puedes borrar tus propios comentarios.")
             return
-        if messagebox.askyesno("Confirmar", "¿Estás seguro de borrar este comentario?"):
+        replies = len(collect_thread(self.comment_manager.get_comments(self.current_example), comment_id)) - 1
+        question = "¿Estás seguro de borrar este comentario?"
+        if replies:
+            question = f"¿Estás seguro de borrar este comentario y sus {replies} respuestas?"
+        if messagebox.askyesno("Confirmar", question):
             try:
-                self.firebase.delete_comment(self.current_example, comment_id)
+                # Un solo update multi-ruta borra el comentario y todo su hilo
+                self.comment_manager.delete_thread(self.current_example, comment_id)
             except Exception as e:
                 messagebox.showerror("Error", f"No se pudo borrar el comentario:\n{e}")
 
@@ -373,40 +1016,220 @@ class SOFAInterface:
         self.new_comment.delete(1.0, tk.END)
         self.btn_save.config(text="Guardar Nota")
         self.btn_cancel.config(state="disabled")
+        self.btn_attach.config(state="normal")
+        self.clear_attachments()
 
-    def show_example_comments(self, event):
-        selection = self.example_list.curselection()
-        if not selection:
-            return
-        example_name = self.example_list.get(selection[0])
+    def show_example_comments(self, example_name):
         self.current_example = example_name
-        self.unread_comments = 0
-        self.update_notification_badge()
-        if self.firebase:
-            comments = self.firebase.get_comments(example_name)
-            self.update_comments_display(comments)
-            self.firebase.listen_updates(example_name, self.update_comments_display)
-        else:
-            no_connection = ttk.Label(self.comments_frame, text="Modo offline - Sin conexión a Firebase")
-            no_connection.pack(pady=10)
+        self.notifications.mark_read(example_name)
+        self.notifications.set_open_example(example_name)
+        self.open_example_comments(example_name)
+        self.request_scene_preview(example_name)
+        self.update_status_label()
         self.new_comment.delete(1.0, tk.END)
         self.cancel_edit_or_reply()
 
+    def open_example_comments(self, example_name):
+        if example_name != self.comments_example:
+            self.comments_view.clear()
+            self.comments_example = example_name
+            self.comment_pager = CommentPager()
+            # La caché responde al instante con la primera página; el servidor la confirma después
+            page = self.comment_manager.get_comments_page(
+                example_name, self.comment_pager.page_size,
+                on_server_page=self.on_comments_page_event
+            )
+            self.add_comments_page(page, complete=self.comment_manager.remote is None)
+        self.comment_manager.listen_updates(example_name, self.on_comments_event)
+
+    def get_thumbnail(self, example_name):
+        path = os.path.join(self.examples_dir, example_name)
+        photo = self.thumbnails.photo(path)
+        if photo is None:
+            self.thumbnails.request(path)
+        return photo
+
+    def attachment_photo(self, digest):
+        photo = self.attachments.photo(digest)
+        if photo is None:
+            self.attachments.request(digest)
+        return photo
+
+    def add_attachment_photos(self, ready):
+        for digest, png_path in ready:
+            try:
+                self.attachments.add_photo(digest, png_path)
+            except Exception as e:
+                METRICS.error("attachments", f"Error cargando miniatura {png_path}: {e}")
+        self.comments_view.refresh_attachments(digest for digest, _ in ready)
+
+    def choose_attachments(self):
+        free = MAX_ATTACHMENTS - len(self.pending_attachments) - self.attachments_preparing
+        if free <= 0:
+            messagebox.showwarning("Advertencia", f"Como máximo {MAX_ATTACHMENTS} imágenes por nota")
+            return
+        paths = filedialog.askopenfilenames(title="Adjuntar imagen", filetypes=IMAGE_FILETYPES)
+        if not paths:
+            return
+        if len(paths) > free:
+            messagebox.showwarning("Advertencia", f"Solo se adjuntarán las {free} primeras imágenes")
+            paths = paths[:free]
+        generation = self.attachments_generation
+        self.attachments_preparing += len(paths)
+        self.update_attachments_label()
+        # La compresión va en segundo plano; Guardar espera a que termine
+        self.attachments.prepare(
+            paths,
+            lambda refs, errors: self.dispatcher.post('attachments_prepared', (generation, len(paths), refs, errors))
+        )
+
+    def on_attachments_prepared(self, generation, count, refs, errors):
+        if generation != self.attachments_generation:
+            return
+        self.attachments_preparing -= count
+        attached = {ref['hash'] for ref in self.pending_attachments}
+        for ref in refs:
+            if ref['hash'] not in attached:
+                attached.add(ref['hash'])
+                self.pending_attachments.append(ref)
+        self.update_attachments_label()
+        if errors:
+            messagebox.showerror("Error", "No se pudieron adjuntar:\n" + "\n".join(errors))
+
+    def clear_attachments(self):
+        # Las compresiones en curso de la nota descartada se ignoran al llegar
+        self.attachments_generation += 1
+        self.pending_attachments = []
+        self.attachments_preparing = 0
+        self.update_attachments_label()
+
+    def update_attachments_label(self):
+        count = len(self.pending_attachments)
+        if self.attachments_preparing:
+            text = f"⏳ Comprimiendo {self.attachments_preparing} imagen(es)..."
+        elif count:
+            text = f"📎 {count} imagen(es) adjunta(s)"
+        else:
+            text = ""
+        self.attachments_label.config(text=text)
+        self.btn_save.config(state="disabled" if self.attachments_preparing else "normal")
+        if count or self.attachments_preparing:
+            self.btn_clear_attachments.pack(side=tk.LEFT, padx=2, before=self.attachments_label)
+        else:
+            self.btn_clear_attachments.pack_forget()
+
+    def show_attachment(self, digest):
+        path = self.attachments.local_path(digest)
+        if path is not None:
+            self.open_attachment_window(path)
+        else:
+            self.attachments.fetch(digest, lambda d, p: self.dispatcher.post('attachment_open', (d, p)))
+
+    def on_attachment_fetched(self, digest, path):
+        if path is None:
+            messagebox.showerror("Error", "No se pudo descargar la imagen adjunta")
+            return
+        self.open_attachment_window(path)
+
+    def open_attachment_window(self, path):
+        try:
+            from PIL import Image, ImageTk
+            with Image.open(path) as image:
+                image.load()
+            # Como mucho el 90% de la pantalla
+            image.thumbnail((int(self.root.winfo_screenwidth() * 0.9), int(self.root.winfo_screenheight() * 0.9)))
+            photo = ImageTk.PhotoImage(image)
+        except Exception as e:
+            METRICS.error("attachments", f"Error abriendo imagen {path}: {e}")
+            messagebox.showerror("Error", f"No se pudo abrir la imagen:\n{e}")
+            return
+        window = tk.Toplevel(self.root)
+        window.title("Imagen adjunta")
+        label = tk.Label(window, image=photo)
+        label.image = photo
+        label.pack()
+        window.bind("<Escape>", lambda e: window.destroy())
+
+    def on_examples_visible(self, example_names):
+        self.comment_counts.request(example_names)
+        self.set_visible_thumbnails(example_names)
+
+    def example_badge(self, example_name):
+        count = self.comment_counts.get(example_name)
+        unread = self.unread_counts.get(example_name, 0)
+        if not count and not unread:
+            return None
+        text = f"💬 {count}" if count else ""
+        if unread:
+            text += f" · {unread} sin leer"
+        return text.lstrip(" ·"), bool(unread)
+
+    def set_visible_thumbnails(self, example_names):
+        if self.example_view.show_thumbnails:
+            self.thumbnails.set_visible(os.path.join(self.examples_dir, name) for name in example_names)
+
+    def add_thumbnails(self, ready):
+        for path, png_path in ready:
+            try:
+                self.thumbnails.add_photo(path, png_path)
+            except Exception as e:
+                METRICS.error("thumbnails", f"Error cargando miniatura {png_path}: {e}")
+        self.example_view.redraw()
+
+    def request_scene_preview(self, example_name):
+        # El análisis (y hasta el stat del archivo) se hace en el hilo del analizador
+        path = os.path.join(self.examples_dir, example_name)
+        if path == self.preview_path:
+            return
+        self.preview_path = path
+        self.scene_preview.config(text="Analizando escena...")
+        self.scene_analyzer.request(path)
+
+    def show_scene_metadata(self, path, metadata):
+        if path != self.preview_path:
+            return
+        if metadata is None:
+            self.scene_preview.config(text="No se pudo leer la escena")
+            return
+        kind = "Python" if metadata["type"] == "python" else "XML"
+        lines = [
+            f"Tipo: {kind} · {metadata['size'] / 1024:.1f} KB",
+            f"Nodos: {metadata['nodes']} (profundidad {metadata['max_depth']}) · Componentes: {metadata['component_total']}"
+        ]
+        if metadata["solvers"]:
+            lines.append("Solvers: " + ", ".join(metadata["solvers"]))
+        top = list(metadata["components"].items())[:5]
+        if top:
+            lines.append("Más usados: " + ", ".join(f"{name} ×{count}" for name, count in top))
+        if metadata["meshes"]:
+            extra = len(metadata["meshes"]) - 3
+            lines.append("Mallas: " + ", ".join(metadata["meshes"][:3]) + (f" (+{extra})" if extra > 0 else ""))
+        if metadata["plugins"]:
+            lines.append("Plugins: " + ", ".join(metadata["plugins"]))
+        if metadata["error"]:
+            lines.append(f"⚠ {metadata['error']}")
+        self.scene_preview.config(text="\n".join(lines))
+
     def save_comment(self):
         if not self.current_example:
             messagebox.showwarning("Advertencia", "Selecciona un ejemplo primero")
             return
         comment_text = self.new_comment.get("1.0", tk.END).strip()
-        if not comment_text:
+        if not comment_text and (self.editing_comment_id or not self.pending_attachments):
             messagebox.showwarning("Advertencia", "La nota no puede estar vacía")
             return
+        if self.attachments_preparing:
+            return
         
         try:
             if self.editing_comment_id:
-                self.firebase.update_comment(self.current_example, self.editing_comment_id, comment_text)
+                self.comment_manager.update_comment(self.current_example, self.editing_comment_id, comment_text)
             else:
                 parent_id = self.replying_to_comment_id if self.replying_to_comment_id else None
-                self.firebase.save_comment(self.current_example, self.current_user, comment_text, parent_id)
+                if parent_id and parent_id not in self.comment_pager.expanded:
+                    self.expand_replies(parent_id)
+                self.comment_manager.save_comment(self.current_example, self.current_user, comment_text, parent_id,
+                                                  attachments=self.pending_attachments or None)
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo guardar la nota:\n{e}")
             return
@@ -420,16 +1243,118 @@ class SOFAInterface:
         if not os.path.exists(self.examples_dir):
             messagebox.showerror("Error", f"Carpeta de ejemplos no encontrada en:\n{self.examples_dir}")
 
+    @METRICS.timed("ui.search")
+    def apply_search(self):
+        self.example_view.set_items(self.search_index.search(self.search_var.get()))
+        self.update_examples_label()
+
+    def focus_example_list(self):
+        self.example_view.canvas.focus_set()
+        if self.example_view.selection() is None and len(self.example_view):
+            self.example_view.select(self.example_view.items()[0])
+
+    def update_examples_label(self):
+        total = len(self.search_index)
+        if self.search_var.get().strip():
+            text = f"Ejemplos disponibles ({len(self.example_view)} de {total}"
+        else:
+            text = f"Ejemplos disponibles ({total}"
+        if self.examples_scanning:
+            text += ", indexando..."
+        elif self.example_watcher.mode:
+            text += f", vigilando cambios: {self.example_watcher.mode}"
+        self.examples_label.config(text=text + "):")
+
+    def schedule_search_build(self):
+        # Indexa por tramos en los ratos libres para que la primera búsqueda no espere
+        if self.search_build_id is None:
+            self.search_build_id = self.root.after_idle(self.search_build_step)
+
+    def search_build_step(self):
+        self.search_build_id = None
+        if self.search_index.build_step():
+            self.search_build_id = self.root.after(1, self.search_build_step)
+
+    def add_to_example_list(self, paths):
+        self.search_index.add(paths)
+        if self.search_var.get().strip():
+            self.apply_search()
+        else:
+            # Sin filtro no hace falta buscar: las rutas nuevas van al final
+            self.example_view.append(paths)
+            self.update_examples_label()
+            self.schedule_search_build()
+
     def load_examples(self):
-        self.example_list.delete(0, tk.END)
-        if os.path.exists(self.examples_dir):
-            for root, _, files in os.walk(self.examples_dir):
-                for file in files:
-                    if file.lower().endswith(('.scn', '.py', '.xml')):
-                        rel_path = os.path.relpath(os.path.join(root, file), self.examples_dir)
-                        self.example_list.insert(tk.END, rel_path)
+        if not os.path.exists(self.examples_dir):
+            self.search_index.set_paths([])
+            self.example_view.set_items([])
+            if 'escaneo_ejemplos' in self.startup.phases:
+                messagebox.showerror("Error", "Carpeta de ejemplos no encontrada")
+            else:
+                # Durante el arranque lo avisa verify_installation con la ventana ya visible
+                self.startup.mark('escaneo_ejemplos')
+            return
+
+        if not self.examples_loaded:
+            # Muestra al instante el índice guardado y lo reconcilia en segundo plano
+            self.search_index.set_paths(self.example_indexer.cached_paths())
+            self.apply_search()
+            self.schedule_search_build()
+            self.examples_loaded = True
+
+        self.examples_generation += 1
+        generation = self.examples_generation
+        self.examples_scan_start = time.perf_counter()
+        self.examples_scanning = True
+        self.update_examples_label()
+        self.example_indexer.refresh(
+            set(self.search_index.paths()) - self.external_examples,
+            on_added=lambda paths: self.dispatcher.post('examples_added', (generation, paths), key=generation),
+            on_removed=lambda paths: self.dispatcher.post('examples_removed', (generation, paths), key=generation),
+            on_done=lambda total: self.dispatcher.post('examples_done', (generation, total))
+        )
+
+    def add_examples(self, generation, paths):
+        if generation == self.examples_generation:
+            self.add_to_example_list(paths)
+
+    def remove_examples(self, generation, paths):
+        if generation != self.examples_generation:
+            return
+        self.search_index.remove(paths)
+        self.example_view.remove(paths)
+        self.update_examples_label()
+
+    def apply_example_changes(self, added, removed, renamed):
+        if renamed:
+            self.search_index.rename(renamed)
+            self.example_view.rename(renamed)
+            new_names = dict(renamed)
+            if self.current_example in new_names:
+                self.current_example = new_names[self.current_example]
+                self.notifications.set_open_example(self.current_example)
+        if removed:
+            self.search_index.remove(removed)
+            self.example_view.remove(removed)
+        if added:
+            self.add_to_example_list(added)
+        elif renamed and self.search_var.get().strip():
+            # El nombre nuevo puede dejar de coincidir con la búsqueda
+            self.apply_search()
         else:
-            messagebox.showerror("Error", "Carpeta de ejemplos no encontrada")
+            self.update_examples_label()
+
+    def finish_examples_scan(self, generation, total):
+        if generation == self.examples_generation:
+            self.examples_scanning = False
+            # A partir del primer recorrido los cambios llegan solos, sin reescanear
+            self.example_watcher.start()
+            self.example_watcher.resync()
+            self.update_examples_label()
+        METRICS.observe("examples.scan", (time.perf_counter() - self.examples_scan_start) * 1000)
+        if 'escaneo_ejemplos' not in self.startup.phases:
+            self.startup.record('escaneo_ejemplos', self.examples_scan_start)
 
     def browse_file(self):
         filepath = filedialog.askopenfilename(
@@ -438,11 +1363,13 @@ class SOFAInterface:
         )
         if filepath:
             rel_path = os.path.relpath(filepath, self.examples_dir) if filepath.startswith(self.examples_dir) else filepath
+            if os.path.isabs(rel_path) or rel_path.startswith(os.pardir):
+                rel_path = filepath
+                self.external_examples.add(rel_path)
             self.current_example = rel_path
-            if rel_path not in self.example_list.get(0, tk.END):
-                self.example_list.insert(tk.END, rel_path)
+            if not self.example_view.contains(rel_path):
+                self.add_to_example_list([rel_path])
             self.open_example()
-            self.save_to_history(filepath)
 
     def open_example(self):
         if not self.current_example:
@@ -454,43 +1381,64 @@ class SOFAInterface:
             if not os.path.exists(path):
                 messagebox.showerror("Error", f"No se encontró el archivo:\n{self.current_example}")
                 return
-        try:
-            subprocess.Popen([self.sofa_executable, path])
-            self.save_to_history(path)
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo abrir el ejemplo:\n{e}")
+        # Antes de runSofa se comprueba en segundo plano que no falte ninguna dependencia
+        self.launch_label.config(text=f"Comprobando {os.path.basename(path)}...")
+        self.preflight.submit(path, lambda path, result: self.dispatcher.post('preflight', (path, result)))
+
+    def on_preflight(self, path, result):
+        name = os.path.basename(path)
+        if result is not None and not result["ok"]:
+            problems = describe(result)
+            shown = "\n".join(problems[:10]) + (f"\n(+{len(problems) - 10} más)" if len(problems) > 10 else "")
+            if not messagebox.askyesno(
+                    "Dependencias", f"{name} no cargará bien:\n\n{shown}\n\n¿Abrir de todos modos?"):
+                self.launch_label.config(text=f"{name} no se ha abierto: faltan dependencias")
+                return
+        self.launch_example(path)
+
+    def launch_example(self, path):
+        process, new = self.process_manager.launch(path)
+        if process.error:
+            messagebox.showerror("Error", f"No se pudo abrir el ejemplo:\n{process.error}")
+            return
+        self.save_to_history(path)
+        name = os.path.basename(path)
+        if not new:
+            state = f"en marcha (PID {process.pid})" if process.state == "ejecutando" else process.state
+            self.launch_label.config(text=f"{name} ya está {state}")
+        elif process.state == "en cola":
+            self.launch_label.config(
+                text=f"{name} en cola: {self.process_manager.running_count()}/{self.process_manager.max_concurrent} en ejecución"
+            )
+        else:
+            self.launch_label.config(text=f"Ejecutando {name} (PID {process.pid})")
 
     def save_to_history(self, filepath):
-        history = []
-        if os.path.exists(self.history_file):
-            with open(self.history_file, "r", encoding="utf-8") as f:
-                try:
-                    history = json.load(f)
-                except:
-                    history = []
-        if filepath in history:
-            history.remove(filepath)
-        history.insert(0, filepath)
-        with open(self.history_file, "w", encoding="utf-8") as f:
-            json.dump(history[:30], f, indent=2)
+        self.history.record(filepath)
         self.load_history()
 
     def load_history(self):
-        self.history_list.delete(0, tk.END)
-        if os.path.exists(self.history_file):
-            with open(self.history_file, "r", encoding="utf-8") as f:
-                try:
-                    history = json.load(f)
-                    for item in history:
-                        self.history_list.insert(tk.END, item)
-                except:
-                    pass
+        """Lleva la lista de Recientes al orden actual tocando solo las filas que cambian"""
+        ranked = self.history.ranked()
+        shown = self.history_paths
+        for index, path in enumerate(ranked):
+            if index < len(shown) and shown[index] == path:
+                continue
+            if path in shown:
+                old_index = shown.index(path, index)
+                del shown[old_index]
+                self.history_list.delete(old_index)
+            shown.insert(index, path)
+            self.history_list.insert(index, path)
+        if len(shown) > len(ranked):
+            del shown[len(ranked):]
+            self.history_list.delete(len(ranked), tk.END)
 
     def open_from_history(self):
         selection = self.history_list.curselection()
         if not selection:
             return
-        path = self.history_list.get(selection[0])
+        path = self.history_paths[selection[0]]
         if os.path.exists(path):
             self.current_example = os.path.relpath(path, self.examples_dir) if path.startswith(self.examples_dir) else path
             self.open_example()
@@ -499,14 +1447,45 @@ class SOFAInterface:
 
     def clear_history(self):
         if messagebox.askyesno("Confirmar", "¿Deseas limpiar el historial?"):
-            if os.path.exists(self.history_file):
-                os.remove(self.history_file)
+            self.history.clear()
+            self.history_paths = []
             self.history_list.delete(0, tk.END)
 
+def create_comment_backend():
+    """Backend de comentarios elegido con SOFA_COMMENT_BACKEND"""
+    if COMMENT_BACKEND == "memoria":
+        from memory_backend import MemoryDatabase, MemoryBackend
+        return MemoryBackend(MemoryDatabase(MEMORY_BACKEND_FILE))
+    return FirebaseManager()
+
 def main():
     root = tk.Tk()
     app = SOFAInterface(root)
     root.mainloop()
 
+def main_batch(argv):
+    from batch_runner import batch_main
+    return batch_main(argv, SOFA_EXECUTABLE, EXAMPLES_DIR)
+
+def main_transfer(argv):
+    from comment_transfer import transfer_main
+    return transfer_main(argv, create_comment_backend)
+
+def main_check(argv):
+    from scene_preflight import preflight_main
+    return preflight_main(argv, SOFA_EXECUTABLE, EXAMPLES_DIR)
+
+def main_bench(argv):
+    from comment_bench import bench_main
+    return bench_main(argv)
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        sys.exit(main_batch(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "check":
+        sys.exit(main_check(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        sys.exit(main_bench(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] in ("export", "import", "migrate-keys"):
+        sys.exit(main_transfer(sys.argv[1:]))
     main()
\ No newline at end of file
@@ -0,0 +1,76 @@
+import re
+from functools import lru_cache
+
+# Caracteres que Firebase no admite en una key, más el propio carácter de escape
+ESCAPED = ".$#[]/\\%" + "".join(chr(c) for c in range(32)) + chr(127)
+ESCAPES = {c: f"%{ord(c):02X}" for c in ESCAPED}
+ESCAPED_RE = re.compile("[" + re.escape(ESCAPED) + "]")
+UNESCAPE_RE = re.compile(r"%([0-9A-F]{2})")
+CACHE_SIZE = 65536
+# Versión de las keys guardadas en las cachés locales (PRAGMA user_version)
+KEY_SCHEME = 1
+
+# Esquema anterior: reemplazos encadenados, no reversibles
+LEGACY_TOKENS = (
+    ("\\", "_slash_"),
+    (".", "_dot_"),
+    ("#", "_hash_"),
+    ("$", "_dollar_"),
+    ("[", "_lbracket_"),
+    ("]", "_rbracket_"),
+    ("/", "_fwslash_"),
+)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def encode_key(name: str) -> str:
+    """
+    Key de Firebase para la ruta de un ejemplo
+
+    Cada carácter no permitido (y el propio %) se escribe como %XX, así que
+    dos rutas distintas nunca comparten key y decode_key() recupera la ruta
+    exacta. Se memoriza: la misma ruta se codifica en cada operación.
+    """
+    return ESCAPED_RE.sub(lambda m: ESCAPES[m.group()], name)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def decode_key(key: str) -> str:
+    """Ruta del ejemplo a partir de su key (inversa de encode_key)"""
+    if "%" not in key:
+        return key
+    return UNESCAPE_RE.sub(lambda m: chr(int(m.group(1), 16)), key)
+
+
+def is_encoded(key: str) -> bool:
+    """True si key tiene la forma que produce encode_key"""
+    return encode_key(decode_key(key)) == key
+
+
+def legacy_decode(key: str) -> str:
+    """
+    Ruta más probable de una key del esquema anterior
+
+    No es exacta: "a_dot_b" puede venir de "a.b" o de "a_dot_b"; por eso la
+    migración prefiere el original_path de los comentarios cuando lo hay.
+    """
+    for char, token in reversed(LEGACY_TOKENS):
+        key = key.replace(token, char)
+    return key
+
+
+def migrated_key(key: str, original_path=None):
+    """
+    Key nueva de una key existente, o None si ya está en el esquema actual
+
+    Args:
+        key: Key tal como está en /sofa_comments o en una caché local
+        original_path: Ruta guardada en uno de sus comentarios (opcional)
+    """
+    if isinstance(original_path, str) and original_path:
+        target = encode_key(original_path)
+    elif "%" in key and is_encoded(key):
+        return None
+    else:
+        target = encode_key(legacy_decode(key))
+    return target if target != key else None
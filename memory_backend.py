@@ -0,0 +1,340 @@
+import json
+import time
+import queue
+import sqlite3
+import threading
+from firebase_handler import CommentBackend
+from comment_cache import generate_push_id
+
+SERVER_TIMESTAMP = {'.sv': 'timestamp'}
+
+
+def _segments(path: str) -> tuple:
+    return tuple(s for s in (path or "/").split("/") if s)
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    return value
+
+
+def _order_key(value):
+    # Orden de Realtime Database: null, false, true, números, textos, objetos
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1 if not value else 2, 0)
+    if isinstance(value, (int, float)):
+        return (3, value)
+    if isinstance(value, str):
+        return (4, value)
+    return (5, 0)
+
+
+class Event:
+    def __init__(self, event_type: str, path: str, data):
+        """Evento del listener con los mismos atributos que firebase_admin.db.Event"""
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+
+class _Registration:
+    def __init__(self, database, segments, callback):
+        # Cada listener tiene su hilo, como los streams de firebase_admin
+        self.database = database
+        self.segments = segments
+        self.callback = callback
+        self._events = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def push(self, event: Event):
+        self._events.put(event)
+
+    def close(self):
+        self.database._unregister(self)
+        self._events.put(None)
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout=2)
+
+    def _run(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            try:
+                self.callback(event)
+            except Exception as e:
+                print(f"Error en listener de {'/'.join(self.segments)}: {e}")
+
+
+class MemoryQuery:
+    def __init__(self, reference, child_key: str):
+        self.reference = reference
+        self.child_key = child_key
+        self._start = None
+        self._end = None
+        self._limit = None
+
+    def start_at(self, value):
+        self._start = _order_key(value)
+        return self
+
+    def end_at(self, value):
+        self._end = _order_key(value)
+        return self
+
+    def equal_to(self, value):
+        self._start = self._end = _order_key(value)
+        return self
+
+    def limit_to_first(self, limit: int):
+        self._limit = (limit, True)
+        return self
+
+    def limit_to_last(self, limit: int):
+        self._limit = (limit, False)
+        return self
+
+    def get(self):
+        data = self.reference.get()
+        if not isinstance(data, dict):
+            return {}
+        items = []
+        for key, child in data.items():
+            order = _order_key(child.get(self.child_key) if isinstance(child, dict) else None)
+            if self._start is not None and order < self._start:
+                continue
+            if self._end is not None and order > self._end:
+                continue
+            items.append((order, key, child))
+        items.sort(key=lambda item: (item[0], item[1]))
+        if self._limit is not None:
+            limit, first = self._limit
+            items = items[:limit] if first else items[-limit:] if limit else []
+        return {key: child for _, key, child in items}
+
+
+class MemoryReference:
+    def __init__(self, database, segments: tuple):
+        """Referencia con el subconjunto de firebase_admin.db.Reference que usa CommentBackend"""
+        self.database = database
+        self.segments = segments
+
+    @property
+    def key(self):
+        return self.segments[-1] if self.segments else None
+
+    @property
+    def path(self):
+        return "/" + "/".join(self.segments)
+
+    def child(self, path: str):
+        return MemoryReference(self.database, self.segments + _segments(path))
+
+    def push(self, value=None):
+        ref = self.child(generate_push_id())
+        if value is not None:
+            ref.set(value)
+        return ref
+
+    def get(self, shallow: bool = False):
+        return self.database.get(self.segments, shallow)
+
+    def set(self, value) -> None:
+        self.database.write(self.segments, {(): value}, 'put')
+
+    def update(self, value: dict) -> None:
+        if not isinstance(value, dict) or not value:
+            raise ValueError("update() necesita un dict no vacío")
+        self.database.write(self.segments, {_segments(key): v for key, v in value.items()}, 'patch')
+
+    def delete(self) -> None:
+        self.set(None)
+
+    def order_by_child(self, key: str):
+        return MemoryQuery(self, key)
+
+    def listen(self, callback: callable):
+        return self.database.listen(self.segments, callback)
+
+
+class MemoryDatabase:
+    def __init__(self, db_file: str = None, latency: float = 0.0):
+        """
+        Realtime Database en memoria para pruebas y benchmarks sin red
+
+        Emula lo que usan los comentarios: push IDs, set/update multi-ruta,
+        borrado con None, timestamps de servidor ({'.sv': 'timestamp'}),
+        lecturas shallow, consultas ordenadas y listeners que reciben primero
+        un 'put' en / y después 'put'/'patch' con la ruta relativa, cada uno
+        en su propio hilo.
+
+        Args:
+            db_file: SQLite donde persistir los datos entre ejecuciones (opcional)
+            latency: Segundos de ida y vuelta simulados en cada lectura o escritura
+        """
+        self.db_file = db_file
+        self.latency = latency
+        self.reads = 0
+        self.writes = 0
+        self._root = {}
+        self._lock = threading.RLock()
+        self._registrations = []
+        self._last_timestamp = 0
+        self._conn = None
+        if db_file:
+            self._conn = sqlite3.connect(db_file, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS nodes (path TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            for path, data in self._conn.execute("SELECT path, data FROM nodes"):
+                self._put(_segments(path), json.loads(data))
+
+    def reference(self, path: str = "/") -> MemoryReference:
+        return MemoryReference(self, _segments(path))
+
+    def server_time(self) -> int:
+        """Milisegundos del 'servidor', nunca decrecientes"""
+        with self._lock:
+            self._last_timestamp = max(self._last_timestamp, int(time.time() * 1000))
+            return self._last_timestamp
+
+    def get(self, segments: tuple, shallow: bool = False):
+        self._simulate_latency()
+        with self._lock:
+            self.reads += 1
+            node = self._node(segments)
+            if shallow and isinstance(node, dict):
+                return {k: True if isinstance(v, dict) else v for k, v in node.items()}
+            return _copy(node)
+
+    def write(self, base: tuple, updates: dict, event_type: str) -> None:
+        """
+        Aplica una escritura y avisa a los listeners afectados
+
+        Args:
+            base: Segmentos de la referencia que escribe
+            updates: {segmentos relativos: valor}; () es la propia referencia
+            event_type: 'put' para set()/delete(), 'patch' para update()
+        """
+        self._simulate_latency()
+        with self._lock:
+            self.writes += 1
+            timestamp = self.server_time()
+            resolved = {base + rel: self._resolve(value, timestamp) for rel, value in updates.items()}
+            for full, value in resolved.items():
+                self._put(full, value)
+            self._persist(resolved)
+            for registration in self._registrations:
+                event = self._event_for(registration.segments, base, resolved, event_type)
+                if event is not None:
+                    registration.push(event)
+
+    def listen(self, segments: tuple, callback: callable) -> _Registration:
+        with self._lock:
+            registration = _Registration(self, segments, callback)
+            self._registrations.append(registration)
+            registration.push(Event('put', '/', _copy(self._node(segments))))
+        return registration
+
+    def _unregister(self, registration):
+        with self._lock:
+            if registration in self._registrations:
+                self._registrations.remove(registration)
+
+    def _simulate_latency(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _node(self, segments):
+        node = self._root
+        for segment in segments:
+            if not isinstance(node, dict) or segment not in node:
+                return None
+            node = node[segment]
+        return node
+
+    def _resolve(self, value, timestamp):
+        if isinstance(value, dict):
+            if value == SERVER_TIMESTAMP:
+                return timestamp
+            resolved = {k: self._resolve(v, timestamp) for k, v in value.items()}
+            # Como en el servidor, los hijos nulos no existen y un objeto vacío es null
+            resolved = {k: v for k, v in resolved.items() if v is not None}
+            return resolved or None
+        return value
+
+    def _put(self, segments, value):
+        if not segments:
+            self._root = value if isinstance(value, dict) else {}
+            return
+        parents = [self._root]
+        node = self._root
+        for segment in segments[:-1]:
+            child = node.get(segment)
+            if not isinstance(child, dict):
+                if value is None:
+                    return
+                child = node[segment] = {}
+            node = child
+            parents.append(node)
+        if value is None:
+            node.pop(segments[-1], None)
+            # Los nodos que se quedan vacíos desaparecen
+            for depth in range(len(segments) - 1, 0, -1):
+                if parents[depth]:
+                    break
+                parents[depth - 1].pop(segments[depth - 1], None)
+        else:
+            node[segments[-1]] = value
+
+    def _event_for(self, listened, base, resolved, event_type):
+        depth = len(listened)
+        inside = {}
+        for full, value in resolved.items():
+            if full[:depth] == listened and len(full) > depth:
+                inside[full[depth:]] = value
+            elif listened[:len(full)] == full:
+                # La escritura sustituye al nodo escuchado o a uno de sus padres
+                return Event('put', '/', _copy(self._node(listened)))
+        if not inside:
+            return None
+        if event_type == 'put':
+            (relative, value), = inside.items()
+            return Event('put', "/" + "/".join(relative), _copy(value))
+        # Un update() dentro del nodo escuchado llega en su ruta; uno más arriba, en /
+        prefix = base[depth:] if base[:depth] == listened else ()
+        data = {"/".join(rel[len(prefix):]): _copy(value) for rel, value in inside.items()}
+        return Event('patch', "/" + "/".join(prefix), data)
+
+    def _persist(self, resolved):
+        if self._conn is None:
+            return
+        # Se guarda por nodos de segundo nivel (/sofa_comments/<ejemplo>)
+        roots = {full[:2] for full in resolved}
+        rows = [("/".join(root), self._node(root)) for root in roots]
+        if any(len(root) < 2 for root in roots):
+            self._conn.execute("DELETE FROM nodes")
+            rows = [(f"{top}/{key}", value) for top, children in self._root.items() if isinstance(children, dict)
+                    for key, value in children.items()]
+        with self._conn:
+            for path, value in rows:
+                if value is None:
+                    self._conn.execute("DELETE FROM nodes WHERE path = ?", (path,))
+                else:
+                    self._conn.execute("INSERT OR REPLACE INTO nodes (path, data) VALUES (?, ?)",
+                                       (path, json.dumps(value)))
+
+
+class MemoryBackend(CommentBackend):
+    def __init__(self, database: MemoryDatabase = None):
+        """
+        Backend de comentarios sobre MemoryDatabase, con la misma lógica que FirebaseManager
+
+        Args:
+            database: Base de datos en memoria (por defecto, una nueva y vacía)
+        """
+        self.database = database or MemoryDatabase()
+        super().__init__(self.database.reference('/sofa_comments'), self.database.reference('/sofa_blobs'),
+                         self.database.reference('/sofa_activity'))
@@ -0,0 +1,251 @@
+import os
+import re
+import json
+import time
+import bisect
+import tempfile
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from collections import deque
+
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+MAX_ERRORS = 50
+METRICS_FILE = os.environ.get("SOFA_METRICS_FILE")
+PROFILE_FILE = os.environ.get("SOFA_PROFILE")
+
+
+class Histogram:
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        """Latencias en ms agrupadas en BUCKETS_MS (el último cubo es +Inf)"""
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms: float):
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def quantile(self, q: float) -> float:
+        """Cota superior del cubo donde cae el cuantil q (el máximo si es el último)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum_ms": round(self.total, 3),
+            "max_ms": round(self.max, 3),
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "buckets": dict(zip([str(b) for b in BUCKETS_MS] + ["+Inf"], self.buckets))
+        }
+
+
+class Metrics:
+    def __init__(self):
+        """
+        Contadores, gauges e histogramas de latencia de la aplicación
+
+        Pensado para los caminos calientes: cada medida es un perf_counter y
+        una actualización bajo lock, sin reservar memoria. Los gauges pueden
+        ser valores fijados o funciones que se evalúan solo al leer
+        (streams abiertos, colas), así que no cuestan nada mientras nadie
+        mira. Los errores se imprimen como antes y además se cuentan y se
+        guardan los últimos MAX_ERRORS para el panel de diagnóstico.
+        """
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._gauge_fns = {}
+        self._histograms = {}
+        self._errors = deque(maxlen=MAX_ERRORS)
+        self.started = time.time()
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def register_gauge(self, name: str, fn: callable) -> None:
+        """Gauge calculado al leer las métricas"""
+        with self._lock:
+            self._gauge_fns[name] = fn
+
+    def observe(self, name: str, ms: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(ms)
+
+    @contextmanager
+    def span(self, name: str):
+        """Mide el bloque with en el histograma name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def timed(self, name: str):
+        """Decorador: mide cada llamada en el histograma name"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, (time.perf_counter() - start) * 1000)
+            return wrapper
+        return decorator
+
+    def error(self, source: str, message: str) -> None:
+        """Imprime el error, lo cuenta en errors.<source> y lo guarda para el diagnóstico"""
+        print(message)
+        with self._lock:
+            key = f"errors.{source}"
+            self._counters[key] = self._counters.get(key, 0) + 1
+            self._errors.append((time.time(), source, message))
+
+    def errors(self) -> list:
+        """Últimos errores (timestamp, origen, mensaje), del más antiguo al más reciente"""
+        with self._lock:
+            return list(self._errors)
+
+    def reset(self) -> None:
+        """Pone a cero contadores, histogramas y errores (los gauges se conservan)"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._errors.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            gauge_fns = dict(self._gauge_fns)
+            histograms = {name: h.to_dict() for name, h in self._histograms.items()}
+            errors = [{"time": ts, "source": source, "message": message} for ts, source, message in self._errors]
+        # Fuera del lock: las funciones pueden tomar sus propios locks
+        for name, fn in gauge_fns.items():
+            try:
+                gauges[name] = fn()
+            except Exception:
+                gauges[name] = None
+        return {
+            "time": time.time(),
+            "uptime_s": round(time.time() - self.started, 1),
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+            "errors": errors
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2, ensure_ascii=False)
+
+    def to_prometheus(self) -> str:
+        """Formato de texto de Prometheus (prefijo sofa_, nombres con _ en lugar de .)"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = _prometheus_name(name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, value in sorted(snapshot["gauges"].items()):
+            if value is None:
+                continue
+            metric = _prometheus_name(name)
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        for name, histogram in sorted(snapshot["histograms"].items()):
+            metric = _prometheus_name(name) + "_ms"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in histogram["buckets"].items():
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [f"{metric}_sum {histogram['sum_ms']}", f"{metric}_count {histogram['count']}"]
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        """Escribe las métricas en JSON, o en texto de Prometheus si path acaba en .prom"""
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        directory = os.path.dirname(os.path.abspath(path))
+        tmp_file = None
+        try:
+            fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=".sofa_metrics", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_file, path)
+        except OSError as e:
+            print(f"Error guardando métricas: {e}")
+            if tmp_file and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+
+def _prometheus_name(name: str) -> str:
+    return "sofa_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+class SessionProfiler:
+    def __init__(self):
+        """
+        Captura opcional de cProfile
+
+        cProfile solo perfila el hilo que lo activa; se arranca desde el de
+        Tk, que es donde se dibuja y se despachan los eventos.
+        """
+        self._profile = None
+        self.started = None
+
+    @property
+    def running(self) -> bool:
+        return self._profile is not None
+
+    def start(self) -> None:
+        if self._profile is not None:
+            return
+        import cProfile
+        self._profile = cProfile.Profile()
+        self.started = time.time()
+        self._profile.enable()
+
+    def stop(self, path: str, top: int = 30) -> str:
+        """
+        Detiene la captura, guarda el .prof y devuelve las funciones más costosas
+
+        Args:
+            path: Archivo .prof (se abre con pstats o snakeviz)
+            top: Funciones del resumen, por tiempo acumulado
+        """
+        if self._profile is None:
+            return ""
+        import io
+        import pstats
+        profile, self._profile = self._profile, None
+        profile.disable()
+        profile.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(top)
+        return out.getvalue()
+
+
+METRICS = Metrics()
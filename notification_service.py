@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import queue
+import tempfile
+import threading
+from metrics import METRICS
+
+UNREAD_FILE = "sofa_unread.json"
+DIGEST_WINDOW = 10.0
+RATE_BURST = 3
+RATE_INTERVAL = 20.0
+SAVE_DELAY = 1.0
+PREVIEW_CHARS = 100
+
+
+def plyer_notify(title: str, message: str) -> None:
+    """Notificación del sistema con plyer"""
+    # Import diferido: plyer carga su backend de notificaciones al importarse
+    from plyer import notification
+    notification.notify(title=title, message=message, app_name="SOFA Manager", timeout=10)
+
+
+def format_digest(example_name: str, digest: dict) -> tuple:
+    """
+    Título y mensaje de la notificación de un resumen
+
+    Returns:
+        (título, mensaje)
+    """
+    name = os.path.basename(example_name.replace("\\", "/")) or example_name
+    user, text = digest["last"]
+    preview = text if len(text) <= PREVIEW_CHARS else text[:PREVIEW_CHARS] + "..."
+    if digest["count"] == 1:
+        return f"Nuevo comentario en {name}", f"{user}: {preview}"
+    users = ", ".join(digest["users"])
+    return f"{digest['count']} notas nuevas en {name}", f"De {users}. Última de {user}: {preview}"
+
+
+class NotificationService:
+    def __init__(self, current_user: str, on_unread_change: callable = None, notify: callable = plyer_notify,
+                 unread_file: str = UNREAD_FILE, window: float = DIGEST_WINDOW,
+                 burst: int = RATE_BURST, interval: float = RATE_INTERVAL):
+        """
+        Agrupa y limita las notificaciones de comentarios nuevos en un hilo propio
+
+        submit() solo encola el evento, así que el listener de Firebase no
+        espera nunca a la notificación del sistema. El hilo de trabajo:
+
+        - descarta los comentarios del propio usuario (el eco de sus escrituras)
+        - cuenta cada comentario como no leído en su ejemplo (persistido en
+          disco), salvo en el ejemplo abierto, cuyas notas ya están a la vista
+        - junta los comentarios de un ejemplo durante window segundos en un
+          único aviso ("5 notas nuevas en X")
+        - limita los avisos con un token bucket: burst seguidos y luego uno
+          cada interval segundos; los resúmenes que esperan siguen acumulando
+
+        Args:
+            current_user: Usuario cuyos comentarios no se notifican
+            on_unread_change: Recibe {ejemplo: no leídos} desde el hilo de trabajo (opcional)
+            notify: Función (título, mensaje) que muestra la notificación
+            unread_file: JSON donde se guardan los no leídos
+            window: Segundos que se agrupan los comentarios de un ejemplo
+            burst: Avisos seguidos permitidos
+            interval: Segundos para recuperar un aviso
+        """
+        self.current_user = current_user
+        self.on_unread_change = on_unread_change
+        self.notify = notify
+        self.unread_file = unread_file
+        self.window = window
+        self.burst = burst
+        self.interval = interval
+        self.enabled = True
+        self.sent = 0
+        self.suppressed = 0
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._digests = {}
+        self._open_example = None
+        self._lock = threading.Lock()
+        self._unread = self._load_unread()
+        self._save_at = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, example_name: str, user: str, text: str) -> None:
+        """Encola un comentario nuevo; se puede llamar desde cualquier hilo"""
+        self._queue.put(("comment", (example_name, user, text or "")))
+
+    def set_enabled(self, enabled: bool) -> None:
+        """Sin notificaciones se siguen contando los no leídos"""
+        self.enabled = enabled
+
+    def set_open_example(self, example_name: str = None) -> None:
+        """Ejemplo que se está viendo: sus notas nuevas no cuentan como no leídas"""
+        self._queue.put(("open", example_name))
+
+    def mark_read(self, example_name: str = None) -> None:
+        """Marca como leído un ejemplo, o todos si no se indica"""
+        self._queue.put(("read", example_name))
+
+    def unread(self, example_name: str = None) -> int:
+        """No leídos de un ejemplo, o el total"""
+        with self._lock:
+            if example_name is None:
+                return sum(self._unread.values())
+            return self._unread.get(example_name, 0)
+
+    def unread_counts(self) -> dict:
+        with self._lock:
+            return dict(self._unread)
+
+    def stop(self) -> None:
+        """Guarda los no leídos y detiene el hilo"""
+        self._queue.put(("stop", None))
+        self._thread.join(timeout=2)
+
+    def _load_unread(self) -> dict:
+        try:
+            with open(self.unread_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return {name: int(count) for name, count in data.items() if int(count) > 0}
+        except (OSError, ValueError, TypeError, AttributeError):
+            return {}
+
+    def _save_unread(self):
+        self._save_at = None
+        with self._lock:
+            data = dict(self._unread)
+        tmp_file = None
+        try:
+            directory = os.path.dirname(os.path.abspath(self.unread_file))
+            fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=".sofa_unread", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_file, self.unread_file)
+        except OSError as e:
+            METRICS.error("notifications", f"Error guardando no leídos: {e}")
+            if tmp_file and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def _unread_changed(self):
+        if self._save_at is None:
+            self._save_at = time.monotonic() + SAVE_DELAY
+        if self.on_unread_change:
+            self.on_unread_change(self.unread_counts())
+
+    def _next_deadline(self):
+        deadlines = [digest["due"] for digest in self._digests.values()]
+        if self._save_at is not None:
+            deadlines.append(self._save_at)
+        return min(deadlines) if deadlines else None
+
+    def _run(self):
+        while True:
+            deadline = self._next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                kind, payload = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                kind, payload = None, None
+
+            if kind == "stop":
+                if self._save_at is not None:
+                    self._save_unread()
+                return
+            if kind == "comment":
+                self._add_comment(*payload)
+            elif kind == "read":
+                self._mark_read(payload)
+            elif kind == "open":
+                self._open_example = payload
+
+            now = time.monotonic()
+            for example_name in [name for name, digest in self._digests.items() if digest["due"] <= now]:
+                self._send(example_name, now)
+            if self._save_at is not None and self._save_at <= now:
+                self._save_unread()
+
+    def _add_comment(self, example_name, user, text):
+        if user == self.current_user:
+            self.suppressed += 1
+            return
+        if example_name != self._open_example:
+            with self._lock:
+                self._unread[example_name] = self._unread.get(example_name, 0) + 1
+            self._unread_changed()
+        if not self.enabled:
+            return
+        digest = self._digests.get(example_name)
+        if digest is None:
+            digest = self._digests[example_name] = {
+                "count": 0, "users": [], "last": None, "due": time.monotonic() + self.window
+            }
+        digest["count"] += 1
+        digest["last"] = (user, text)
+        if user not in digest["users"]:
+            digest["users"].append(user)
+
+    def _mark_read(self, example_name):
+        with self._lock:
+            if example_name is None:
+                changed = bool(self._unread)
+                self._unread.clear()
+            else:
+                changed = self._unread.pop(example_name, 0) > 0
+        # Lo que ya se ha visto no necesita aviso
+        if example_name is None:
+            self._digests.clear()
+        else:
+            self._digests.pop(example_name, None)
+        if changed:
+            self._unread_changed()
+
+    def _send(self, example_name, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) / self.interval)
+        self._refilled = now
+        digest = self._digests[example_name]
+        if self._tokens < 1:
+            # Sin cupo: el resumen espera al siguiente aviso disponible y sigue sumando
+            digest["due"] = now + (1 - self._tokens) * self.interval
+            return
+        self._tokens -= 1
+        del self._digests[example_name]
+        if not self.enabled:
+            return
+        title, message = format_digest(example_name, digest)
+        try:
+            self.notify(title, message)
+            self.sent += 1
+        except Exception as e:
+            METRICS.error("notifications", f"Error mostrando notificación: {e}")
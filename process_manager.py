@@ -0,0 +1,295 @@
+import os
+import time
+import threading
+import itertools
+import subprocess
+from collections import deque
+from metrics import METRICS
+
+MAX_CONCURRENT = 2
+OUTPUT_LINES = 2000
+MAX_FINISHED = 20
+# Estados que ocupan una plaza: "iniciando" dura lo que tarda Popen en volver
+RUNNING_STATES = ("iniciando", "ejecutando")
+
+
+class SimulationProcess:
+    def __init__(self, run_id: int, scene: str, command: list, output_lines: int = OUTPUT_LINES):
+        """
+        Una ejecución de runSofa, en cola, en marcha o terminada
+
+        Args:
+            run_id: Identificador de la ejecución dentro del gestor
+            scene: Ruta de la escena
+            command: Comando completo a lanzar
+            output_lines: Tamaño del buffer circular de salida
+        """
+        self.run_id = run_id
+        self.scene = scene
+        self.command = command
+        self.state = "en cola"
+        self.popen = None
+        self.pid = None
+        self.queued_at = time.time()
+        self.started = None
+        self.ended = None
+        self.returncode = None
+        self.error = None
+        self.stop_requested = False
+        self.output = deque(maxlen=output_lines)
+        self.line_count = 0
+        self._lock = threading.Lock()
+        self._stats = None
+
+    @property
+    def active(self) -> bool:
+        return self.state == "en cola" or self.state in RUNNING_STATES
+
+    def uptime(self) -> float:
+        """Segundos en ejecución (hasta el final si ya terminó)"""
+        if self.started is None:
+            return 0.0
+        return (self.ended or time.time()) - self.started
+
+    def append_output(self, line: str) -> None:
+        with self._lock:
+            self.output.append(line)
+            self.line_count += 1
+
+    def output_since(self, line_count: int):
+        """
+        Líneas de salida nuevas desde line_count
+
+        Returns:
+            (líneas, total actual, si se han perdido líneas del buffer y hay
+            que redibujar desde el principio)
+        """
+        with self._lock:
+            new = self.line_count - line_count
+            if new < 0 or new > len(self.output):
+                return list(self.output), self.line_count, True
+            return list(self.output)[len(self.output) - new:], self.line_count, False
+
+    def resource_usage(self):
+        """
+        (CPU %, RSS en bytes) del proceso, o (None, None) si no está en
+        marcha o psutil no está instalado
+        """
+        if self.state != "ejecutando":
+            return None, None
+        try:
+            if self._stats is None:
+                import psutil
+                self._stats = psutil.Process(self.pid)
+                # La primera medida de cpu_percent siempre es 0: sirve de referencia
+                self._stats.cpu_percent(None)
+            return self._stats.cpu_percent(None), self._stats.memory_info().rss
+        except Exception:
+            return None, None
+
+
+class ProcessManager:
+    def __init__(self, executable: str, max_concurrent: int = MAX_CONCURRENT,
+                 output_lines: int = OUTPUT_LINES, on_change: callable = None):
+        """
+        Lanza runSofa con un límite de instancias simultáneas
+
+        Las escenas que superan el límite esperan en cola y arrancan cuando
+        termina otra. Relanzar una escena en marcha o en cola devuelve la
+        ejecución existente. La salida (stdout y stderr) de cada proceso se
+        lee en un hilo propio y se guarda en un buffer circular.
+
+        Args:
+            executable: Ruta de runSofa
+            max_concurrent: Máximo de simulaciones a la vez
+            output_lines: Líneas de salida que se conservan por proceso
+            on_change: Función sin argumentos llamada (desde cualquier hilo)
+                cuando una ejecución cambia de estado
+        """
+        self.executable = executable
+        self.max_concurrent = max(1, max_concurrent)
+        self.output_lines = output_lines
+        self.on_change = on_change
+        self._processes = []
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def launch(self, scene: str):
+        """
+        Lanza o encola una escena
+
+        Args:
+            scene: Ruta de la escena
+
+        Returns:
+            (SimulationProcess, nueva) donde nueva es False si la escena ya
+            estaba en marcha o en cola
+        """
+        key = os.path.normcase(os.path.abspath(scene))
+        with self._lock:
+            for process in self._processes:
+                if process.active and os.path.normcase(os.path.abspath(process.scene)) == key:
+                    return process, False
+            process = SimulationProcess(next(self._ids), scene, [self.executable, scene], self.output_lines)
+            self._processes.append(process)
+            self._queue.append(process)
+            self._prune_locked()
+            to_start = self._take_startable_locked()
+        self._start_all(to_start)
+        self._notify()
+        return process, True
+
+    def set_max_concurrent(self, value: int) -> None:
+        """Cambia el límite y arranca lo que quepa de la cola"""
+        with self._lock:
+            self.max_concurrent = max(1, int(value))
+            to_start = self._take_startable_locked()
+        self._start_all(to_start)
+        self._notify()
+
+    def stop(self, run_id: int) -> None:
+        """Detiene una simulación en marcha o la saca de la cola"""
+        with self._lock:
+            process = self._find_locked(run_id)
+            if process is None:
+                return
+            if process.state == "en cola":
+                self._queue.remove(process)
+                process.state = "cancelado"
+                process.ended = time.time()
+                popen = None
+            elif process.state == "iniciando":
+                # Aún no hay Popen: _start_all lo detiene en cuanto exista
+                process.stop_requested = True
+                popen = None
+            else:
+                popen = process.popen if process.state == "ejecutando" else None
+                process.stop_requested = popen is not None
+        if popen is not None:
+            try:
+                popen.terminate()
+            except OSError as e:
+                METRICS.error("process.stop", f"Error deteniendo {process.scene}: {e}")
+        self._notify()
+
+    def stop_all(self) -> None:
+        """Vacía la cola y detiene todas las simulaciones"""
+        with self._lock:
+            # La cola se vacía antes de detener nada para que no arranque lo siguiente
+            while self._queue:
+                process = self._queue.popleft()
+                process.state = "cancelado"
+                process.ended = time.time()
+            running = [p.run_id for p in self._processes if p.state in RUNNING_STATES]
+        for run_id in running:
+            self.stop(run_id)
+
+    def clear_finished(self) -> None:
+        """Olvida las ejecuciones terminadas"""
+        with self._lock:
+            self._processes = [p for p in self._processes if p.active]
+        self._notify()
+
+    def processes(self) -> list:
+        """Copia de la lista de ejecuciones, de la más antigua a la más reciente"""
+        with self._lock:
+            return list(self._processes)
+
+    def get(self, run_id: int):
+        with self._lock:
+            return self._find_locked(run_id)
+
+    def running_count(self) -> int:
+        with self._lock:
+            return sum(1 for p in self._processes if p.state in RUNNING_STATES)
+
+    def queued_count(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+    def _find_locked(self, run_id):
+        for process in self._processes:
+            if process.run_id == run_id:
+                return process
+        return None
+
+    def _take_startable_locked(self) -> list:
+        running = sum(1 for p in self._processes if p.state in RUNNING_STATES)
+        to_start = []
+        while self._queue and running < self.max_concurrent:
+            process = self._queue.popleft()
+            # Ocupa ya su plaza para que otra llamada no supere el límite
+            process.state = "iniciando"
+            process.started = time.time()
+            to_start.append(process)
+            running += 1
+        return to_start
+
+    def _prune_locked(self):
+        finished = [p for p in self._processes if not p.active]
+        for process in finished[:max(0, len(finished) - MAX_FINISHED)]:
+            self._processes.remove(process)
+
+    def _start_all(self, processes):
+        for process in processes:
+            METRICS.observe("process.queue_wait", (process.started - process.queued_at) * 1000)
+            start = time.perf_counter()
+            try:
+                popen = subprocess.Popen(
+                    process.command,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    stdin=subprocess.DEVNULL,
+                    text=True,
+                    errors="replace",
+                    bufsize=1
+                )
+            except Exception as e:
+                METRICS.error("process.launch", f"Error lanzando {process.scene}: {e}")
+                process.error = str(e)
+                process.append_output(f"Error lanzando el proceso: {e}")
+                self._finish(process, "error")
+                continue
+            METRICS.observe("process.spawn", (time.perf_counter() - start) * 1000)
+            METRICS.increment("process.launched")
+            with self._lock:
+                process.popen = popen
+                process.pid = popen.pid
+                process.state = "ejecutando"
+                stop_requested = process.stop_requested
+            if stop_requested:
+                # stop() llegó mientras arrancaba
+                try:
+                    popen.terminate()
+                except OSError as e:
+                    METRICS.error("process.stop", f"Error deteniendo {process.scene}: {e}")
+            threading.Thread(target=self._read_output, args=(process,), daemon=True).start()
+            self._notify()
+
+    def _read_output(self, process):
+        # readline bloquea en este hilo, nunca en el de Tk
+        for line in process.popen.stdout:
+            process.append_output(line.rstrip("\r\n"))
+        process.popen.stdout.close()
+        process.returncode = process.popen.wait()
+        METRICS.observe("process.runtime", (time.time() - process.started) * 1000)
+        if process.stop_requested:
+            self._finish(process, "detenido")
+            return
+        if process.returncode != 0:
+            METRICS.error("process.exit", f"runSofa terminó con código {process.returncode}: {process.scene}")
+        self._finish(process, "terminado" if process.returncode == 0 else "error")
+
+    def _finish(self, process, state):
+        with self._lock:
+            process.state = state
+            process.ended = time.time()
+            self._prune_locked()
+            to_start = self._take_startable_locked()
+        self._start_all(to_start)
+        self._notify()
+
+    def _notify(self):
+        if self.on_change:
+            self.on_change()
@@ -0,0 +1,263 @@
+import os
+import ast
+import json
+import sqlite3
+import threading
+import xml.etree.ElementTree as ET
+from collections import Counter
+from metrics import METRICS
+
+METADATA_FILE = "sofa_scene_metadata.db"
+MESH_EXTENSIONS = ('.obj', '.vtk', '.vtu', '.msh', '.gmsh', '.stl', '.mesh', '.off', '.ply', '.sph', '.topology')
+# Un .py mayor que esto no se parsea: el AST necesita el archivo entero en memoria
+MAX_PY_BYTES = 2 * 1024 * 1024
+CANCEL_CHECK_EVENTS = 500
+
+
+class AnalysisCancelled(Exception):
+    pass
+
+
+def _empty_metadata(kind: str, size: int) -> dict:
+    return {
+        "type": kind,
+        "size": size,
+        "nodes": 0,
+        "max_depth": 0,
+        "components": {},
+        "component_total": 0,
+        "solvers": [],
+        "meshes": [],
+        "plugins": [],
+        "error": None
+    }
+
+
+def _add_component(metadata: dict, counts: Counter, component: str, values) -> None:
+    counts[component] += 1
+    if "Solver" in component and component not in metadata["solvers"]:
+        metadata["solvers"].append(component)
+    for value in values:
+        if not isinstance(value, str):
+            continue
+        if component == "RequiredPlugin":
+            for plugin in value.replace(",", " ").split():
+                if plugin not in metadata["plugins"]:
+                    metadata["plugins"].append(plugin)
+        elif value.lower().endswith(MESH_EXTENSIONS) and value not in metadata["meshes"]:
+            metadata["meshes"].append(value)
+
+
+def analyze_xml(path: str, cancelled: callable = None) -> dict:
+    """
+    Analiza una escena .scn/.xml en streaming con iterparse
+
+    Cada elemento se descarta al cerrarse, así que la memoria depende de la
+    profundidad del árbol y no del tamaño del archivo.
+
+    Args:
+        path: Ruta de la escena
+        cancelled: Función sin argumentos que devuelve True para abortar (opcional)
+
+    Returns:
+        Metadatos de la escena; si el XML está mal formado incluyen lo leído
+        hasta el error y el mensaje en 'error'
+    """
+    metadata = _empty_metadata("xml", os.path.getsize(path))
+    counts = Counter()
+    stack = []
+    depth = 0
+    try:
+        for index, (event, element) in enumerate(ET.iterparse(path, events=("start", "end"))):
+            if cancelled and index % CANCEL_CHECK_EVENTS == 0 and cancelled():
+                raise AnalysisCancelled()
+            if event == "start":
+                stack.append(element)
+                if element.tag == "Node":
+                    depth += 1
+                    metadata["nodes"] += 1
+                    metadata["max_depth"] = max(metadata["max_depth"], depth)
+                else:
+                    values = list(element.attrib.values())
+                    if element.tag == "RequiredPlugin":
+                        values = [element.get("pluginName") or element.get("name") or ""]
+                    _add_component(metadata, counts, element.tag, values)
+            else:
+                stack.pop()
+                if element.tag == "Node":
+                    depth -= 1
+                element.clear()
+                if stack:
+                    stack[-1].remove(element)
+    except ET.ParseError as e:
+        metadata["error"] = f"XML no válido: {e}"
+    metadata["components"] = dict(counts.most_common())
+    metadata["component_total"] = sum(counts.values())
+    return metadata
+
+
+def analyze_python(path: str) -> dict:
+    """
+    Inspección ligera del AST de una escena .py
+
+    Cuenta las llamadas addObject/createObject (componentes) y
+    addChild/createChild (nodos). La profundidad se deduce de las
+    asignaciones child = parent.addChild(...), partiendo del nodo raíz.
+
+    Args:
+        path: Ruta de la escena
+
+    Returns:
+        Metadatos de la escena
+    """
+    size = os.path.getsize(path)
+    metadata = _empty_metadata("python", size)
+    if size > MAX_PY_BYTES:
+        metadata["error"] = "Archivo demasiado grande para analizarlo"
+        return metadata
+    try:
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), filename=path)
+    except (SyntaxError, ValueError) as e:
+        metadata["error"] = f"Python no válido: {e}"
+        return metadata
+
+    counts = Counter()
+    depths = {}
+    metadata["nodes"] = 1
+    metadata["max_depth"] = 1
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Call):
+            call = node.value
+            if (isinstance(call.func, ast.Attribute) and call.func.attr in ("addChild", "createChild")
+                    and isinstance(call.func.value, ast.Name)):
+                depth = depths.get(call.func.value.id, 1) + 1
+                for target in node.targets:
+                    if isinstance(target, ast.Name):
+                        depths[target.id] = depth
+                metadata["max_depth"] = max(metadata["max_depth"], depth)
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+            continue
+        if node.func.attr in ("addChild", "createChild"):
+            metadata["nodes"] += 1
+        elif node.func.attr in ("addObject", "createObject") and node.args:
+            first = node.args[0]
+            if isinstance(first, ast.Constant) and isinstance(first.value, str):
+                values = [kw.value.value for kw in node.keywords
+                          if isinstance(kw.value, ast.Constant)]
+                if first.value == "RequiredPlugin":
+                    values = [kw.value.value for kw in node.keywords
+                              if kw.arg in ("pluginName", "name") and isinstance(kw.value, ast.Constant)][:1]
+                _add_component(metadata, counts, first.value, values)
+    metadata["components"] = dict(counts.most_common())
+    metadata["component_total"] = sum(counts.values())
+    return metadata
+
+
+def analyze_scene(path: str, cancelled: callable = None) -> dict:
+    """Analiza una escena según su extensión"""
+    if path.lower().endswith(".py"):
+        return analyze_python(path)
+    return analyze_xml(path, cancelled)
+
+
+class SceneMetadataCache:
+    def __init__(self, db_file: str = METADATA_FILE):
+        """
+        Caché SQLite de metadatos de escenas por ruta
+
+        Una entrada solo es válida si el mtime y el tamaño del archivo
+        coinciden con los del momento del análisis.
+
+        Args:
+            db_file: Ruta del archivo SQLite
+        """
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS scene_metadata (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                data TEXT NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, path: str, mtime: float, size: int):
+        """Metadatos guardados si siguen vigentes, o None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT data FROM scene_metadata WHERE path = ? AND mtime = ? AND size = ?",
+                (path, mtime, size)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, path: str, mtime: float, size: int, metadata: dict) -> None:
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO scene_metadata (path, mtime, size, data) VALUES (?, ?, ?, ?)",
+                (path, mtime, size, json.dumps(metadata))
+            )
+            self.conn.commit()
+
+
+class SceneAnalyzer:
+    def __init__(self, cache: SceneMetadataCache, on_result: callable):
+        """
+        Analiza escenas en un hilo de fondo, atendiendo solo la última petición
+
+        Si llega una petición nueva mientras se analiza un XML grande, el
+        análisis en curso se abandona: solo interesa la escena seleccionada.
+
+        Args:
+            cache: Caché de metadatos
+            on_result: Recibe (ruta, metadatos) desde el hilo de fondo;
+                metadatos es None si el archivo no se pudo leer
+        """
+        self.cache = cache
+        self.on_result = on_result
+        self._pending = None
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def request(self, path: str) -> None:
+        """Pide el análisis de una escena; no toca el disco en el hilo que llama"""
+        with self._condition:
+            self._pending = path
+            self._condition.notify()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _has_newer(self) -> bool:
+        return self._pending is not None or self._stopped
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                path, self._pending = self._pending, None
+            try:
+                self.on_result(path, self._analyze(path))
+            except AnalysisCancelled:
+                continue
+            except Exception as e:
+                METRICS.error("scene_analyzer", f"Error analizando {path}: {e}")
+                self.on_result(path, None)
+
+    def _analyze(self, path):
+        stat = os.stat(path)
+        metadata = self.cache.get(path, stat.st_mtime, stat.st_size)
+        if metadata is None:
+            metadata = analyze_scene(path, cancelled=self._has_newer)
+            self.cache.put(path, stat.st_mtime, stat.st_size, metadata)
+        return metadata
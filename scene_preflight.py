@@ -0,0 +1,463 @@
+import os
+import re
+import ast
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import importlib.util
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from metrics import METRICS
+
+PREFLIGHT_FILE = "sofa_scene_preflight.db"
+STAT_WORKERS = 16
+# Con pocas rutas, repartirlas entre hilos cuesta más que hacer los stat seguidos
+STAT_BATCH = 32
+# Atributos de componentes que apuntan a archivos (en minúsculas)
+FILE_ATTRIBUTES = {"filename", "filemesh", "filetopology", "texturename", "texturefilename", "filenametexture"}
+# Módulos que solo existen en el Python de SOFA: no se avisa si aquí no se encuentran
+SOFA_MODULES = {"Sofa", "SofaRuntime", "SofaTypes", "SofaPython3", "SofaExporter", "SofaImGui",
+                "splib", "splib3", "stlib", "stlib3", "softrobots"}
+# Componentes cuyo filename es un archivo de salida
+OUTPUT_COMPONENTS = {"WriteState", "WriteTopology", "Monitor", "ExtraMonitor"}
+PLUGIN_FILE_RE = re.compile(r"^(?:lib)?(.+?)(?:_d)?\.(?:dll|so|dylib)(?:\.[\d.]+)?$", re.IGNORECASE)
+PLUGIN_SCAN_DEPTH = 3
+MAX_PY_BYTES = 2 * 1024 * 1024
+
+
+def _is_checkable(value: str) -> bool:
+    # Rutas con variables o plantillas se resuelven dentro de SOFA
+    return bool(value) and "$" not in value and "{" not in value
+
+
+def _writes_file(component: str) -> bool:
+    return component.endswith("Exporter") or component in OUTPUT_COMPONENTS
+
+
+def _plugin_names(value) -> list:
+    if isinstance(value, (list, tuple)):
+        return [name for item in value for name in _plugin_names(item)]
+    return value.replace(",", " ").split() if isinstance(value, str) else []
+
+
+def references_xml(path: str):
+    """
+    Archivos y plugins que cita una escena XML, en streaming con iterparse
+
+    Returns:
+        (lista de (tipo, valor), plugins, error o None); tipo es "file" o "include"
+    """
+    refs = []
+    plugins = []
+    stack = []
+    try:
+        for event, element in ET.iterparse(path, events=("start", "end")):
+            if event == "start":
+                stack.append(element)
+                if element.tag == "include":
+                    refs.append(("include", element.get("href", "")))
+                elif element.tag == "RequiredPlugin":
+                    plugins += _plugin_names(element.get("pluginName") or element.get("name"))
+                elif not _writes_file(element.tag):
+                    refs += [("file", value) for name, value in element.attrib.items()
+                             if name.lower() in FILE_ATTRIBUTES]
+            else:
+                stack.pop()
+                element.clear()
+                if stack:
+                    stack[-1].remove(element)
+    except ET.ParseError as e:
+        return refs, plugins, f"XML no válido: {e}"
+    return refs, plugins, None
+
+
+def references_python(path: str):
+    """
+    Archivos, módulos importados y plugins que cita una escena .py
+
+    Solo cuentan los valores literales: los argumentos de addObject con
+    nombre de archivo (filename=, fileMesh=...) y los import.
+
+    Returns:
+        (lista de (tipo, valor), plugins, error o None); tipo es "file" o "module"
+    """
+    if os.path.getsize(path) > MAX_PY_BYTES:
+        return [], [], None
+    try:
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), filename=path)
+    except (SyntaxError, ValueError) as e:
+        return [], [], f"Python no válido: {e}"
+    refs = []
+    plugins = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            refs += [("module", (alias.name, 0)) for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            if node.module:
+                refs.append(("module", (node.module, node.level)))
+            else:
+                # from . import x: cada nombre puede ser un módulo del paquete
+                refs += [("module", (alias.name, node.level)) for alias in node.names]
+        elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+              and node.func.attr in ("addObject", "createObject") and node.args
+              and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)
+              and not _writes_file(node.args[0].value)):
+            for keyword in node.keywords:
+                if keyword.arg is None:
+                    continue
+                try:
+                    value = ast.literal_eval(keyword.value)
+                except (ValueError, TypeError, SyntaxError):
+                    continue
+                if node.args[0].value == "RequiredPlugin" and keyword.arg in ("pluginName", "name"):
+                    plugins += _plugin_names(value)
+                elif keyword.arg.lower() in FILE_ATTRIBUTES and isinstance(value, str):
+                    refs.append(("file", value))
+    return refs, plugins, None
+
+
+def scene_references(path: str):
+    """Referencias de una escena o de un archivo incluido, según su extensión"""
+    if path.lower().endswith(".py"):
+        return references_python(path)
+    return references_xml(path)
+
+
+@lru_cache(maxsize=None)
+def _importable(name: str) -> bool:
+    if name in sys.builtin_module_names or name in getattr(sys, "stdlib_module_names", ()):
+        return True
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _stat_mtime(path: str):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def default_search_paths(examples_dir: str) -> list:
+    """Carpetas donde SOFA busca las rutas relativas: ejemplos y share/sofa"""
+    return [examples_dir, os.path.dirname(os.path.normpath(examples_dir))]
+
+
+def default_plugin_dirs(executable: str) -> list:
+    """Carpetas con las librerías de plugins junto a runSofa"""
+    bin_dir = os.path.dirname(executable)
+    return [bin_dir, os.path.join(bin_dir, os.pardir, "lib"), os.path.join(bin_dir, os.pardir, "plugins")]
+
+
+class PreflightCache:
+    def __init__(self, db_file: str = PREFLIGHT_FILE):
+        """
+        Caché SQLite de comprobaciones por escena
+
+        Cada entrada guarda el mtime y el tamaño de la escena y el mtime de
+        todas las rutas que se miraron (None si no existían). Sigue valiendo
+        mientras ninguna cambie: editar una malla, borrarla o crear la que
+        faltaba invalida la entrada.
+
+        Args:
+            db_file: Ruta del archivo SQLite
+        """
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS scene_preflight (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                probes TEXT NOT NULL,
+                data TEXT NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, path: str, mtime: float, size: int):
+        """(sondas, resultado) guardados para esta versión de la escena, o None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT probes, data FROM scene_preflight WHERE path = ? AND mtime = ? AND size = ?",
+                (path, mtime, size)
+            ).fetchone()
+        return (json.loads(row[0]), json.loads(row[1])) if row else None
+
+    def put(self, path: str, mtime: float, size: int, probes: dict, data: dict) -> None:
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO scene_preflight (path, mtime, size, probes, data) VALUES (?, ?, ?, ?, ?)",
+                (path, mtime, size, json.dumps(probes), json.dumps(data))
+            )
+            self.conn.commit()
+
+
+class ScenePreflight:
+    def __init__(self, cache: PreflightCache, search_paths: list, plugin_dirs: list = None,
+                 workers: int = STAT_WORKERS):
+        """
+        Comprueba antes de lanzar runSofa que existen los archivos de una escena
+
+        Se leen las referencias de la escena (atributos filename/fileMesh/
+        texturename..., <include href>, import de módulos locales en las
+        escenas .py y RequiredPlugin) y se buscan todas a la vez en un pool
+        de stat (en tramos, para que las escenas pequeñas no paguen el reparto
+        entre hilos): primero junto al archivo que las cita y después en
+        search_paths, como hace SOFA. Los includes se comprueban a su vez.
+        check() se puede llamar desde varios hilos.
+
+        Args:
+            cache: Caché de resultados
+            search_paths: Carpetas donde buscar las rutas relativas
+            plugin_dirs: Carpetas con las librerías de plugins; si no existe
+                ninguna, los plugins no se comprueban (opcional)
+            workers: Hilos del pool de stat
+        """
+        self.cache = cache
+        self.search_paths = [p for p in search_paths if p]
+        self.plugin_dirs = plugin_dirs or []
+        self._stat_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preflight-stat")
+        self._runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preflight")
+        self._plugins = None
+        self._plugins_lock = threading.Lock()
+
+    def submit(self, path: str, callback: callable) -> None:
+        """Comprueba la escena en segundo plano; callback recibe (ruta, resultado o None)"""
+        def run():
+            try:
+                result = self.check(path)
+            except Exception as e:
+                METRICS.error("preflight", f"Error comprobando {path}: {e}")
+                result = None
+            callback(path, result)
+
+        self._runner.submit(run)
+
+    def shutdown(self) -> None:
+        self._runner.shutdown(wait=False, cancel_futures=True)
+        self._stat_pool.shutdown(wait=False, cancel_futures=True)
+
+    def check(self, path: str) -> dict:
+        """
+        Comprueba una escena, usando la caché si nada ha cambiado
+
+        Returns:
+            Dict con scene, ok, missing (lista de {kind, ref, source}),
+            plugins (plugins que no se encuentran), warnings, error,
+            dependencies (archivos encontrados), cached y ms
+        """
+        start = time.perf_counter()
+        with METRICS.span("preflight.check"):
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                return self._finish({"scene": path, "missing": [], "required_plugins": [], "warnings": [],
+                                     "error": f"No se encontró la escena: {e}", "dependencies": 0}, False, start)
+            entry = self.cache.get(path, stat.st_mtime, stat.st_size)
+            if entry is not None and self._unchanged(entry[0]):
+                METRICS.increment("preflight.cache_hits")
+                return self._finish(entry[1], True, start)
+            probes, data = self._scan(path)
+            self.cache.put(path, stat.st_mtime, stat.st_size, probes, data)
+            return self._finish(data, False, start)
+
+    def _finish(self, data, cached, start):
+        result = dict(data)
+        # Los plugins se miran siempre: instalar uno no cambia ningún mtime de la escena
+        result["plugins"] = self.missing_plugins(data["required_plugins"])
+        result["ok"] = not (result["missing"] or result["plugins"] or result["error"])
+        result["cached"] = cached
+        result["ms"] = round((time.perf_counter() - start) * 1000, 2)
+        if not result["ok"]:
+            METRICS.increment("preflight.broken")
+        return result
+
+    def _map(self, fn, items):
+        # Tramos de STAT_BATCH elementos: uno solo se hace en este hilo
+        chunks = [items[i:i + STAT_BATCH] for i in range(0, len(items), STAT_BATCH)]
+        if len(chunks) <= 1:
+            return [fn(item) for item in items]
+        results = self._stat_pool.map(lambda chunk: [fn(item) for item in chunk], chunks)
+        return [result for chunk in results for result in chunk]
+
+    def _unchanged(self, probes):
+        paths = list(probes)
+        return all(mtime == probes[p] for p, mtime in zip(paths, self._map(_stat_mtime, paths)))
+
+    def _scan(self, scene):
+        probes = {}
+        missing = []
+        warnings = []
+        plugins = []
+        error = None
+        found = 0
+        parsed = set()
+        pending = [scene]
+        while pending:
+            source = os.path.normpath(pending.pop())
+            if source in parsed:
+                continue
+            parsed.add(source)
+            try:
+                refs, source_plugins, source_error = scene_references(source)
+            except OSError as e:
+                refs, source_plugins, source_error = [], [], f"No se pudo leer: {e}"
+            plugins += [p for p in source_plugins if p not in plugins]
+            if source_error:
+                error = error or (source_error if source == os.path.normpath(scene)
+                                  else f"{os.path.basename(source)}: {source_error}")
+            refs = [(kind, value) for kind, value in refs if kind == "module" or _is_checkable(value)]
+            resolutions = self._map(lambda ref: self._resolve(ref[0], ref[1], source), refs)
+            for (kind, value), (resolved, tried) in zip(refs, resolutions):
+                probes.update(tried)
+                ref = value[0] if kind == "module" else value
+                if resolved:
+                    found += 1
+                    if kind == "include":
+                        pending.append(resolved)
+                elif resolved is None:
+                    missing.append({"kind": kind, "ref": ref, "source": source})
+                elif kind == "module":
+                    # Ni local ni instalado aquí; puede existir en el Python de SOFA
+                    warnings.append(f"import sin resolver: {ref}")
+        data = {"scene": scene, "missing": missing, "required_plugins": plugins, "warnings": warnings,
+                "error": error, "dependencies": found}
+        return probes, data
+
+    def _candidates(self, kind, value, source):
+        base = os.path.dirname(source)
+        if kind == "module":
+            name, level = value
+            parts = name.split(".")
+            if level:
+                for _ in range(level - 1):
+                    base = os.path.dirname(base)
+            else:
+                parts = parts[:1]
+            module = os.path.join(base, *parts)
+            return [module + ".py", os.path.join(module, "__init__.py"), module]
+        if os.path.isabs(value):
+            return [value]
+        value = value.lstrip("/\\")
+        return [os.path.join(base, value)] + [os.path.join(root, value) for root in self.search_paths]
+
+    def _resolve(self, kind, value, source):
+        """
+        Busca una referencia
+
+        Returns:
+            (ruta encontrada, None si falta o False si es un import que no se
+            comprueba aquí; {ruta mirada: mtime o None})
+        """
+        tried = {}
+        for candidate in self._candidates(kind, value, source):
+            candidate = os.path.normpath(candidate)
+            mtime = _stat_mtime(candidate)
+            tried[candidate] = mtime
+            if mtime is not None:
+                return candidate, tried
+        if kind == "module" and not value[1]:
+            top = value[0].split(".")[0]
+            return (True if top in SOFA_MODULES or _importable(top) else False), tried
+        return None, tried
+
+    def missing_plugins(self, plugins: list) -> list:
+        available = self._plugin_index()
+        if not available:
+            return []
+        return [plugin for plugin in plugins if plugin.lower() not in available]
+
+    def _plugin_index(self):
+        with self._plugins_lock:
+            if self._plugins is None:
+                self._plugins = set()
+                for plugin_dir in self.plugin_dirs:
+                    plugin_dir = os.path.normpath(plugin_dir)
+                    if not os.path.isdir(plugin_dir):
+                        continue
+                    depth = plugin_dir.count(os.sep)
+                    for directory, subdirs, files in os.walk(plugin_dir):
+                        if directory.count(os.sep) - depth >= PLUGIN_SCAN_DEPTH:
+                            subdirs[:] = []
+                        for name in files:
+                            match = PLUGIN_FILE_RE.match(name)
+                            if match:
+                                self._plugins.add(match.group(1).lower())
+            return self._plugins
+
+
+def describe(result: dict) -> list:
+    """Problemas de un resultado en líneas legibles"""
+    lines = []
+    if result["error"]:
+        lines.append(result["error"])
+    labels = {"file": "archivo", "include": "include", "module": "módulo"}
+    for item in result["missing"]:
+        source = os.path.basename(item["source"])
+        lines.append(f"falta {labels.get(item['kind'], item['kind'])} {item['ref']} ({source})")
+    lines += [f"falta plugin {plugin}" for plugin in result["plugins"]]
+    return lines
+
+
+def preflight_main(argv: list, executable: str, examples_dir: str) -> int:
+    """
+    Punto de entrada python interfaz_sofa.py check [opciones]
+
+    Returns:
+        Código de salida: 0 si todas las escenas están completas, 1 si alguna no
+    """
+    from batch_runner import select_scenes
+    parser = argparse.ArgumentParser(prog="interfaz_sofa.py check",
+                                     description="Comprueba las dependencias de las escenas sin lanzar runSofa")
+    parser.add_argument("scenes", nargs="*", help="Escenas concretas (por defecto, el árbol de ejemplos)")
+    parser.add_argument("--filter", action="append", help="Patrón glob sobre la ruta relativa (repetible)")
+    parser.add_argument("--limit", type=int, help="Máximo de escenas del árbol de ejemplos")
+    parser.add_argument("--workers", type=int, default=(os.cpu_count() or 1) * 2, help="Escenas a la vez")
+    parser.add_argument("--sofa", default=executable, help="Ejecutable runSofa (para localizar los plugins)")
+    parser.add_argument("--examples", default=examples_dir, help="Carpeta de ejemplos")
+    parser.add_argument("--warnings", action="store_true", help="Muestra también los imports sin resolver")
+    parser.add_argument("--json", help="Guarda los resultados en este JSON")
+    args = parser.parse_args(argv)
+
+    scenes = args.scenes or select_scenes(args.examples, args.filter, args.limit)
+    if not scenes:
+        print("No hay escenas que comprobar")
+        return 1
+    preflight = ScenePreflight(PreflightCache(), default_search_paths(args.examples), default_plugin_dirs(args.sofa))
+    print(f"Comprobando {len(scenes)} escenas ({args.workers} a la vez)")
+    start = time.perf_counter()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {pool.submit(preflight.check, scene): scene for scene in scenes}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            problems = describe(result)
+            if problems:
+                print(f"  ROTA    {result['scene']}")
+                for line in problems:
+                    print(f"          {line}")
+            if args.warnings:
+                for line in result["warnings"]:
+                    print(f"  aviso   {result['scene']}: {line}")
+    elapsed = time.perf_counter() - start
+    preflight.shutdown()
+
+    ordered = [results[scene] for scene in scenes]
+    broken = [r for r in ordered if not r["ok"]]
+    cached = sum(1 for r in ordered if r["cached"])
+    print(f"{len(ordered) - len(broken)} completas, {len(broken)} rotas en {elapsed:.2f} s "
+          f"({cached} desde la caché)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"time": time.time(), "results": ordered}, f, indent=2)
+    return 1 if broken else 0
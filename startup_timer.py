@@ -0,0 +1,69 @@
+import json
+import time
+import threading
+from contextlib import contextmanager
+from metrics import METRICS
+
+TIMINGS_FILE = "sofa_startup_times.jsonl"
+
+
+class StartupTimer:
+    def __init__(self, t0: float = None, expected: tuple = ()):
+        """
+        Desglose de tiempos del arranque
+
+        Cada fase se guarda con su inicio y fin relativos a t0. Cuando han
+        terminado todas las fases esperadas se imprime el desglose y se añade
+        como una línea JSON a TIMINGS_FILE para seguir regresiones.
+
+        Args:
+            t0: Instante de referencia (time.perf_counter()); por defecto, ahora
+            expected: Nombres de las fases que completan el arranque
+        """
+        self.t0 = t0 if t0 is not None else time.perf_counter()
+        self.expected = set(expected)
+        self.phases = {}
+        self.reported = False
+        self._lock = threading.Lock()
+
+    def record(self, name: str, start: float, end: float = None) -> None:
+        """Guarda una fase a partir de instantes de time.perf_counter()"""
+        end = end if end is not None else time.perf_counter()
+        with self._lock:
+            self.phases[name] = ((start - self.t0) * 1000, (end - self.t0) * 1000)
+            METRICS.set_gauge(f"startup.{name}_ms", round((end - self.t0) * 1000, 1))
+            done = not self.reported and self.expected <= set(self.phases)
+            if done:
+                self.reported = True
+        if done:
+            self.report()
+
+    def mark(self, name: str) -> None:
+        """Guarda un hito: una fase que empieza y termina ahora"""
+        now = time.perf_counter()
+        self.record(name, now, now)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Mide el bloque with como una fase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    def summary(self) -> str:
+        with self._lock:
+            phases = sorted(self.phases.items(), key=lambda item: item[1][1])
+        return " | ".join(f"{name} {end - start:.0f} ms (t+{end:.0f})" for name, (start, end) in phases)
+
+    def report(self) -> None:
+        print(f"Arranque: {self.summary()}")
+        with self._lock:
+            entry = {name: {"start_ms": round(start, 1), "end_ms": round(end, 1)}
+                     for name, (start, end) in self.phases.items()}
+        try:
+            with open(TIMINGS_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"time": time.time(), "phases": entry}) + "\n")
+        except OSError as e:
+            print(f"Error guardando tiempos de arranque: {e}")
@@ -0,0 +1,191 @@
+import threading
+import time
+
+from comment_cache import CachedCommentManager, CommentCache, fold_ops
+from key_codec import encode_key
+from memory_backend import MemoryBackend
+
+
+def test_fold_set_then_update_merges():
+    updates = fold_ops([
+        ('set', 'ej', 'c1', {'user': 'ana', 'text': 'a'}),
+        ('update', 'ej', 'c1', {'text': 'b'}),
+    ])
+    assert updates == {'ej/c1': {'user': 'ana', 'text': 'b'}}
+
+
+def test_fold_update_writes_fields():
+    updates = fold_ops([('update', 'ej', 'c1', {'text': 'b', 'edited_timestamp': 1})])
+    assert updates == {'ej/c1/text': 'b', 'ej/c1/edited_timestamp': 1}
+
+
+def test_fold_delete_then_update_stays_deleted():
+    updates = fold_ops([
+        ('delete', 'ej', 'c1', None),
+        ('update', 'ej', 'c1', {'text': 'b'}),
+    ])
+    assert updates == {'ej/c1': None}
+
+
+def test_fold_set_update_delete_update():
+    updates = fold_ops([
+        ('set', 'ej', 'c1', {'user': 'ana', 'text': 'a'}),
+        ('update', 'ej', 'c1', {'text': 'b'}),
+        ('delete', 'ej', 'c1', None),
+        ('update', 'ej', 'c1', {'text': 'c'}),
+    ])
+    assert updates == {'ej/c1': None}
+
+
+def test_fold_delete_then_set_recreates():
+    updates = fold_ops([
+        ('delete', 'ej', 'c1', None),
+        ('set', 'ej', 'c1', {'user': 'ana', 'text': 'a'}),
+    ])
+    assert updates == {'ej/c1': {'user': 'ana', 'text': 'a'}}
+
+
+class RejectedError(Exception):
+    code = 'PERMISSION_DENIED'
+
+
+class RejectingRemote:
+    """Servidor falso que rechaza cualquier update() que toque el comentario 'malo'"""
+
+    def __init__(self):
+        self.applied = {}
+
+    def update(self, updates, notify=False):
+        if any("/malo" in path for path in updates):
+            raise RejectedError("Permission denied")
+        self.applied.update(updates)
+
+    def set_notification_callback(self, callback):
+        pass
+
+    def open_stream(self, on_status=None):
+        pass
+
+    def stop_listening(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_rejected_write_is_set_aside_and_later_writes_proceed(tmp_path):
+    manager = CachedCommentManager(None, CommentCache(str(tmp_path / "cache.db")))
+    try:
+        manager._write_many("ej.scn", [
+            ('set', 'bueno1', {'user': 'ana', 'text': 'a'}),
+            ('set', 'malo', {'user': 'ana', 'text': 'b'}),
+            ('update', 'malo', {'text': 'c'}),
+            ('set', 'bueno2', {'user': 'ana', 'text': 'd'}),
+        ])
+        remote = RejectingRemote()
+        manager.attach_remote(remote)
+        assert wait_for(lambda: manager.pending_count() == 0)
+
+        key = encode_key("ej.scn")
+        assert f"{key}/bueno1" in remote.applied
+        assert f"{key}/bueno2" in remote.applied
+        assert not any("malo" in path for path in remote.applied)
+        # La edición de la nota rechazada falla con ella
+        assert manager.failed_count() == 2
+        assert [(op, cid) for op, _, cid, _ in manager.failed_writes()] == [('set', 'malo'), ('update', 'malo')]
+        assert 'malo' not in manager.get_comments("ej.scn")
+
+        # Una escritura posterior no queda bloqueada por la rechazada
+        manager._write("ej.scn", 'set', 'bueno3', {'user': 'ana', 'text': 'e'})
+        assert wait_for(lambda: f"{key}/bueno3" in remote.applied)
+
+        manager.discard_failed()
+        assert manager.failed_count() == 0
+    finally:
+        manager.close()
+
+
+class RecordingCache(CommentCache):
+    """Caché que anota desde qué hilo se lee un ejemplo completo"""
+
+    def __init__(self, db_file):
+        super().__init__(db_file)
+        self.full_reads = []
+
+    def get_comments(self, safe_path):
+        self.full_reads.append(threading.current_thread())
+        return super().get_comments(safe_path)
+
+
+def test_listening_does_not_read_the_whole_cached_thread_on_the_calling_thread(tmp_path):
+    backend = MemoryBackend()
+    for i in range(5):
+        backend.save_comment("ej.scn", "ana", f"nota {i}")
+    cache = RecordingCache(str(tmp_path / "cache.db"))
+    manager = CachedCommentManager(backend, cache)
+    arrived = threading.Event()
+    try:
+        manager.listen_updates("ej.scn", lambda *args: arrived.set())
+        manager.listen_updates("ej.scn", lambda *args: arrived.set())
+        assert arrived.wait(5)
+        assert threading.current_thread() not in cache.full_reads
+        assert len(cache.full_reads) == 1
+        # La primera página sale de la caché con LIMIT, sin leer el hilo completo
+        page = manager.get_comments_page("ej.scn", 2)
+        assert len(page) == 2
+        assert len(cache.full_reads) == 1
+    finally:
+        manager.close()
+
+
+def test_outbox_replays_offline_writes_through_memory_backend(tmp_path):
+    backend = MemoryBackend()
+    manager = CachedCommentManager(None, CommentCache(str(tmp_path / "cache.db")))
+    try:
+        root = manager.save_comment("ej.scn", "ana", "raíz")
+        reply = manager.save_comment("ej.scn", "luis", "respuesta", parent_id=root)
+        manager.save_comment("ej.scn", "luis", "respuesta a la respuesta", parent_id=reply)
+        other = manager.save_comment("ej.scn", "ana", "otra")
+        manager.update_comment("ej.scn", other, "otra editada")
+        assert manager.delete_replies("ej.scn", root) == 2
+        assert manager.pending_count() == 7
+        assert set(manager.get_comments("ej.scn")) == {root, other}
+
+        manager.attach_remote(backend)
+        assert wait_for(lambda: manager.pending_count() == 0)
+        server = backend.get_comments("ej.scn")
+        assert set(server) == {root, other}
+        assert server[other]['text'] == "otra editada"
+        # Los timestamps de servidor se resuelven al replicar
+        assert isinstance(server[root]['timestamp'], int)
+        assert isinstance(server[other]['edited_timestamp'], int)
+        # Solo las notas nuevas que siguen existiendo se anuncian en /sofa_activity
+        activity = backend.activity_ref.child(encode_key("ej.scn")).get()
+        assert set(activity) == {root, other}
+        assert activity[other]['text'] == "otra editada"
+    finally:
+        manager.close()
+
+
+def test_listener_echo_reaches_the_cache(tmp_path):
+    backend = MemoryBackend()
+    cache = CommentCache(str(tmp_path / "cache.db"))
+    manager = CachedCommentManager(backend, cache)
+    events = []
+    try:
+        manager.listen_updates("ej.scn", lambda *args: events.append(args))
+        backend.save_comment("ej.scn", "luis", "remota")
+        assert wait_for(lambda: len(cache.get_comments(encode_key("ej.scn"))) == 1)
+        assert wait_for(lambda: any(comment.get('text') == "remota"
+                                    for _, comments, _ in events for comment in comments.values()))
+    finally:
+        manager.close()
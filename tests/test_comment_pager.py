@@ -0,0 +1,66 @@
+from comment_pager import CommentPager
+from key_codec import encode_key
+from memory_backend import MemoryBackend
+
+EXAMPLE = "ej.scn"
+
+
+def backend_with_roots(count):
+    backend = MemoryBackend()
+    # Timestamps explícitos y distintos: el servidor puede repetir milisegundo
+    backend.ref.update({
+        f"{encode_key(EXAMPLE)}/r{i:02d}": {'user': 'ana', 'text': str(i), 'parent_id': None,
+                               'timestamp': 1000 + i, 'thread_timestamp': 1000 + i}
+        for i in range(count)
+    })
+    return backend
+
+
+def test_pages_go_from_newest_to_oldest_without_gaps():
+    backend = backend_with_roots(23)
+    pager = CommentPager(page_size=5)
+    pages = []
+    before = None
+    while True:
+        page = backend.get_comments_page(EXAMPLE, pager.page_size, before)
+        pages.append([comment['timestamp'] for comment in page.values()])
+        pager.add_page(page, complete=True)
+        before = pager.next_request()
+        if before is None:
+            break
+        # La misma página no se pide dos veces
+        assert pager.next_request() is None
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    assert max(pages[0]) == 1022 and min(pages[-1]) == 1000
+    assert all(min(newer) > max(older) for newer, older in zip(pages, pages[1:]))
+    assert len(pager.comments) == 23 and pager.exhausted
+
+
+def test_cache_page_does_not_end_paging():
+    pager = CommentPager(page_size=5)
+    pager.add_page({'r1': {'parent_id': None, 'timestamp': 1}}, complete=False)
+    assert not pager.exhausted and pager.next_request() == 1
+
+
+def test_listener_changes_only_touch_the_loaded_window():
+    backend = backend_with_roots(10)
+    pager = CommentPager(page_size=5)
+    pager.add_page(backend.get_comments_page(EXAMPLE, 5), complete=True)
+    assert pager.cursor == 1005
+
+    changes = {
+        'nueva': {'parent_id': None, 'timestamp': 2000},
+        'r01': {'parent_id': None, 'timestamp': 1001, 'text': 'editada fuera de la ventana'},
+        'r07': {'parent_id': None, 'timestamp': 1007, 'text': 'editada'},
+        'resp': {'parent_id': 'r08', 'timestamp': 2001},
+        'pendiente': {'parent_id': None, 'timestamp': {'.sv': 'timestamp'}},
+    }
+    affected = pager.apply(changes, set(changes) | {'r09'})
+    assert affected == {'nueva', 'r07', 'pendiente', 'r09'}
+    assert 'r09' not in pager.comments and 'r01' not in pager.comments
+
+    # Una respuesta entra cuando su hilo está desplegado
+    pager.expand('r08', {})
+    assert pager.apply({'resp': changes['resp']}, {'resp'}) == {'resp'}
+    assert pager.collapse('r08') == {'r08', 'resp'}
+    assert 'resp' not in pager.comments
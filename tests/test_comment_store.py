@@ -0,0 +1,82 @@
+import time
+
+from comment_store import CommentStore, collect_thread
+from memory_backend import MemoryDatabase
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_put_inserts_edits_and_deletes():
+    store = CommentStore({'c1': {'user': 'ana', 'text': 'a', 'parent_id': None}})
+    assert store.apply_event('put', '/c2', {'user': 'luis', 'text': 'b', 'parent_id': 'c1'}) == {'c2'}
+    assert store.replies('c1') == ['c2']
+    assert store.apply_event('put', '/c2/text', 'editado') == {'c2'}
+    assert store.comments['c2']['text'] == 'editado'
+    assert store.apply_event('put', '/c2', None) == {'c2'}
+    assert 'c2' not in store.comments and store.replies('c1') == []
+    # Borrar un campo de un comentario que no existe no cambia nada
+    assert store.apply_event('put', '/nada/text', None) == set()
+
+
+def test_nested_put_copies_instead_of_editing_in_place():
+    store = CommentStore({'c1': {'user': 'ana', 'text': 'a', 'attachments': [{'hash': 'h', 'width': 1}]}})
+    before = store.snapshot()
+    store.apply_event('put', '/c1/meta/likes/luis', True)
+    assert store.comments['c1']['meta'] == {'likes': {'luis': True}}
+    assert 'meta' not in before['c1']
+
+
+def test_patch_applies_every_path_and_deletes():
+    store = CommentStore({
+        'c1': {'user': 'ana', 'text': 'a', 'parent_id': None},
+        'c2': {'user': 'ana', 'text': 'b', 'parent_id': 'c1'},
+    })
+    changed = store.apply_event('patch', '/', {
+        'c1/text': 'editado',
+        'c2': None,
+        'c3': {'user': 'luis', 'text': 'c', 'parent_id': 'c1'},
+    })
+    assert changed == {'c1', 'c2', 'c3'}
+    assert store.comments['c1']['text'] == 'editado'
+    assert 'c2' not in store.comments
+    assert store.replies('c1') == ['c3']
+    assert store.apply_event('patch', '/c3', {'parent_id': None, 'text': 'd'}) == {'c3'}
+    assert store.replies('c1') == [] and sorted(store.replies(None)) == ['c1', 'c3']
+
+
+def test_reset_reports_only_differences():
+    store = CommentStore({'c1': {'text': 'a'}, 'c2': {'text': 'b'}})
+    assert store.apply_event('put', '/', {'c1': {'text': 'a'}, 'c2': {'text': 'B'}, 'c3': {'text': 'c'}}) == {'c2', 'c3'}
+    assert store.reset({'c1': {'text': 'a'}}) == {'c2', 'c3'}
+    assert store.changes(['c1', 'c2']) == {'c1': {'text': 'a'}, 'c2': None}
+    assert len(store) == 1
+
+
+def test_store_follows_memory_database_writes():
+    database = MemoryDatabase()
+    example = database.reference('/sofa_comments/ej')
+    example.update({'c1': {'user': 'ana', 'text': 'a', 'parent_id': None}})
+    store = CommentStore()
+    registration = example.listen(lambda event: store.apply_event(event.event_type, event.path, event.data))
+    try:
+        example.child('c2').set({'user': 'luis', 'text': 'b', 'parent_id': 'c1', 'timestamp': {'.sv': 'timestamp'}})
+        example.child('c1').update({'text': 'editado', 'edited_timestamp': {'.sv': 'timestamp'}})
+        database.reference('/sofa_comments').update({'ej/c3': {'user': 'ana', 'text': 'c', 'parent_id': 'c2'},
+                                                     'ej/c1/text': 'otra vez', 'otro/c9': {'text': 'no'}})
+        example.child('c2').child('text').delete()
+        assert wait_for(lambda: store.snapshot() == example.get())
+        assert isinstance(store.comments['c2']['timestamp'], int)
+        assert collect_thread(store.snapshot(), 'c1') == ['c1', 'c2', 'c3']
+
+        # Borrar el ejemplo entero llega como put en / con null
+        example.delete()
+        assert wait_for(lambda: len(store) == 0)
+    finally:
+        registration.close()
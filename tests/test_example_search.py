@@ -0,0 +1,40 @@
+from example_search import ExampleSearchIndex
+
+
+def _index(paths):
+    index = ExampleSearchIndex()
+    index.set_paths(paths)
+    return index
+
+
+def test_new_single_letter_term_filters_cached_results():
+    index = _index(['xa.scn', 'ab.scn', 'zz.py'])
+    assert index.search('x') == ['xa.scn']
+    assert index.search('x b') == []
+    assert _index(['xa.scn', 'ab.scn', 'zz.py']).search('x b') == []
+
+
+def test_incremental_typing_matches_fresh_index():
+    paths = ['demos/caduceus.scn', 'demos/liver.scn', 'tests/beam_fem.py',
+             'Components/collision/cube.scn', 'tutorials/a_b_c.scn', 'bc.scn']
+    index = _index(paths)
+    for query in ['c', 'ca', 'cad', 'c b', 'c b c', 'cu', 'cube s', 'b', 'b c', 'bc']:
+        for end in range(1, len(query) + 1):
+            prefix = query[:end]
+            assert index.search(prefix) == _index(paths).search(prefix), prefix
+
+
+def test_ranks_name_then_path_then_subsequence():
+    index = _index(['x/lvr.scn', 'liver/a.scn', 'b/liver.scn'])
+    assert index.search('liver') == ['b/liver.scn', 'liver/a.scn']
+    assert index.search('lvr') == ['x/lvr.scn', 'liver/a.scn', 'b/liver.scn']
+
+
+def test_remove_and_rename_invalidate_cache():
+    index = _index(['a.scn', 'b.scn'])
+    assert index.search('a') == ['a.scn']
+    index.rename([('a.scn', 'c.scn')])
+    assert index.search('a') == []
+    index.remove(['b.scn'])
+    assert index.search('b') == []
+    assert index.paths() == ['c.scn']
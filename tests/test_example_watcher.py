@@ -0,0 +1,19 @@
+from types import SimpleNamespace
+
+import example_watcher
+from example_watcher import ExampleWatcher
+from metrics import METRICS
+
+
+def test_inotify_fallback_is_reported_to_metrics(monkeypatch, tmp_path):
+    def unavailable(*args):
+        raise OSError("límite de watches alcanzado")
+
+    monkeypatch.setattr(example_watcher, "_InotifyBackend", unavailable)
+    watcher = ExampleWatcher(SimpleNamespace(examples_dir=str(tmp_path)), lambda *args: None)
+    watcher.use_inotify = True
+    before = len([e for e in METRICS.errors() if e[1] == "examples.watch"])
+    backend = watcher._create_backend()
+    assert backend.name == "sondeo"
+    errors = [message for _, source, message in METRICS.errors() if source == "examples.watch"]
+    assert len(errors) == before + 1 and "límite de watches" in errors[-1]
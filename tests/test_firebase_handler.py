@@ -0,0 +1,115 @@
+import threading
+import time
+
+from firebase_handler import activity_notes, activity_updates
+from key_codec import encode_key
+from memory_backend import MemoryBackend, MemoryDatabase
+
+
+def open_example(backend, example_name, callback):
+    opened = threading.Semaphore(0)
+    backend.listen_updates(example_name, callback, on_status=lambda error: opened.release())
+    # Stream del ejemplo y stream de /sofa_activity
+    assert opened.acquire(timeout=5) and opened.acquire(timeout=5)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_activity_updates_keep_only_new_notes():
+    activity = activity_updates({
+        "ej/c1": {"user": "ana", "text": "hola", "parent_id": None},
+        "ej/c2/text": "editado",
+        "ej/c3": None,
+        "otro/c4": {"user": "luis", "text": "adiós"},
+    })
+    assert set(activity) == {"ej", "otro"}
+    assert set(activity["ej"]) == {"c1"}
+    assert activity["ej"]["c1"]["user"] == "ana"
+
+
+def test_activity_notes_ignore_initial_put():
+    assert activity_notes('put', '/', {"ej": {"c1": {"user": "ana", "text": "vieja"}}}) == []
+    notes = activity_notes('patch', '/', {"ej": {"c1": {"user": "ana", "text": "nueva"}}})
+    assert notes == [("ej", {"user": "ana", "text": "nueva"})]
+
+
+def test_example_stream_is_scoped_to_the_open_example():
+    database = MemoryDatabase()
+    backend = MemoryBackend(database)
+    backend.save_comment("abierto.scn", "ana", "una")
+    backend.save_comment("otro.scn", "ana", "otra")
+    reads = database.reads
+    events = []
+    arrived = threading.Event()
+    open_example(backend, "abierto.scn", lambda *args: (events.append(args), arrived.set()))
+    try:
+        assert arrived.wait(5)
+        listened = sorted(registration.segments for registration in database._registrations)
+        assert listened == [("sofa_activity",), ("sofa_comments", encode_key("abierto.scn"))]
+        # El put inicial del stream carga el ejemplo: no hace falta ningún get()
+        assert database.reads == reads
+        example_name, changes, store = events[0]
+        assert example_name == "abierto.scn"
+        assert [c["text"] for c in changes.values()] == ["una"]
+        assert len(store) == 1
+    finally:
+        backend.close()
+    # Cerrar no bloquea, pero no deja streams abiertos
+    assert wait_for(lambda: backend.open_streams() == 0 and not database._registrations)
+
+
+def test_events_deliver_only_the_changed_comments_outside_the_route_lock():
+    backend = MemoryBackend()
+    for i in range(20):
+        backend.save_comment("ej.scn", "ana", f"nota {i}")
+    events = []
+    lock_free = []
+    arrived = threading.Semaphore(0)
+
+    def callback(example_name, changes, store):
+        lock_free.append(backend._route_lock.acquire(blocking=False))
+        if lock_free[-1]:
+            backend._route_lock.release()
+        events.append((changes, len(store)))
+        arrived.release()
+
+    open_example(backend, "ej.scn", callback)
+    try:
+        assert arrived.acquire(timeout=5)
+        backend.save_comment("ej.scn", "luis", "nueva")
+        assert arrived.acquire(timeout=5)
+        changes, count = events[-1]
+        assert [c["text"] for c in changes.values()] == ["nueva"]
+        assert count == 21
+        cid = next(iter(changes))
+        backend.delete_comment("ej.scn", cid)
+        assert arrived.acquire(timeout=5)
+        assert events[-1] == ({cid: None}, 20)
+        assert all(lock_free)
+    finally:
+        backend.close()
+
+
+def test_known_comments_are_not_delivered_again():
+    backend = MemoryBackend()
+    backend.save_comment("ej.scn", "ana", "una")
+    known = backend.get_comments("ej.scn")
+    backend.save_comment("ej.scn", "luis", "otra")
+    events = []
+    arrived = threading.Event()
+    backend.listen_updates("ej.scn", lambda *args: (events.append(args), arrived.set()),
+                           initial=lambda: known)
+    try:
+        assert arrived.wait(5)
+        _, changes, store = events[0]
+        assert [c["text"] for c in changes.values()] == ["otra"]
+        assert len(store) == 2
+    finally:
+        backend.close()
@@ -0,0 +1,90 @@
+import random
+
+from comment_transfer import migrate_keys
+from key_codec import ESCAPED, decode_key, encode_key, is_encoded, legacy_decode, migrated_key
+from memory_backend import MemoryBackend
+
+FORBIDDEN = ".$#[]/" + "".join(chr(c) for c in range(32)) + chr(127)
+NAMES = [
+    "Demos/caduceus.scn",
+    "a.b", "a_dot_b", "a%2Eb", "a%252Eb", "100%", "%", "%%", "%2",
+    "C:\\sofa\\examples\\liver.scn",
+    "$x#y[0]/z",
+    "tab\there\nnewline\x00nul\x7fdel",
+    "escena_ñandú/Ünïcödé/木/🙂.scn",
+    "",
+]
+
+
+def random_names(count=500, seed=0):
+    generator = random.Random(seed)
+    alphabet = ESCAPED + "abcXYZ09_-~ %éñ木🙂"
+    return ["".join(generator.choice(alphabet) for _ in range(generator.randint(0, 12))) for _ in range(count)]
+
+
+def test_round_trip():
+    for name in NAMES + random_names():
+        assert decode_key(encode_key(name)) == name
+
+
+def test_keys_are_valid_for_firebase():
+    for name in NAMES + random_names():
+        assert not any(char in FORBIDDEN for char in encode_key(name))
+
+
+def test_no_collisions_between_raw_and_escaped_names():
+    names = set(NAMES + random_names())
+    # Cada nombre junto a su forma ya escapada, como si fuera una ruta literal
+    names |= {encode_key(name) for name in list(names)}
+    keys = {encode_key(name) for name in names}
+    assert len(keys) == len(names)
+    assert encode_key("a.b") != encode_key("a%2Eb") != encode_key("a_dot_b")
+
+
+def test_encoded_keys_are_recognised():
+    for name in NAMES + random_names():
+        assert is_encoded(encode_key(name))
+    assert not is_encoded("100%")
+    assert not is_encoded("a%2eb")
+
+
+def test_migrated_key_is_idempotent():
+    for legacy in ["a_dot_b", "Demos_fwslash_liver_dot_scn", "x_lbracket_0_rbracket_", "50%_dot_x", "plain"]:
+        migrated = migrated_key(legacy) or legacy
+        assert migrated_key(migrated) is None
+        assert decode_key(migrated) == legacy_decode(legacy)
+    for name in NAMES + random_names(100):
+        key = encode_key(name)
+        # Con original_path (lo tiene todo comentario nuevo) una key actual nunca se mueve
+        assert migrated_key(key, name) is None
+        # Sin él solo es seguro si lleva escapes: "a_dot_b" puede ser de los dos esquemas
+        if "%" in key:
+            assert migrated_key(key) is None
+        migrated = migrated_key(key)
+        if migrated is not None:
+            assert migrated_key(migrated) is None
+
+
+def test_original_path_resolves_legacy_ambiguity():
+    assert migrated_key("a_dot_b", "a.b") == encode_key("a.b")
+    assert migrated_key("a_dot_b", "a_dot_b") is None
+    assert migrated_key("a_dot_b") == encode_key("a.b")
+
+
+def test_migration_moves_legacy_keys_once():
+    backend = MemoryBackend()
+    backend.ref.update({
+        "a_dot_b/c1": {"user": "ana", "text": "de a.b", "original_path": "a.b"},
+        "a_dot_b/c2": {"user": "ana", "text": "de a_dot_b", "original_path": "a_dot_b"},
+        "Demos_fwslash_x_dot_scn/c3": {"user": "ana", "text": "sin ruta"},
+    })
+    result = migrate_keys(backend)
+    assert result["moved"] == 2 and result["failed"] == 0
+    assert backend.get_comments("a.b") == {"c1": {"user": "ana", "text": "de a.b", "original_path": "a.b"}}
+    assert set(backend.get_comments("a_dot_b")) == {"c2"}
+    assert set(backend.get_comments("Demos/x.scn")) == {"c3"}
+
+    # Relanzarla no mueve nada más
+    before = backend.ref.get()
+    assert migrate_keys(backend)["moved"] == 0
+    assert backend.ref.get() == before
@@ -0,0 +1,30 @@
+from memory_backend import MemoryBackend, MemoryDatabase
+
+
+def test_shallow_keys_queries_and_persistence(tmp_path):
+    db_file = str(tmp_path / "local.db")
+    backend = MemoryBackend(MemoryDatabase(db_file))
+    backend.save_comment("a.scn", "ana", "raíz")
+    root = next(iter(backend.get_comments("a.scn")))
+    backend.save_comment("a.scn", "luis", "respuesta", parent_id=root)
+    backend.save_comment("carpeta/b.scn", "ana", "otra")
+
+    assert backend.get_commented_examples() == {"a.scn", "carpeta/b.scn"}
+    assert backend.count_comments("a.scn") == 2
+    # Solo los comentarios principales tienen thread_timestamp y entran en las páginas
+    assert list(backend.get_comments_page("a.scn", 10)) == [root]
+    replies = backend.get_replies("a.scn", root)
+    assert [reply['text'] for reply in replies.values()] == ["respuesta"]
+
+    reloaded = MemoryBackend(MemoryDatabase(db_file))
+    assert reloaded.get_comments("a.scn") == backend.get_comments("a.scn")
+    assert reloaded.get_commented_examples() == {"a.scn", "carpeta/b.scn"}
+
+
+def test_deleting_last_comment_removes_the_example():
+    backend = MemoryBackend()
+    backend.save_comment("a.scn", "ana", "única")
+    (cid,) = backend.get_comments("a.scn")
+    backend.delete_comment("a.scn", cid)
+    assert backend.get_example_keys() == set()
+    assert backend.get_comments("a.scn") == {}
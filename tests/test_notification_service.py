@@ -0,0 +1,43 @@
+import threading
+
+from memory_backend import MemoryBackend
+from notification_service import NotificationService
+
+
+def test_comment_on_other_example_counts_as_unread(tmp_path):
+    service = NotificationService("yo", notify=lambda title, message: None,
+                                  unread_file=str(tmp_path / "unread.json"))
+    service.set_open_example("abierto.scn")
+    service.submit("otro.scn", "ana", "hola")
+    service.submit("abierto.scn", "ana", "ya la veo")
+    service.submit("otro.scn", "yo", "mi propio eco")
+    service.stop()
+    assert service.unread("otro.scn") == 1
+    assert service.unread("abierto.scn") == 0
+
+
+def test_remote_note_on_non_open_example_increments_its_badge(tmp_path):
+    backend = MemoryBackend()
+    counts = []
+    changed = threading.Event()
+    service = NotificationService(
+        "yo",
+        on_unread_change=lambda c: (counts.append(c), changed.set()),
+        notify=lambda title, message: None,
+        unread_file=str(tmp_path / "unread.json")
+    )
+    backend.set_notification_callback(service.submit)
+    service.set_open_example("abierto.scn")
+    opened = threading.Semaphore(0)
+    backend.listen_updates("abierto.scn", lambda *args: None, on_status=lambda error: opened.release())
+    try:
+        # Stream del ejemplo y stream de /sofa_activity
+        assert opened.acquire(timeout=5) and opened.acquire(timeout=5)
+        # Otro usuario comenta en un ejemplo que no está abierto
+        backend.save_comment("carpeta/otro.scn", "ana", "nota nueva")
+        assert changed.wait(5)
+        assert counts[-1] == {"carpeta/otro.scn": 1}
+        assert service.unread("carpeta/otro.scn") == 1
+    finally:
+        backend.close()
+        service.stop()
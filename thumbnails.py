@@ -0,0 +1,264 @@
+import os
+import shlex
+import hashlib
+import tempfile
+import threading
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from metrics import METRICS
+
+THUMBNAIL_DIR = "sofa_thumbnails"
+THUMBNAIL_SIZE = (64, 48)
+DISK_CACHE_BYTES = 100 * 1024 * 1024
+PHOTO_CACHE_SIZE = 200
+RENDER_WORKERS = 2
+RENDER_TIMEOUT = 60
+# Captura de escenas con runSofa, desactivada por defecto: runSofa (al menos
+# hasta v24.12) no tiene ninguna opción de línea de comandos para guardar una
+# captura, y sin ella cada miniatura costaría un runSofa completo para nada.
+# Para un build que sí la tenga (GUI propio, script...), SOFA_SCREENSHOT_ARGS
+# da los argumentos; {output} es el PNG a generar y la escena va al final.
+# Ningún valor concreto está probado contra un build oficial.
+SCREENSHOT_ARGS = tuple(shlex.split(os.environ.get("SOFA_SCREENSHOT_ARGS", "")))
+PLACEHOLDER_COLORS = {".scn": (70, 130, 180), ".xml": (95, 158, 160), ".py": (218, 165, 32)}
+
+
+def file_digest(path: str) -> str:
+    """SHA-1 del contenido del archivo, leído por bloques"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ThumbnailDiskCache:
+    def __init__(self, cache_dir: str = THUMBNAIL_DIR, max_bytes: int = DISK_CACHE_BYTES, suffix: str = ".png"):
+        """
+        Miniaturas PNG en disco indexadas por hash de contenido, con límite LRU
+
+        El mtime de cada archivo hace de marca de último uso: se actualiza en
+        cada acierto y, al superar max_bytes, se borran las más antiguas.
+
+        Args:
+            cache_dir: Carpeta de las miniaturas
+            max_bytes: Tamaño máximo total de la carpeta
+            suffix: Extensión de los archivos (otra para guardar bytes con put_bytes)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._entries = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def get(self, key: str):
+        """Ruta de la miniatura si está en caché, o None"""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        with self._lock:
+            if self._entries is not None and key in self._entries:
+                self._entries.move_to_end(key)
+        return path
+
+    def put(self, key: str, image) -> str:
+        """Guarda una imagen PIL de forma atómica y devuelve su ruta"""
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, format="PNG", optimize=True)
+        return self.adopt(key, tmp)
+
+    def put_bytes(self, key: str, data: bytes) -> str:
+        """Guarda bytes tal cual de forma atómica y devuelve su ruta"""
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return self.adopt(key, tmp)
+
+    def adopt(self, key: str, file_path: str) -> str:
+        """Mueve a la caché un archivo ya escrito (en el mismo disco) y devuelve su ruta"""
+        path = self.path_for(key)
+        os.replace(file_path, path)
+        with self._lock:
+            self._load_entries()
+            self._entries[key] = os.path.getsize(path)
+            self._entries.move_to_end(key)
+            self._evict()
+        return path
+
+    def _load_entries(self):
+        if self._entries is not None:
+            return
+        files = []
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(self.suffix):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, entry.name[:-len(self.suffix)], stat.st_size))
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(files))
+
+    def _evict(self):
+        total = sum(self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            total -= size
+            try:
+                os.remove(self.path_for(key))
+            except OSError:
+                pass
+
+
+class ThumbnailService:
+    def __init__(self, executable: str, disk_cache: ThumbnailDiskCache, on_ready: callable,
+                 workers: int = RENDER_WORKERS, photo_cache_size: int = PHOTO_CACHE_SIZE,
+                 screenshot_args: tuple = SCREENSHOT_ARGS):
+        """
+        Genera y carga miniaturas de escenas bajo demanda
+
+        Las peticiones se atienden en un pool acotado; las de filas que ya no
+        están visibles cuando les toca turno se descartan. Los PhotoImage solo
+        se crean en el hilo de Tk (add_photo) y se guardan en un LRU pequeño.
+
+        Sin screenshot_args no se lanza nada: cada escena tiene un icono según
+        su tipo. Con ellos, la primera captura hace de prueba; si runSofa no
+        genera la imagen, la captura se desactiva para el resto de la sesión.
+
+        Args:
+            executable: Ruta de runSofa para las capturas
+            screenshot_args: Argumentos de captura (por defecto SCREENSHOT_ARGS)
+            disk_cache: Caché de miniaturas en disco
+            on_ready: Recibe (ruta de la escena, ruta del PNG) desde el hilo de fondo
+            workers: Capturas simultáneas
+            photo_cache_size: Máximo de PhotoImage en memoria
+        """
+        self.executable = executable
+        self.screenshot_args = tuple(screenshot_args)
+        # None: sin probar; True/False: la captura funciona o se ha desactivado
+        self.capture = None if self.screenshot_args else False
+        self._probe_lock = threading.Lock()
+        self.disk_cache = disk_cache
+        self.on_ready = on_ready
+        self.photo_cache_size = photo_cache_size
+        self._photos = OrderedDict()
+        self._pending = set()
+        self._visible = frozenset()
+        self._digests = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+
+    def photo(self, path: str):
+        """PhotoImage de la escena si está en memoria, o None"""
+        photo = self._photos.get(path)
+        if photo is not None:
+            self._photos.move_to_end(path)
+        return photo
+
+    def request(self, path: str) -> None:
+        """Pide la miniatura de una escena; on_ready se llamará al tenerla"""
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.add(path)
+        self._pool.submit(self._load, path)
+
+    def set_visible(self, paths) -> None:
+        """Rutas visibles ahora; el resto de peticiones en cola se descarta"""
+        self._visible = frozenset(paths)
+
+    def add_photo(self, path: str, png_path: str):
+        """Crea el PhotoImage de una miniatura lista (hilo de Tk)"""
+        from PIL import Image, ImageTk
+        with Image.open(png_path) as image:
+            photo = ImageTk.PhotoImage(image)
+        self._photos[path] = photo
+        self._photos.move_to_end(path)
+        while len(self._photos) > self.photo_cache_size:
+            self._photos.popitem(last=False)
+        return photo
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
+
+    def _load(self, path):
+        try:
+            if path not in self._visible:
+                return
+            png_path = None
+            if self.capture is not False:
+                key = f"{self._digest(path)}_{THUMBNAIL_SIZE[0]}x{THUMBNAIL_SIZE[1]}"
+                png_path = self.disk_cache.get(key)
+                if png_path is None:
+                    image = self._render(path)
+                    if image is not None:
+                        png_path = self.disk_cache.put(key, image)
+            if png_path is None:
+                png_path = self._icon(path)
+            self.on_ready(path, png_path)
+        except Exception as e:
+            METRICS.error("thumbnails", f"Error generando miniatura de {path}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+
+    def _digest(self, path):
+        stat = os.stat(path)
+        cached = self._digests.get(path)
+        if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+            return cached[2]
+        digest = file_digest(path)
+        self._digests[path] = (stat.st_mtime, stat.st_size, digest)
+        return digest
+
+    def _render(self, path):
+        # Captura con runSofa, o None si no hay captura
+        if self.capture is None:
+            with self._probe_lock:
+                if self.capture is None:
+                    image = self._capture(path)
+                    self.capture = image is not None
+                    if not self.capture:
+                        METRICS.error("thumbnails", "runSofa no generó la captura con SOFA_SCREENSHOT_ARGS; "
+                                                    "se usan iconos el resto de la sesión")
+                    return image
+        return self._capture(path) if self.capture else None
+
+    def _capture(self, path):
+        from PIL import Image
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "capture.png")
+            command = [self.executable] + [arg.format(output=output) for arg in self.screenshot_args] + [path]
+            try:
+                subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               stdin=subprocess.DEVNULL, timeout=RENDER_TIMEOUT)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+            if os.path.exists(output):
+                with Image.open(output) as capture:
+                    image = capture.convert("RGB")
+                image.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+                return image
+        return None
+
+    def _icon(self, path):
+        # Solo depende del tipo y del nombre: no lee la escena
+        extension = os.path.splitext(path)[1].lower()
+        label = f"{extension}|{os.path.basename(path)[:9]}"
+        key = f"icon_{hashlib.sha1(label.encode('utf-8')).hexdigest()[:16]}_{THUMBNAIL_SIZE[0]}x{THUMBNAIL_SIZE[1]}"
+        return self.disk_cache.get(key) or self.disk_cache.put(key, self._placeholder(path))
+
+    @staticmethod
+    def _placeholder(path):
+        from PIL import Image, ImageDraw
+        extension = os.path.splitext(path)[1].lower()
+        image = Image.new("RGB", THUMBNAIL_SIZE, PLACEHOLDER_COLORS.get(extension, (128, 128, 128)))
+        draw = ImageDraw.Draw(image)
+        draw.text((6, 6), extension.lstrip(".").upper() or "?", fill="white")
+        draw.text((6, 26), os.path.basename(path)[:9], fill="white")
+        return image
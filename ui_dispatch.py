@@ -0,0 +1,105 @@
+import threading
+import time
+import itertools
+from collections import OrderedDict
+from metrics import METRICS
+
+
+class UIDispatcher:
+    def __init__(self, root, interval_ms: int = 50, budget_ms: int = 20):
+        """
+        Cola de eventos entre los hilos de fondo y el mainloop de Tk
+
+        Los hilos de fondo publican eventos tipados con post(); el mainloop los
+        procesa en un tick de after(). Los eventos con la misma key de
+        coalescencia que aún no se han procesado se fusionan en uno solo, y
+        cada tick deja de despachar cuando supera budget_ms.
+
+        Args:
+            root: Ventana raíz de Tk
+            interval_ms: Intervalo entre ticks cuando la cola está vacía
+            budget_ms: Tiempo máximo de despacho por tick
+        """
+        self.root = root
+        self.interval_ms = interval_ms
+        self.budget_ms = budget_ms
+        self._handlers = {}
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._after_id = None
+        self.posted = 0
+        self.merged = 0
+        self.dispatched = 0
+
+    def register(self, event_type: str, handler: callable, merge: callable = None) -> None:
+        """
+        Asocia un handler a un tipo de evento
+
+        Args:
+            event_type: Nombre del tipo de evento
+            handler: Función que recibe el payload en el hilo de Tk
+            merge: Función (payload_anterior, payload_nuevo) -> payload que
+                fusiona eventos con la misma key (opcional)
+        """
+        self._handlers[event_type] = (handler, merge)
+
+    def post(self, event_type: str, payload=None, key=None) -> None:
+        """
+        Publica un evento; se puede llamar desde cualquier hilo
+
+        Args:
+            event_type: Tipo de evento registrado
+            payload: Datos que recibirá el handler
+            key: Key de coalescencia; solo se fusionan eventos del mismo tipo
+                y key si el tipo tiene función merge
+        """
+        handler, merge = self._handlers[event_type]
+        with self._lock:
+            self.posted += 1
+            if key is not None and merge is not None:
+                pending_key = (event_type, key)
+                if pending_key in self._pending:
+                    self._pending[pending_key] = merge(self._pending[pending_key], payload)
+                    self.merged += 1
+                    return
+            else:
+                pending_key = (event_type, next(self._counter))
+            self._pending[pending_key] = payload
+
+    def pending(self) -> int:
+        """Número de eventos a la espera de despacho"""
+        with self._lock:
+            return len(self._pending)
+
+    def start(self) -> None:
+        """Empieza a procesar la cola desde el mainloop"""
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def stop(self) -> None:
+        """Deja de procesar la cola"""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000
+        while time.perf_counter() < deadline:
+            with self._lock:
+                if not self._pending:
+                    break
+                (event_type, _), payload = self._pending.popitem(last=False)
+            handler, _ = self._handlers[event_type]
+            try:
+                with METRICS.span(f"ui.event.{event_type}"):
+                    handler(payload)
+            except Exception as e:
+                METRICS.error("ui.dispatch", f"Error procesando evento {event_type}: {e}")
+            self.dispatched += 1
+        METRICS.observe("ui.tick", (time.perf_counter() - start) * 1000)
+
+        # Si queda trabajo se cede el control a Tk y se sigue enseguida
+        delay = 1 if self.pending() else self.interval_ms
+        self._after_id = self.root.after(delay, self._tick)